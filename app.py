@@ -1,6 +1,6 @@
 import os
 import sys
-from flask import Flask, render_template, redirect, url_for, flash, request, abort, send_from_directory, make_response, Response, send_file
+from flask import Flask, render_template, redirect, url_for, flash, request, abort, make_response, Response, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -18,16 +18,18 @@ from barcode.writer import ImageWriter
 import qrcode
 from qrcode.image.svg import SvgPathImage
 import random
+import atexit
+from sqlalchemy.orm import joinedload, selectinload
 
 # Import forms, models, and utility functions from other files
 from forms import LoginForm, StaffForm, EditStaffForm, ApplicantForm, NSCForm, SampleForm, DiagnosisForm, LabSettingsForm, ChangePasswordForm, DBMigrationForm, RoleForm
-from models import db, User, Department, Applicant, ConsultancyNSC, NSCImage, SampleSC, SampleImage, Diagnosis, LabSettings, DiagnosisAttachment, MailRecipient, AuditLog, Role, Permission, KnowledgeBase, PermissionNames, Visitor
+from models import db, User, Department, Applicant, ConsultancyNSC, NSCImage, SampleSC, SampleImage, Diagnosis, LabSettings, DiagnosisAttachment, AuditLog, Role, Permission, KnowledgeBase, PermissionNames, Visitor, invalidate_role_permissions, load_user_identity, invalidate_user_identity, get_lab_settings, invalidate_lab_settings, get_unread_mail_count, clear_process_caches
 from utils import generate_uid, generate_sample_uid
 # Import the blueprints
 from fileshare import fileshare_bp
 from mail import mail_bp
 from knowledge_base import kb_bp
-from migrate_data import run_migration
+from migrate_data import start_migration, get_job
 from equipment import equipment_bp
 from backup_restore import backup_bp
 from roles import roles_bp
@@ -35,9 +37,22 @@ from visitors import visitors_bp
 # NEW: Import the new decorator
 from decorators import permission_required
 from templating import templating_bp
+from pagination import paginate_request
+from query_debug import init_lazy_load_logging
+from audit import AuditWriter, flush_audit_log
+from backup_scheduler import BackupScheduler
+from code_images import CodeImageCache, code_image_response
+from uid_allocator import uid_allocator
+from static_assets import init_static_assets
+from file_serving import serve_file
+from ingest import SamplyzeRequest, spool_upload
+from blob_store import upload_key, blob_path, store_upload, release, serve_blob, collect_garbage
+from image_variants import VARIANT_SIZES, variant_filename, schedule_variants, delete_variants
 from archive import archive_bp
 from issue_tracker import issue_tracker_bp
 from inventory import inventory_bp
+from sqlite_profile import configure_profile, describe_profile, format_report, checkpoint_file
+from schema_upgrade import upgrade_schema
 
 # --- PyInstaller Path Correction ---
 if getattr(sys, 'frozen', False):
@@ -48,6 +63,7 @@ if getattr(sys, 'frozen', False):
 else:
     basedir = os.path.abspath(os.path.dirname(__file__))
     app = Flask(__name__)
+app.request_class = SamplyzeRequest # Streams file uploads to disk and hashes them (see ingest.py)
  
 # --- App Configuration using the new 'basedir' ---
 app.config['SECRET_KEY'] = 'a-very-secret-key-that-should-be-changed'
@@ -55,7 +71,64 @@ app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'in
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = os.path.join(basedir, 'appfiles', 'uploads')
 app.config['SHARED_FOLDER'] = os.path.join(basedir, 'appfiles', 'shared_files')
+# Uploads are spooled here while the request is parsed; keep it on the same disk as the two folders above
+app.config['UPLOAD_TEMP_FOLDER'] = os.path.join(basedir, 'appfiles', 'incoming')
+# Content-addressed store behind both folders: every distinct file is kept once (see blob_store.py)
+app.config['BLOB_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], 'blobs')
+# Blob files without a reference are removed at startup once they are this many seconds old
+# (left by requests that failed before their commit)
+app.config['BLOB_ORPHAN_AGE'] = 3600
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024 # 50 MB upload limit
+# Seconds a browser may reuse an uploaded file before revalidating it (a 304 if unchanged)
+app.config['UPLOAD_CACHE_MAX_AGE'] = 3600
+# Overrides for the SQLite engine profile, e.g. {'mmap_size': 0} (see sqlite_profile.DEFAULT_PROFILE)
+app.config['SQLITE_PROFILE'] = {}
+# Print the number of lazy relationship loads (N+1 queries) each request triggers
+app.config['LOG_LAZY_LOADS'] = False
+# Seconds a logged-in user's identity (role, permissions, department) is reused between requests
+app.config['USER_CACHE_TTL'] = 30
+# Audit log entries are written in batches of up to AUDIT_BATCH_SIZE, at least every AUDIT_FLUSH_INTERVAL_MS
+app.config['AUDIT_BATCH_SIZE'] = 50
+app.config['AUDIT_FLUSH_INTERVAL_MS'] = 50
+app.config['AUDIT_QUEUE_SIZE'] = 1000
+# Rendered barcode and QR code images, kept on disk and in an LRU of this many images
+app.config['CODE_IMAGE_CACHE_FOLDER'] = os.path.join(basedir, 'instance', 'code_images')
+app.config['CODE_IMAGE_CACHE_SIZE'] = 512
+# Size the image folder may grow to before the least recently used images are removed
+app.config['CODE_IMAGE_DISK_CACHE_BYTES'] = 64 * 1024 * 1024
+# Serve static/ under content-hashed names, precompressed and cached for a year (see static_assets.py)
+app.config['STATIC_FINGERPRINTING'] = True
+app.config['STATIC_BUILD_FOLDER'] = os.path.join(basedir, 'instance', 'static_build')
+# Manifests of the backups made so far, the possible bases of an incremental backup
+app.config['BACKUP_MANIFEST_FOLDER'] = os.path.join(basedir, 'instance', 'backup_manifests')
+# Compact the database snapshot with VACUUM INTO before it goes into a backup (slower, smaller)
+app.config['BACKUP_VACUUM'] = False
+# Threads that extract and verify backup files during a restore
+app.config['RESTORE_WORKERS'] = 4
+# Scheduled backups (see backup_scheduler.py): a cron expression in lab time (minute hour day month weekday),
+# or None to turn them off, the folder they are written to, how many daily/weekly/monthly backups are kept,
+# and a write limit so a backup does not slow down the lab's work (0 for none)
+app.config['BACKUP_SCHEDULE'] = '30 2 * * *'
+app.config['BACKUP_DIRECTORY'] = os.path.join(basedir, 'backups')
+app.config['BACKUP_RETENTION'] = {'daily': 7, 'weekly': 4, 'monthly': 12}
+app.config['BACKUP_THROTTLE_BYTES_PER_SECOND'] = 20 * 1024 * 1024
+# Archive databases made by the archive tool, and how many samples each archiving transaction moves
+app.config['ARCHIVE_FOLDER'] = os.path.join(basedir, 'instance', 'archives')
+app.config['ARCHIVE_BATCH_SIZE'] = 500
+# Archive files uploaded only to be viewed: kept apart from ARCHIVE_FOLDER (so they are not backed
+# up, registered or searched) and removed this many hours after the upload
+app.config['ARCHIVE_VIEW_FOLDER'] = os.path.join(basedir, 'instance', 'archive_uploads')
+app.config['ARCHIVE_VIEW_RETENTION_HOURS'] = 24
+# Summaries of the archive databases that let searches skip archives which cannot match
+app.config['ARCHIVE_REGISTRY'] = os.path.join(basedir, 'instance', 'archive_registry.json')
+# Searches across the live database and the archives: threads, time budget in seconds and rows per list
+app.config['ARCHIVE_SEARCH_WORKERS'] = 4
+app.config['ARCHIVE_SEARCH_BUDGET'] = 2.0
+app.config['ARCHIVE_SEARCH_LIMIT'] = 50
+# Migrations from old databases: where the uploaded file waits, rows per transaction and tables copied at once
+app.config['MIGRATION_FOLDER'] = os.path.join(basedir, 'instance', 'migrations')
+app.config['MIGRATION_BATCH_SIZE'] = 1000
+app.config['MIGRATION_WORKERS'] = 3
 
 # Ensure the necessary data folders exist
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
@@ -66,10 +139,17 @@ if not os.path.exists(os.path.join(basedir, 'instance')):
     os.makedirs(os.path.join(basedir, 'instance'))
 
 # --- Extensions Initialization ---
+configure_profile(app.config['SQLITE_PROFILE'])
 db.init_app(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+init_lazy_load_logging(app)
+audit_writer = AuditWriter(app)
+backup_scheduler = BackupScheduler(app) # Started by run.py
+init_static_assets(app)
+code_image_cache = CodeImageCache(app.config['CODE_IMAGE_CACHE_FOLDER'], max_entries=app.config['CODE_IMAGE_CACHE_SIZE'],
+                                  max_disk_bytes=app.config['CODE_IMAGE_DISK_CACHE_BYTES'])
 
 # Register the blueprints
 app.register_blueprint(fileshare_bp)
@@ -99,7 +179,7 @@ def nl2br_filter(s):
 # --- User Loader for Flask-Login ---
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return load_user_identity(int(user_id), ttl=app.config['USER_CACHE_TTL'])
 
 # --- Helper Functions ---
 def get_ist_time():
@@ -117,61 +197,67 @@ def admin_required(f):
     return decorated_function
 
 def delete_file(filename):
-    """Deletes a file from the UPLOAD_FOLDER."""
+    """Deletes a file from the UPLOAD_FOLDER. The blob goes once nothing else refers to it."""
     if not filename: return
     try:
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        release(upload_key(filename))
+        delete_variants(app.config['UPLOAD_FOLDER'], filename)
     except Exception as e:
         print(f"Error deleting file {filename}: {e}") # Log error
         
 def log_action(action, user_id=None):
-    """Logs an action to the audit trail."""
+    """Logs an action to the audit trail. The entry is written by the background audit writer."""
     if user_id is None and current_user.is_authenticated:
         user_id = current_user.id
     
-    log_entry = AuditLog(user_id=user_id, action=action)
-    db.session.add(log_entry)
-    db.session.commit()
+    audit_writer.log(action, user_id=user_id)
      
 @app.route('/about')
 @login_required
 def about():
     return render_template('about.html', title='About Samplyze')
 
+BARCODE_OPTIONS = {'module_height': 5.0}
+
+def render_barcode(data):
+    code128 = barcode.get_barcode_class('code128')
+    writer = ImageWriter()
+    barcode_image = code128(data, writer=writer)
+    
+    buffer = BytesIO()
+    barcode_image.write(buffer, options=BARCODE_OPTIONS)
+    return buffer.getvalue()
+
 @app.route('/barcode/<data>')
+@login_required
 def generate_barcode(data):
     try:
-        code128 = barcode.get_barcode_class('code128')
-        writer = ImageWriter()
-        barcode_image = code128(data, writer=writer)
-        
-        buffer = BytesIO()
-        barcode_image.write(buffer, options={'module_height': 5.0})
-        buffer.seek(0)
-        
-        return send_file(buffer, mimetype='image/png')
+        key, image = code_image_cache.get('code128', data, BARCODE_OPTIONS, 'png', lambda: render_barcode(data))
+        return code_image_response(key, image, 'image/png')
     except Exception as e:
         print(f"Error generating barcode: {e}")
         return abort(500)
     
+QRCODE_OPTIONS = {'format': 'svg-path', 'border': 1}
+
+def render_qrcode(data_to_encode):
+    # UPDATED: Use the SvgPathImage factory to generate an SVG
+    qr_img = qrcode.make(data_to_encode, image_factory=SvgPathImage, border=QRCODE_OPTIONS['border'])
+    
+    buffer = BytesIO()
+    # The save method for the SVG factory writes XML text, not binary
+    qr_img.save(buffer)
+    return buffer.getvalue()
+
 @app.route('/qrcode/<path:data>')
+@login_required
 def generate_qrcode(data):
     """Generates a QR code image as an SVG and serves it."""
     try:
         data_to_encode = data.replace('__NL__', '\n')
-
-        # UPDATED: Use the SvgPathImage factory to generate an SVG
-        qr_img = qrcode.make(data_to_encode, image_factory=SvgPathImage,border=1)
-        
-        buffer = BytesIO()
-        # The save method for the SVG factory writes XML text, not binary
-        qr_img.save(buffer)
-        buffer.seek(0)
-        
+        key, image = code_image_cache.get('qrcode', data_to_encode, QRCODE_OPTIONS, 'svg', lambda: render_qrcode(data_to_encode))
         # UPDATED: Changed the mimetype to image/svg+xml
-        return send_file(buffer, mimetype='image/svg+xml')
+        return code_image_response(key, image, 'image/svg+xml')
     except Exception as e:
         print(f"Error generating QR code: {e}")
         return abort(500)
@@ -179,6 +265,7 @@ def generate_qrcode(data):
 @app.route('/admin/audit-log')
 @admin_required
 def audit_log():
+    flush_audit_log() # Include actions that are still queued
     search_query = request.args.get('q', '')
     
     query = AuditLog.query
@@ -191,12 +278,13 @@ def audit_log():
             )
         )
         
-    logs = query.order_by(AuditLog.timestamp.desc()).all()
-    return render_template('admin/audit_log.html', title='Audit Log', logs=logs, search_query=search_query)
+    page = paginate_request(query, [AuditLog.timestamp.desc(), AuditLog.id.desc()])
+    return render_template('admin/audit_log.html', title='Audit Log', logs=page.items, page=page, search_query=search_query)
 
 @app.route('/admin/audit-log/export')
 @admin_required
 def audit_log_export():
+    flush_audit_log()
     search_query = request.args.get('q', '')
     
     query = AuditLog.query
@@ -349,6 +437,7 @@ def edit_staff(staff_id):
         if form.password.data:
             staff.password_hash = generate_password_hash(form.password.data, method='pbkdf2:sha256')
         db.session.commit()
+        invalidate_user_identity(staff.id)
         log_action(f"Admin updated details for staff member '{staff.name}'.")
         flash('Staff member has been updated.', 'success')
         return redirect(url_for('manage_staff'))
@@ -367,6 +456,7 @@ def delete_staff(staff_id):
         return redirect(url_for('manage_staff'))
     db.session.delete(staff_to_delete)
     db.session.commit()
+    invalidate_user_identity(staff_id)
     log_action(f"Admin deleted staff member '{staff_to_delete.name}'.")
     flash(f'Staff member {staff_to_delete.name} has been deleted.', 'success')
     return redirect(url_for('manage_staff'))
@@ -395,6 +485,7 @@ def delete_department(dept_id):
     dept_to_delete = Department.query.get_or_404(dept_id)
     db.session.delete(dept_to_delete)
     db.session.commit()
+    invalidate_user_identity() # Its staff were unassigned
     log_action(f"Admin deleted department '{dept_to_delete.name}'.")
     flash(f'Department "{dept_to_delete.name}" has been deleted. Staff and samples have been unassigned.', 'success')
     return redirect(url_for('manage_departments'))
@@ -424,7 +515,7 @@ def lab_settings():
             logo_file = form.logo.data
             filename = secure_filename(logo_file.filename)
             unique_filename = f"logo_{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}"
-            logo_file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
+            store_upload(logo_file, upload_key(unique_filename))
             settings.logo_path = unique_filename
             
         # Handle navbar logo upload
@@ -434,10 +525,11 @@ def lab_settings():
             nav_logo_file = form.navlogo.data
             filename = secure_filename(nav_logo_file.filename)
             unique_filename = f"navlogo_{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}"
-            nav_logo_file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
+            store_upload(nav_logo_file, upload_key(unique_filename))
             settings.nav_logo_path = unique_filename
 
         db.session.commit()
+        invalidate_lab_settings()
         log_action("Admin updated laboratory settings.")
         flash('Lab settings updated successfully.', 'success')
         return redirect(url_for('lab_settings'))
@@ -451,6 +543,7 @@ def admin_change_password():
         if check_password_hash(current_user.password_hash, form.old_password.data):
             current_user.password_hash = generate_password_hash(form.new_password.data, method='pbkdf2:sha256')
             db.session.commit()
+            invalidate_user_identity(current_user.id)
             flash('Your password has been updated successfully.', 'success')
             return redirect(url_for('admin_dashboard'))
         else:
@@ -462,26 +555,50 @@ def admin_change_password():
 def migrate_database():
     form = DBMigrationForm()
     if form.validate_on_submit():
-        old_db_file = form.db_file.data
-        
-        temp_path = os.path.join('instance', 'temp_old_db.db')
-        old_db_file.save(temp_path)
-        
-        current_db_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+        migration_folder = app.config['MIGRATION_FOLDER']
+        temp_path, _, sha256 = spool_upload(form.db_file.data, migration_folder)
+        old_db_path = os.path.join(migration_folder, f'{sha256}.db')
+        current_job = get_job(sha256)
+        if current_job is not None and current_job.running:
+            os.remove(temp_path) # The same file is being migrated right now
+            return redirect(url_for('migration_progress', job_id=sha256))
+        os.replace(temp_path, old_db_path)
 
-        success, message = run_migration(new_db_path=current_db_path, old_db_path=temp_path)
+        current_db_path = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+        job, started = start_migration(current_db_path, old_db_path,
+                                       batch_size=app.config['MIGRATION_BATCH_SIZE'],
+                                       workers=app.config['MIGRATION_WORKERS'],
+                                       on_finished=_migration_finished)
+        if not started:
+            os.remove(old_db_path)
+            flash('Another migration is still running. Wait for it to finish before starting a new one.', 'warning')
+        return redirect(url_for('migration_progress', job_id=job.id))
 
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        
-        if success:
-            flash(message, 'success')
-        else:
-            flash(message, 'danger')
+    return render_template('admin/migrate.html', title='Migrate Database', form=form)
 
-        return redirect(url_for('admin_dashboard'))
+def _migration_finished(job):
+    clear_process_caches()
+    uid_allocator.reset() # Its free UIDs were not checked against the migrated rows
+    # An interrupted migration resumes from its checkpoints when the same file is uploaded again
+    if os.path.exists(job.old_db_path):
+        os.remove(job.old_db_path)
 
-    return render_template('admin/migrate.html', title='Migrate Database', form=form)
+@app.route('/admin/migrate/job/<job_id>')
+@admin_required
+def migration_progress(job_id):
+    job = get_job(job_id)
+    if job is None:
+        flash('That migration is not running any more. Upload the file again to continue it.', 'warning')
+        return redirect(url_for('migrate_database'))
+    return render_template('admin/migrate_progress.html', title='Migrating Database', job=job.status())
+
+@app.route('/admin/migrate/status/<job_id>')
+@admin_required
+def migration_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.status())
 
 
 # --- Staff/Consultant Routes ---
@@ -489,14 +606,37 @@ def migrate_database():
 @login_required
 @permission_required(PermissionNames.CAN_ACCESS_APPLICANT_SERVICES)
 def dashboard():
-    applicants = Applicant.query.order_by(Applicant.created_at.desc()).all()
-    return render_template('staff/dashboard.html', title='OA Dashboard', applicants=applicants)
+    search_query = request.args.get('q', '').strip()
+    query = Applicant.query
+
+    if search_query:
+        search_term = f'%{search_query}%'
+        query = query.filter(
+            db.or_(
+                Applicant.name.ilike(search_term),
+                Applicant.uid.ilike(search_term),
+                Applicant.phone.ilike(search_term),
+                Applicant.city.ilike(search_term),
+                Applicant.state.ilike(search_term)
+            )
+        )
+
+    page = paginate_request(query, [Applicant.created_at.desc(), Applicant.id.desc()])
+    return render_template('staff/dashboard.html', title='OA Dashboard', applicants=page.items, page=page, search_query=search_query)
+
+# Relationships rendered by staff/all_samples.html for every row
+ALL_SAMPLES_LOADERS = (
+    joinedload(SampleSC.applicant),
+    joinedload(SampleSC.assigned_staff),
+    joinedload(SampleSC.allotted_department),
+)
 
 @app.route('/samples')
 @login_required
 @permission_required(PermissionNames.CAN_ACCESS_SAMPLING_SERVICES)
 def all_samples():
     assigned_to_me = request.args.get('assigned_to_me', 'false').lower() == 'true'
+    search_query = request.args.get('q', '').strip()
     query = SampleSC.query
 
     # If the user has the permission to view all samples...
@@ -507,10 +647,26 @@ def all_samples():
     else:
         # Otherwise, ALWAYS filter to show only their samples.
         query = query.filter_by(assigned_staff_id=current_user.id)
-        
-    samples = query.order_by(SampleSC.submission_date.desc()).all()
+
+    if search_query:
+        search_term = f'%{search_query}%'
+        query = query.filter(
+            db.or_(
+                SampleSC.sample_uid.ilike(search_term),
+                SampleSC.sample_name.ilike(search_term),
+                SampleSC.current_status.ilike(search_term),
+                SampleSC.applicant.has(Applicant.name.ilike(search_term))
+            )
+        )
+
+    # Counts over every matching sample, not just the page shown
+    status_counts = dict(query.with_entities(SampleSC.current_status, db.func.count(SampleSC.id))
+                         .group_by(SampleSC.current_status).all())
+
+    page = paginate_request(query.options(*ALL_SAMPLES_LOADERS), [SampleSC.submission_date.desc(), SampleSC.id.desc()])
     
-    return render_template('staff/all_samples.html', title='All Samples', samples=samples, assigned_to_me=assigned_to_me)
+    return render_template('staff/all_samples.html', title='All Samples', samples=page.items, page=page, assigned_to_me=assigned_to_me,
+                           search_query=search_query, status_counts=status_counts, total_count=sum(status_counts.values()))
 
 
 @app.route('/applicant/add', methods=['GET', 'POST'])
@@ -542,11 +698,17 @@ def edit_applicant(uid):
     return render_template('staff/edit_applicant.html', title='Edit Applicant', form=form, applicant=applicant)
 
 
+# Both consultancy lists are rendered by staff/view_applicant.html
+VIEW_APPLICANT_LOADERS = (
+    selectinload(Applicant.samples_sc),
+    selectinload(Applicant.consultancies_nsc),
+)
+
 @app.route('/applicant/view/<uid>')
 @login_required
 @permission_required(PermissionNames.CAN_ACCESS_APPLICANT_SERVICES)
 def view_applicant(uid):
-    applicant = Applicant.query.filter_by(uid=uid).first_or_404()
+    applicant = Applicant.query.options(*VIEW_APPLICANT_LOADERS).filter_by(uid=uid).first_or_404()
     return render_template('staff/view_applicant.html', title=f'Applicant: {applicant.name}', applicant=applicant)
 
 @app.route('/applicant/delete/<uid>', methods=['POST'])
@@ -597,10 +759,10 @@ def add_nsc(uid):
             if image_file:
                 filename = secure_filename(image_file.filename)
                 unique_filename = f"nsc_{new_nsc.id}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{i}_{filename}"
-                image_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                image_file.save(image_path)
+                upload = store_upload(image_file, upload_key(unique_filename))
+                schedule_variants(app.config['UPLOAD_FOLDER'], unique_filename, source=blob_path(upload.sha256))
                 
-                nsc_image = NSCImage(consultancy_nsc_id=new_nsc.id, image_path=unique_filename, caption=caption_text)
+                nsc_image = NSCImage(consultancy_nsc_id=new_nsc.id, image_path=unique_filename, caption=caption_text, size=upload.size, sha256=upload.sha256)
                 db.session.add(nsc_image)
             i += 1
         
@@ -649,10 +811,10 @@ def edit_nsc(nsc_id):
             if image_file:
                 filename = secure_filename(image_file.filename)
                 unique_filename = f"nsc_{nsc.id}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{i}_{filename}"
-                image_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                image_file.save(image_path)
+                upload = store_upload(image_file, upload_key(unique_filename))
+                schedule_variants(app.config['UPLOAD_FOLDER'], unique_filename, source=blob_path(upload.sha256))
                 
-                nsc_image = NSCImage(consultancy_nsc_id=nsc.id, image_path=unique_filename, caption=caption_text)
+                nsc_image = NSCImage(consultancy_nsc_id=nsc.id, image_path=unique_filename, caption=caption_text, size=upload.size, sha256=upload.sha256)
                 db.session.add(nsc_image)
             i += 1
         
@@ -718,9 +880,9 @@ def add_sample(uid):
             if image_file:
                 filename = secure_filename(image_file.filename)
                 unique_filename = f"sample_{new_sample.id}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{i}_{filename}"
-                image_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                image_file.save(image_path)
-                sample_image = SampleImage(sample_sc_id=new_sample.id, image_path=unique_filename, caption=caption_text)
+                upload = store_upload(image_file, upload_key(unique_filename))
+                schedule_variants(app.config['UPLOAD_FOLDER'], unique_filename, source=blob_path(upload.sha256))
+                sample_image = SampleImage(sample_sc_id=new_sample.id, image_path=unique_filename, caption=caption_text, size=upload.size, sha256=upload.sha256)
                 db.session.add(sample_image)
             i += 1
 
@@ -757,12 +919,12 @@ def add_diagnosis(sample_uid):
                 original_filename = secure_filename(file.filename)
                 file_ext = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
                 unique_filename = f"diag_{new_diagnosis.id}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{i}_{original_filename}"
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                file.save(file_path)
+                upload = store_upload(file, upload_key(unique_filename))
                 
                 attachment = DiagnosisAttachment(
                     diagnosis_id=new_diagnosis.id, file_path=unique_filename,
-                    original_filename=caption_text or original_filename, file_type=file_ext
+                    original_filename=caption_text or original_filename, file_type=file_ext,
+                    size=upload.size, sha256=upload.sha256
                 )
                 db.session.add(attachment)
             i += 1
@@ -798,12 +960,12 @@ def edit_diagnosis(diagnosis_id):
                 original_filename = secure_filename(file.filename)
                 file_ext = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
                 unique_filename = f"diag_{diagnosis.id}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{i}_{original_filename}"
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                file.save(file_path)
+                upload = store_upload(file, upload_key(unique_filename))
                 
                 attachment = DiagnosisAttachment(
                     diagnosis_id=diagnosis.id, file_path=unique_filename,
-                    original_filename=caption_text or original_filename, file_type=file_ext
+                    original_filename=caption_text or original_filename, file_type=file_ext,
+                    size=upload.size, sha256=upload.sha256
                 )
                 db.session.add(attachment)
             i += 1
@@ -857,10 +1019,10 @@ def edit_sample(sample_uid):
             if image_file:
                 filename = secure_filename(image_file.filename)
                 unique_filename = f"sample_{sample.id}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{i}_{filename}"
-                image_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                image_file.save(image_path)
+                upload = store_upload(image_file, upload_key(unique_filename))
+                schedule_variants(app.config['UPLOAD_FOLDER'], unique_filename, source=blob_path(upload.sha256))
                 
-                sample_image = SampleImage(sample_sc_id=sample.id, image_path=unique_filename, caption=caption_text)
+                sample_image = SampleImage(sample_sc_id=sample.id, image_path=unique_filename, caption=caption_text, size=upload.size, sha256=upload.sha256)
                 db.session.add(sample_image)
             i += 1
 
@@ -895,29 +1057,75 @@ def delete_sample(sample_uid):
     return redirect(url_for('view_applicant', uid=applicant_uid))
 
 
+# staff/view_sample.html shows the people involved, the images and every diagnosis with its attachments
+VIEW_SAMPLE_LOADERS = (
+    joinedload(SampleSC.applicant),
+    joinedload(SampleSC.assigned_staff),
+    joinedload(SampleSC.allotted_department),
+    selectinload(SampleSC.images),
+    selectinload(SampleSC.diagnoses).selectinload(Diagnosis.attachments),
+)
+
 @app.route('/sample/view/<sample_uid>')
 @login_required
 @permission_required(PermissionNames.CAN_ACCESS_SAMPLING_SERVICES)
 def view_sample(sample_uid):
-    sample = SampleSC.query.filter_by(sample_uid=sample_uid).first_or_404()
+    sample = SampleSC.query.options(*VIEW_SAMPLE_LOADERS).filter_by(sample_uid=sample_uid).first_or_404()
     return render_template('staff/view_sample.html', title=f'Sample: {sample.sample_uid}', sample=sample)
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return serve_blob(upload_key(filename), filename)
+
+@app.route('/uploads/<variant>/<filename>')
+def uploaded_image_variant(variant, filename):
+    """Serves a resized copy of an uploaded image as WebP or JPEG, or the original until it exists."""
+    if variant not in VARIANT_SIZES:
+        abort(404)
+    # Only browsers that name image/webp explicitly get WebP; a bare */* does not promise it
+    extension = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpg'
+    path = variant_filename(filename, variant, extension)
+    if not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], path)):
+        response = serve_blob(upload_key(filename), filename)
+        response.cache_control.no_cache = True # The variant may be ready on the next request
+        return response
+    response = serve_file(app.config['UPLOAD_FOLDER'], path)
+    response.vary.add('Accept')
+    return response
+
+@app.template_global()
+def image_variant_url(filename, variant, **kwargs):
+    return url_for('uploaded_image_variant', variant=variant, filename=filename, **kwargs)
+
+@app.template_global()
+def image_srcset(filename, **kwargs):
+    """A srcset listing every variant of an uploaded image by its width."""
+    return ', '.join(f"{image_variant_url(filename, variant, **kwargs)} {size}w" for variant, size in VARIANT_SIZES.items())
 
 # --- PDF Report Generation ---
+APPLICANT_REPORT_LOADERS = (
+    selectinload(Applicant.samples_sc),
+    selectinload(Applicant.consultancies_nsc),
+)
+
 @app.route('/applicant/report/<uid>')
 @login_required
 def applicant_report(uid):
-    applicant = Applicant.query.filter_by(uid=uid).first_or_404()
+    applicant = Applicant.query.options(*APPLICANT_REPORT_LOADERS).filter_by(uid=uid).first_or_404()
     return render_template('reports/applicant_report.html', applicant=applicant, generation_time=get_ist_time())
 
 
+SAMPLE_REPORT_LOADERS = (
+    joinedload(SampleSC.applicant),
+    joinedload(SampleSC.allotted_department),
+    selectinload(SampleSC.images),
+    selectinload(SampleSC.diagnoses).selectinload(Diagnosis.attachments),
+)
+
 @app.route('/sample/report/<sample_uid>')
 @login_required
 def sample_report(sample_uid):
-    sample = SampleSC.query.filter_by(sample_uid=sample_uid).first_or_404()
+    sample = SampleSC.query.options(*SAMPLE_REPORT_LOADERS).filter_by(sample_uid=sample_uid).first_or_404()
     # Get parameters from URL, default to True if not present
     include_images = request.args.get('include_images', 'true').lower() == 'true'
     show_attachments = request.args.get('show_attachments', 'true').lower() == 'true'
@@ -954,14 +1162,11 @@ def applicant_card(uid):
 
 @app.context_processor
 def inject_global_variables():
-    settings = LabSettings.query.first()
+    # Both values come from process caches, so rendering a page needs no extra queries
+    settings = get_lab_settings()
     unread_mail_count = 0
     if current_user.is_authenticated:
-        unread_mail_count = MailRecipient.query.filter_by(
-            recipient_id=current_user.id, 
-            is_read=False, 
-            is_deleted=False
-        ).count()
+        unread_mail_count = get_unread_mail_count(current_user.id)
     return dict(
         lab_settings=settings,
         current_year=datetime.now(timezone.utc).year,
@@ -978,6 +1183,11 @@ def forbidden_error(error):
 # --- Create Database and Default Admin ---
 with app.app_context():
     db.create_all()
+    upgrade_schema()
+
+    # Report the SQLite settings actually in effect
+    with db.engine.connect() as conn:
+        print(f"SQLite profile: {format_report(describe_profile(conn.connection))}")
     
     # This function will now robustly seed the database
     def seed_initial_data():
@@ -1011,6 +1221,7 @@ with app.app_context():
         staff_role.permissions = all_perms
         
         db.session.commit()
+        invalidate_role_permissions()
 
         # --- Seed Default User and Settings ---
         if not User.query.filter_by(username='admin').first():
@@ -1029,3 +1240,18 @@ with app.app_context():
 
     # Run the seeding function
     seed_initial_data()
+
+    # Blobs whose last reference was deleted while the app was running, and orphans of failed requests
+    removed = collect_garbage(orphan_age=app.config['BLOB_ORPHAN_AGE'])
+    if removed:
+        print(f"Removed {removed} unreferenced upload blobs.")
+
+# Checkpoint policy: fold the WAL into the database file on shutdown so laboratory.db is self-contained
+@atexit.register
+def checkpoint_database():
+    backup_scheduler.stop()
+    audit_writer.stop() # Write the queued audit events first
+    try:
+        checkpoint_file(app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', ''))
+    except Exception as e:
+        print(f"Error checkpointing database: {e}")
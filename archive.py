@@ -1,16 +1,23 @@
 import os
 import shutil
-import sqlite3
+import time
 from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, abort
 from flask_login import login_required, current_user
 from datetime import datetime
 import pytz
 import io
 
-from models import db, User, Applicant, SampleSC, ConsultancyNSC, Diagnosis
+from models import db, User, Applicant, ConsultancyNSC, Diagnosis
 from forms import CreateArchiveForm, ViewArchiveForm
 from decorators import permission_required
 from models import PermissionNames
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
+from archive_engine import archive_records
+from file_serving import serve_file
+from archive_browser import ArchiveError, open_archive, table_names, list_tables, browse_rows
+from archive_registry import refresh_registry
+from archive_search import federated_search, SEARCH_FIELDS
 
 # Create a Blueprint
 archive_bp = Blueprint('archive', __name__, url_prefix='/admin/archive', template_folder='templates')
@@ -32,7 +39,28 @@ def admin_required(f):
 def dashboard():
     create_form = CreateArchiveForm()
     view_form = ViewArchiveForm()
-    return render_template('admin/archive/dashboard.html', title='Archive Management', create_form=create_form, view_form=view_form)
+    return render_template('admin/archive/dashboard.html', title='Archive Management', create_form=create_form, view_form=view_form,
+                           archives=_list_databases(current_app.config['ARCHIVE_FOLDER']), uploads=_list_databases(_expire_uploads()))
+
+
+def _list_databases(folder):
+    if not os.path.isdir(folder):
+        return []
+    return sorted((name for name in os.listdir(folder) if name.endswith('.db')), reverse=True)
+
+
+def _expire_uploads():
+    """Removes viewed uploads older than ARCHIVE_VIEW_RETENTION_HOURS. Returns the folder."""
+    folder = current_app.config['ARCHIVE_VIEW_FOLDER']
+    if os.path.isdir(folder):
+        cutoff = time.time() - current_app.config['ARCHIVE_VIEW_RETENTION_HOURS'] * 3600
+        for entry in os.scandir(folder):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError as e:
+                print(f"Could not remove expired archive upload {entry.name}: {e}")
+    return folder
 
 @archive_bp.route('/create', methods=['POST'])
 @admin_required # UPDATED: This action is now restricted to admins only
@@ -40,59 +68,152 @@ def create_archive():
     form = CreateArchiveForm()
     if form.validate_on_submit():
         end_date = form.end_date.data
-        timestamp = datetime.now(pytz.timezone('Asia/Kolkata')).strftime('%Y-%m-%d')
+        timestamp = datetime.now(pytz.timezone('Asia/Kolkata')).strftime('%Y-%m-%d_%H-%M-%S')
+        # Every run writes a file of its own: ids freed in the live database are reused later
         archive_db_name = f'archive_{end_date.strftime("%Y-%m-%d")}_{timestamp}.db'
-        archive_db_path = os.path.join('instance', archive_db_name)
+        archive_db_path = os.path.join(current_app.config['ARCHIVE_FOLDER'], archive_db_name)
+        if os.path.exists(archive_db_path):
+            flash('An archive was just created. Wait a moment before starting another one.', 'warning')
+            return redirect(url_for('archive.dashboard'))
 
         main_db_path = current_app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
-        main_conn = sqlite3.connect(main_db_path)
-        archive_conn = sqlite3.connect(archive_db_path)
-        
-        with current_app.app_context():
-            schema = '\n'.join(main_conn.iterdump())
-            archive_conn.executescript(schema)
-
-        samples_to_archive = db.session.query(SampleSC).filter(SampleSC.submission_date < end_date).all()
-        
-        flash(f"Archiving is a complex feature. This is a placeholder for the logic to copy data for {len(samples_to_archive)} samples.", 'info')
-        
+        # Release this request's connection so it does not hold a read snapshot during the VACUUM
+        db.session.close()
+        try:
+            counts = archive_records(main_db_path, archive_db_path, end_date, current_app.config['ARCHIVE_BATCH_SIZE'])
+        except Exception as e:
+            refresh_registry(current_app.config['ARCHIVE_FOLDER'], current_app.config['ARCHIVE_REGISTRY'])
+            flash(f"Archiving failed: {e}. Batches moved before the error are in {archive_db_name}.", 'danger')
+            return redirect(url_for('archive.dashboard'))
+
+        if not counts['sample_sc'] and not counts['consultancy_nsc']:
+            if os.path.exists(archive_db_path):
+                os.remove(archive_db_path)
+            flash(f"Nothing to archive before {end_date.strftime('%d-%b-%Y')}.", 'info')
+        else:
+            flash(f"Archived {counts['sample_sc']} samples ({counts['diagnosis']} diagnoses, "
+                  f"{counts['sample_image'] + counts['nsc_image']} images, {counts['diagnosis_attachment']} attachments), "
+                  f"{counts['consultancy_nsc']} NSC records and {counts['applicant']} applicants into {archive_db_name}. "
+                  f"{counts['applicant_removed']} applicants with nothing left were removed from the live database.", 'success')
+        refresh_registry(current_app.config['ARCHIVE_FOLDER'], current_app.config['ARCHIVE_REGISTRY'])
         return redirect(url_for('archive.dashboard'))
 
     flash('There was an error with your submission.', 'danger')
     return redirect(url_for('archive.dashboard'))
 
 
+@archive_bp.route('/download/<filename>')
+@login_required
+@permission_required(PermissionNames.CAN_MANAGE_ARCHIVES)
+def download_archive(filename):
+    return serve_file(current_app.config['ARCHIVE_FOLDER'], filename, as_attachment=True)
+
+
 @archive_bp.route('/view', methods=['POST'])
 @login_required
 @permission_required(PermissionNames.CAN_MANAGE_ARCHIVES)
 def view_archive():
     form = ViewArchiveForm()
     if form.validate_on_submit():
-        archive_file = form.archive_file.data
-        temp_path = os.path.join('instance', 'temp_archive_view.db')
-        archive_file.save(temp_path)
+        # The upload is browsed in place from ARCHIVE_VIEW_FOLDER until it expires or is deleted
+        archive_folder = _expire_uploads()
+        os.makedirs(archive_folder, exist_ok=True)
+        stem = secure_filename(os.path.splitext(form.archive_file.data.filename)[0]) or 'archive'
+        filename = f'{stem}.db'
+        suffix = 1
+        while os.path.exists(os.path.join(archive_folder, filename)):
+            suffix += 1
+            filename = f'{stem}_{suffix}.db'
+        temp_path = os.path.join(archive_folder, filename + '.part')
+        form.archive_file.data.save(temp_path)
 
         try:
-            conn = sqlite3.connect(temp_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-            tables = [row[0] for row in cursor.fetchall()]
-            
-            archived_data = {}
-            for table in tables:
-                cursor.execute(f"SELECT * FROM {table}")
-                archived_data[table] = cursor.fetchall()
-
-            conn.close()
-            os.remove(temp_path)
-
-            return render_template('admin/archive/view_archive.html', title='View Archive', archived_data=archived_data)
-
+            conn = open_archive(temp_path)
+            try:
+                table_names(conn)
+            finally:
+                conn.close()
         except Exception as e:
+            os.remove(temp_path)
             flash(f"Could not read the archive file. Error: {e}", 'danger')
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
             return redirect(url_for('archive.dashboard'))
+        os.replace(temp_path, os.path.join(archive_folder, filename))
+        return redirect(url_for('archive.browse_archive', filename=filename, source='upload'))
 
     flash('Invalid file or form submission.', 'danger')
     return redirect(url_for('archive.dashboard'))
+
+
+@archive_bp.route('/uploads/<filename>/delete', methods=['POST'])
+@login_required
+@permission_required(PermissionNames.CAN_MANAGE_ARCHIVES)
+def delete_upload(filename):
+    os.remove(_archive_path(filename, 'upload'))
+    flash(f"Removed the uploaded archive {filename}.", 'success')
+    return redirect(url_for('archive.dashboard'))
+
+
+def _archive_path(filename, source):
+    """`source` is 'archive' for ARCHIVE_FOLDER or 'upload' for ARCHIVE_VIEW_FOLDER."""
+    folder = current_app.config['ARCHIVE_FOLDER' if source == 'archive' else 'ARCHIVE_VIEW_FOLDER']
+    path = safe_join(folder, filename)
+    if path is None or not filename.endswith('.db') or not os.path.isfile(path):
+        abort(404)
+    return path
+
+
+@archive_bp.route('/browse/<filename>', defaults={'source': 'archive'})
+@archive_bp.route('/uploads/<filename>', defaults={'source': 'upload'})
+@login_required
+@permission_required(PermissionNames.CAN_MANAGE_ARCHIVES)
+def browse_archive(filename, source):
+    path = _archive_path(filename, source)
+    try:
+        conn = open_archive(path)
+        try:
+            tables = list_tables(conn, path)
+        finally:
+            conn.close()
+    except Exception as e:
+        flash(f"Could not read the archive file. Error: {e}", 'danger')
+        return redirect(url_for('archive.dashboard'))
+    return render_template('admin/archive/view_archive.html', title='View Archive',
+                           filename=filename, source=source, tables=tables, size=os.path.getsize(path))
+
+
+@archive_bp.route('/browse/<filename>/<table>', defaults={'source': 'archive'})
+@archive_bp.route('/uploads/<filename>/<table>', defaults={'source': 'upload'})
+@login_required
+@permission_required(PermissionNames.CAN_MANAGE_ARCHIVES)
+def browse_table(filename, table, source):
+    path = _archive_path(filename, source)
+    filters = {key[2:]: value for key, value in request.args.items() if key.startswith('f.') and value}
+    try:
+        conn = open_archive(path)
+        try:
+            columns, page = browse_rows(conn, table, filters,
+                                        cursor=request.args.get('cursor'),
+                                        per_page=request.args.get('per_page', type=int))
+        finally:
+            conn.close()
+    except ArchiveError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('archive.browse_archive', filename=filename, source=source))
+    return render_template('admin/archive/archive_table.html', title=f'{table} - {filename}',
+                           filename=filename, source=source, table=table, columns=columns, page=page, filters=filters)
+
+
+@archive_bp.route('/search')
+@login_required
+@permission_required(PermissionNames.CAN_MANAGE_ARCHIVES)
+def search():
+    query = request.args.get('q', '').strip()
+    field = request.args.get('by', 'uid')
+    if field not in SEARCH_FIELDS:
+        field = 'uid'
+    results = None
+    if query:
+        db_path = current_app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+        results = federated_search(current_app.config, field, query, db_path)
+    return render_template('admin/archive/search.html', title='Search Records and Archives',
+                           query=query, field=field, results=results)
@@ -0,0 +1,130 @@
+import os
+import threading
+
+from pagination import KeysetPage, encode_cursor, decode_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from sqlite_profile import connect_readonly
+
+# --- Archive Browser ---
+# Archive databases are read where they lie in ARCHIVE_FOLDER, through a read-only,
+# immutable, memory-mapped connection (sqlite_profile.connect_readonly); nothing is copied.
+# Rows are shown a page at a time in rowid order with the same keyset cursors as the
+# list pages of the app (pagination.KeysetPage), and filters are WHERE clauses, so a page
+# costs the same whether the archive holds a thousand rows or ten million.
+# Filters are given per column as ?f.<column>=<text> and match rows containing the text.
+
+SQLITE_MAGIC = b'SQLite format 3\x00'
+CELL_PREVIEW = 200  # Characters of a text value shown in a table cell
+
+_count_cache = {}
+_count_lock = threading.Lock()
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def is_sqlite_file(path):
+    with open(path, 'rb') as f:
+        return f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+
+
+def open_archive(path):
+    if not os.path.isfile(path) or not is_sqlite_file(path):
+        raise ArchiveError(f"{os.path.basename(path)} is not an SQLite database.")
+    return connect_readonly(path)
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def table_names(conn):
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table)})")]
+
+
+def list_tables(conn, path):
+    """Returns [(table, row count)]. The counts of a file are computed once per version
+    of it (its size and modification time), since counting scans every table."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _count_lock:
+        cached = _count_cache.get(key)
+    if cached is None:
+        cached = [(table, conn.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0])
+                  for table in table_names(conn)]
+        with _count_lock:
+            # Older versions of the same file will not be asked for again
+            for stale in [k for k in _count_cache if k[0] == key[0]]:
+                del _count_cache[stale]
+            _count_cache[key] = cached
+    return cached
+
+
+def _filter_clause(columns, filters):
+    clauses, params = [], []
+    for column, text in filters.items():
+        if column not in columns:
+            raise ArchiveError(f"Unknown column '{column}'.")
+        escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        clauses.append(f"{_quote(column)} LIKE ? ESCAPE '\\'")
+        params.append(f"%{escaped}%")
+    return clauses, params
+
+
+def browse_rows(conn, table, filters=None, cursor=None, per_page=None):
+    """Returns (columns, KeysetPage of row tuples) of one page of `table` in rowid order.
+    `filters` is {column: text}; only rows whose column contains the text are returned."""
+    if table not in table_names(conn):
+        raise ArchiveError(f"The archive has no table '{table}'.")
+    columns = table_columns(conn, table)
+    per_page = min(max(int(per_page or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+
+    direction, key = 'n', None
+    if cursor:
+        try:
+            direction, key = decode_cursor(cursor, 1)
+        except ValueError as e:
+            raise ArchiveError(str(e))
+    forward = direction == 'n'
+
+    clauses, params = _filter_clause(columns, filters or {})
+    if key is not None:
+        clauses.append("rowid > ?" if forward else "rowid < ?")
+        params.append(key[0])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    column_list = ', '.join(_quote(c) for c in columns)
+    try:
+        rows = conn.execute(
+            f"SELECT rowid, {column_list} FROM {_quote(table)} {where} "
+            f"ORDER BY rowid {'ASC' if forward else 'DESC'} LIMIT ?", params + [per_page + 1]).fetchall()
+    except Exception as e:
+        # e.g. a WITHOUT ROWID table
+        raise ArchiveError(f"Cannot page through '{table}': {e}")
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+    if not rows and not forward:
+        return browse_rows(conn, table, filters, None, per_page)
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or not forward:
+            next_cursor = encode_cursor('n', [rows[-1][0]])
+        if key is not None and (forward or has_more):
+            prev_cursor = encode_cursor('p', [rows[0][0]])
+    items = [tuple(_display(value) for value in row[1:]) for row in rows]
+    return columns, KeysetPage(items, per_page, next_cursor, prev_cursor)
+
+
+def _display(value):
+    if isinstance(value, bytes):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, str) and len(value) > CELL_PREVIEW:
+        return value[:CELL_PREVIEW] + '...'
+    return value
@@ -0,0 +1,159 @@
+import os
+import sqlite3
+
+from sqlite_profile import connect
+
+# --- Archive Engine ---
+# Moves old records out of laboratory.db into a separate archive database. Everything runs
+# on one raw connection to the live database with the archive ATTACHed, so rows are copied
+# with INSERT ... SELECT inside SQLite, in batches of ARCHIVE_BATCH_SIZE samples (or NSC
+# records), each batch in its own short write transaction:
+#
+#   sample_sc submitted before the end date, with its sample_image, diagnosis and
+#   diagnosis_attachment rows; consultancy_nsc dated before it, with its nsc_image rows;
+#   and the applicant rows of both (an applicant leaves the live database once nothing of
+#   theirs is left there).
+#
+# foreign_keys is off on this connection: the archive has no user or department tables
+# for its rows to point at. Children are therefore deleted before their parents by hand.
+# Uploaded files are not moved; the archived rows keep referring to them by name.
+# Rows are copied with plain INSERTs: if an id is already taken in the archive (ids are
+# reused by the live database once the highest one has been archived), the batch is rolled
+# back and nothing is deleted. The app gives every run a file of its own.
+# Finally the live database is VACUUMed so the freed pages are returned to the disk.
+
+BATCH = "SELECT id FROM temp.archive_batch"
+
+# (table, rows of the current batch) in copy order; deletes run in reverse, children first
+SAMPLE_FAMILY = [
+    ('sample_sc', f"id IN ({BATCH})"),
+    ('sample_image', f"sample_sc_id IN ({BATCH})"),
+    ('diagnosis', f"sample_sc_id IN ({BATCH})"),
+    ('diagnosis_attachment', f"diagnosis_id IN (SELECT id FROM main.diagnosis WHERE sample_sc_id IN ({BATCH}))"),
+]
+NSC_FAMILY = [
+    ('consultancy_nsc', f"id IN ({BATCH})"),
+    ('nsc_image', f"consultancy_nsc_id IN ({BATCH})"),
+]
+ARCHIVE_TABLES = ['applicant'] + [table for table, _ in SAMPLE_FAMILY + NSC_FAMILY]
+
+
+def _columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f'PRAGMA {schema}.table_info("{table}")')]
+
+
+def _create_archive_schema(conn):
+    """Creates the archived tables (and their indexes) in the archive with the live definitions."""
+    rows = conn.execute(
+        "SELECT type, name, tbl_name, sql FROM main.sqlite_master "
+        "WHERE sql IS NOT NULL AND tbl_name IN (%s) ORDER BY type DESC" % ','.join('?' * len(ARCHIVE_TABLES)),
+        ARCHIVE_TABLES).fetchall()
+    existing = {row[0] for row in conn.execute("SELECT name FROM archive.sqlite_master")}
+    for object_type, name, _, sql in rows:
+        if name in existing:
+            continue
+        # "CREATE TABLE applicant (" -> "CREATE TABLE archive.applicant ("
+        keyword = 'TABLE' if object_type == 'table' else 'INDEX'
+        head, _, rest = sql.partition(keyword)
+        if object_type == 'index':
+            # Index names are schema-qualified; the table they are on is not
+            conn.execute(f'{head}INDEX archive.{rest.strip()}')
+        else:
+            conn.execute(f'{head}TABLE archive.{rest.strip()}')
+
+
+class ArchiveConflictError(RuntimeError):
+    pass
+
+
+def _copy_rows(conn, table, where, params=(), or_ignore=False):
+    """Copies the matching rows of main.table to archive.table, columns matched by name."""
+    columns = [c for c in _columns(conn, 'archive', table) if c in set(_columns(conn, 'main', table))]
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    try:
+        cursor = conn.execute(
+            f'INSERT {"OR IGNORE " if or_ignore else ""}INTO archive."{table}" ({column_list}) '
+            f'SELECT {column_list} FROM main."{table}" WHERE {where}', params)
+    except sqlite3.IntegrityError as e:
+        raise ArchiveConflictError(
+            f"{table} rows of this batch are already in the archive under the same ids ({e}).") from e
+    return cursor.rowcount
+
+
+def _copy_applicants(conn, where):
+    """Copies the applicants of a batch. An applicant already archived by an earlier batch is
+    skipped, but only if the archived row is the same applicant (same uid)."""
+    clash = conn.execute(
+        f'SELECT m.uid, a.uid FROM main.applicant m JOIN archive.applicant a ON a.id = m.id '
+        f'WHERE m.{where} AND a.uid != m.uid LIMIT 1').fetchone()
+    if clash:
+        raise ArchiveConflictError(
+            f"Applicant {clash[0]} has the id of applicant {clash[1]}, which is already in the archive.")
+    return _copy_rows(conn, 'applicant', where, or_ignore=True)
+
+
+def _archive_family(conn, family, date_column, end_date, batch_size, counts):
+    root = family[0][0]
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM temp.archive_batch")
+            selected = conn.execute(
+                f'INSERT INTO temp.archive_batch (id) SELECT id FROM main."{root}" '
+                f'WHERE "{date_column}" < ? ORDER BY id LIMIT ?', (end_date, batch_size)).rowcount
+            if not selected:
+                conn.execute("ROLLBACK")
+                return
+            conn.execute(f'INSERT OR IGNORE INTO temp.archive_applicants (id) '
+                         f'SELECT applicant_id FROM main."{root}" WHERE id IN ({BATCH})')
+            counts['applicant'] += _copy_applicants(
+                conn, f'id IN (SELECT applicant_id FROM main."{root}" WHERE id IN ({BATCH}))')
+
+            for table, where in family:
+                counts[table] += _copy_rows(conn, table, where)
+            for table, where in reversed(family):
+                conn.execute(f'DELETE FROM main."{table}" WHERE {where}')
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def archive_records(db_path, archive_path, end_date, batch_size=500):
+    """Moves samples submitted and NSC records dated before `end_date` (a date) from the
+    live database into the archive database at `archive_path`, created if needed.
+    Returns {table: rows archived}."""
+    counts = {table: 0 for table in ARCHIVE_TABLES}
+    cutoff = end_date.isoformat()
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+    # Transactions are managed by hand; the archive has no tables its foreign keys could point to
+    conn = connect(db_path, foreign_keys='OFF', isolation_level=None)
+    try:
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+        conn.execute("PRAGMA archive.journal_mode=DELETE")  # A single self-contained file
+        _create_archive_schema(conn)
+        conn.execute("CREATE TEMP TABLE archive_batch (id INTEGER PRIMARY KEY)")
+        conn.execute("CREATE TEMP TABLE archive_applicants (id INTEGER PRIMARY KEY)")
+
+        _archive_family(conn, SAMPLE_FAMILY, 'submission_date', cutoff, batch_size, counts)
+        _archive_family(conn, NSC_FAMILY, 'date', cutoff, batch_size, counts)
+
+        # Applicants go once none of their samples or consultancies are left in the live database
+        conn.execute("BEGIN IMMEDIATE")
+        removed = conn.execute(
+            "DELETE FROM main.applicant WHERE id IN (SELECT id FROM temp.archive_applicants) "
+            "AND NOT EXISTS (SELECT 1 FROM main.sample_sc s WHERE s.applicant_id = applicant.id) "
+            "AND NOT EXISTS (SELECT 1 FROM main.consultancy_nsc n WHERE n.applicant_id = applicant.id)").rowcount
+        conn.execute("COMMIT")
+        counts['applicant_removed'] = removed
+
+        conn.execute("DETACH DATABASE archive")
+        if any(counts.values()):
+            try:
+                conn.execute("VACUUM")
+            except Exception as e:
+                # Busy readers can keep VACUUM from running; the pages are reused either way
+                print(f"Could not VACUUM the live database after archiving: {e}")
+    finally:
+        conn.close()
+    return counts
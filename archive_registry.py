@@ -0,0 +1,157 @@
+import base64
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from datetime import datetime
+
+from sqlite_profile import connect_readonly
+
+# --- Archive Registry ---
+# A summary of every archive database in ARCHIVE_FOLDER, kept in ARCHIVE_REGISTRY (a JSON
+# file under instance/) so searches can tell which archives cannot hold a match without
+# opening them. Each summary has the row counts, the first and last sample submission
+# and NSC dates, and a bloom filter of the applicant and sample UIDs and phone numbers in
+# the archive. A summary belongs to one version of its file (size and mtime); archives
+# that are added, extended or removed are picked up by the next refresh_registry().
+
+FALSE_POSITIVE_RATE = 0.01
+
+_registry_lock = threading.Lock()
+
+
+class BloomFilter:
+    """A set that answers "definitely not present" or "possibly present"."""
+
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE, bits=None, hashes=None, data=None):
+        capacity = max(capacity, 1)
+        self.bits = bits or max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 64)
+        self.hashes = hashes or max(round(self.bits / capacity * math.log(2)), 1)
+        self.data = bytearray(data) if data is not None else bytearray((self.bits + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        # Double hashing: k positions from two 64-bit halves of one digest
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.data[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def to_dict(self):
+        return {'bits': self.bits, 'hashes': self.hashes, 'data': base64.b64encode(bytes(self.data)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, value):
+        return cls(1, bits=value['bits'], hashes=value['hashes'], data=base64.b64decode(value['data']))
+
+
+def normalize_uid(value):
+    return (value or '').strip().upper()
+
+
+def normalize_phone(value):
+    """The last ten digits of a phone number, so '+91 98765-43210' and '9876543210' agree."""
+    return re.sub(r'\D', '', value or '')[-10:]
+
+
+def _table_names(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+
+def _date_range(conn, table, column):
+    low, high = conn.execute(f'SELECT MIN("{column}"), MAX("{column}") FROM "{table}"').fetchone()
+    return [low[:10], high[:10]] if low else None
+
+
+def summarize_archive(path):
+    """Reads the summary of one archive database (see the module comment)."""
+    stat = os.stat(path)
+    conn = connect_readonly(path)
+    try:
+        tables = _table_names(conn)
+        counts = {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+                  for table in ('applicant', 'sample_sc', 'consultancy_nsc') if table in tables}
+        bloom = BloomFilter(2 * counts.get('applicant', 0) + counts.get('sample_sc', 0))
+        if 'applicant' in tables:
+            for uid, phone in conn.execute("SELECT uid, phone FROM applicant"):
+                bloom.add('uid:' + normalize_uid(uid))
+                if normalize_phone(phone):
+                    bloom.add('phone:' + normalize_phone(phone))
+        if 'sample_sc' in tables:
+            for (uid,) in conn.execute("SELECT sample_uid FROM sample_sc"):
+                bloom.add('uid:' + normalize_uid(uid))
+        return {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'summarized': datetime.now().isoformat(timespec='seconds'),
+            'counts': counts,
+            'samples': _date_range(conn, 'sample_sc', 'submission_date') if 'sample_sc' in tables else None,
+            'nsc': _date_range(conn, 'consultancy_nsc', 'date') if 'consultancy_nsc' in tables else None,
+            'bloom': bloom.to_dict(),
+        }
+    finally:
+        conn.close()
+
+
+def may_contain(summary, uid=None, phone=None):
+    """False when the summary rules the UID (or full phone number) out for its archive."""
+    bloom = BloomFilter.from_dict(summary['bloom'])
+    if uid is not None and 'uid:' + normalize_uid(uid) not in bloom:
+        return False
+    if phone is not None and 'phone:' + normalize_phone(phone) not in bloom:
+        return False
+    return True
+
+
+# --- Registry File ---
+def load_registry(registry_path):
+    try:
+        with open(registry_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_registry(registry_path, registry):
+    os.makedirs(os.path.dirname(registry_path), exist_ok=True)
+    temp_path = registry_path + '.part'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(registry, f)
+    os.replace(temp_path, registry_path)
+
+
+def refresh_registry(archive_folder, registry_path):
+    """Brings the registry up to date with the .db files in `archive_folder`.
+    Returns {filename: summary}; files that cannot be read are left out."""
+    with _registry_lock:
+        registry = load_registry(registry_path)
+        present = set()
+        changed = False
+        if os.path.isdir(archive_folder):
+            for entry in os.scandir(archive_folder):
+                if not entry.is_file() or not entry.name.endswith('.db'):
+                    continue
+                present.add(entry.name)
+                stat = entry.stat()
+                summary = registry.get(entry.name)
+                if summary and summary['size'] == stat.st_size and summary['mtime_ns'] == stat.st_mtime_ns:
+                    continue
+                try:
+                    registry[entry.name] = summarize_archive(entry.path)
+                except Exception as e:
+                    print(f"Could not summarize archive {entry.name}: {e}")
+                    registry.pop(entry.name, None)
+                changed = True
+        for name in set(registry) - present:
+            del registry[name]
+            changed = True
+        if changed:
+            _save_registry(registry_path, registry)
+        return registry
@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from archive_registry import refresh_registry, may_contain, normalize_uid, normalize_phone
+from sqlite_profile import connect_readonly
+
+# --- Federated Search ---
+# Finds applicants and samples by UID, applicant name or phone in the live database and
+# every registered archive at once. Each source is searched on its own read-only
+# connection in a small thread pool; whatever has not answered within the time budget is
+# interrupted and reported as timed out, so one slow archive cannot hold up the page.
+# Archives whose registry summary rules the UID or phone number out are not opened.
+
+SEARCH_FIELDS = ('uid', 'name', 'phone')
+LIVE_SOURCE = 'Live database'
+
+# Digits of applicant.phone, compared against the last ten digits of the query
+PHONE_SQL = "replace(replace(replace(replace(replace(replace(a.phone, ' ', ''), '-', ''), '+', ''), '(', ''), ')', ''), '.', '')"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='archive-search')
+    return _executor
+
+
+def _like(text):
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def _applicant_filter(field, query):
+    """(WHERE clause on applicant a, params) for a search."""
+    if field == 'uid':
+        return "a.uid = ?", [normalize_uid(query)]
+    if field == 'phone':
+        return f"{PHONE_SQL} LIKE ?", ['%' + normalize_phone(query)]
+    return "a.name LIKE ? ESCAPE '\\'", [_like(query.strip())]
+
+
+def search_source(conn, field, query, limit):
+    """Runs one search on an open connection. Returns (applicants, samples) as lists of dicts."""
+    where, params = _applicant_filter(field, query)
+    conn.row_factory = lambda cursor, row: {column[0]: value for column, value in zip(cursor.description, row)}
+    applicants = conn.execute(
+        f"SELECT a.uid, a.name, a.phone, "
+        f"(SELECT COUNT(*) FROM sample_sc s WHERE s.applicant_id = a.id) AS samples, "
+        f"(SELECT COUNT(*) FROM consultancy_nsc n WHERE n.applicant_id = a.id) AS consultancies "
+        f"FROM applicant a WHERE {where} ORDER BY a.name LIMIT ?", params + [limit]).fetchall()
+
+    sample_where, sample_params = f"s.applicant_id IN (SELECT a.id FROM applicant a WHERE {where})", params
+    if field == 'uid':
+        sample_where = f"(s.sample_uid = ? OR {sample_where})"
+        sample_params = [normalize_uid(query)] + params
+    samples = conn.execute(
+        f"SELECT s.sample_uid, s.sample_name, s.submission_date, s.current_status, "
+        f"a.uid AS applicant_uid, a.name AS applicant_name "
+        f"FROM sample_sc s JOIN applicant a ON a.id = s.applicant_id "
+        f"WHERE {sample_where} ORDER BY s.submission_date DESC LIMIT ?", sample_params + [limit]).fetchall()
+    return applicants, samples
+
+
+def _search_file(path, immutable, field, query, limit, connections):
+    started = time.monotonic()
+    conn = connect_readonly(path, immutable=immutable)
+    connections[path] = conn
+    try:
+        applicants, samples = search_source(conn, field, query, limit)
+    finally:
+        connections.pop(path, None)
+        conn.close()
+    return applicants, samples, round((time.monotonic() - started) * 1000)
+
+
+def federated_search(config, field, query, db_path):
+    """Searches the live database at `db_path` and every archive in ARCHIVE_FOLDER.
+
+    Returns {'applicants', 'samples', 'sources', 'elapsed_ms'}: the merged rows (each with
+    a 'source', None for the live database) and one status entry per source, one of
+    'found', 'no match', 'skipped', 'timed out' or 'error'."""
+    if field not in SEARCH_FIELDS:
+        raise ValueError(f"Cannot search by '{field}'.")
+    started = time.monotonic()
+    limit = config['ARCHIVE_SEARCH_LIMIT']
+    archive_folder = config['ARCHIVE_FOLDER']
+    registry = refresh_registry(archive_folder, config['ARCHIVE_REGISTRY'])
+
+    sources = [{'name': LIVE_SOURCE, 'archive': None, 'path': db_path, 'immutable': False}]
+    for name in sorted(registry, reverse=True):
+        summary = registry[name]
+        source = {'name': name, 'archive': name, 'path': os.path.join(archive_folder, name), 'immutable': True,
+                  'samples': summary.get('samples'), 'nsc': summary.get('nsc')}
+        if field == 'uid' and not may_contain(summary, uid=query):
+            source['status'] = 'skipped'
+        elif field == 'phone' and len(normalize_phone(query)) == 10 and not may_contain(summary, phone=query):
+            source['status'] = 'skipped'
+        sources.append(source)
+
+    executor = _get_executor(config['ARCHIVE_SEARCH_WORKERS'])
+    connections = {}
+    futures = {executor.submit(_search_file, source['path'], source['immutable'], field, query, limit, connections): source
+               for source in sources if 'status' not in source}
+    budget = config['ARCHIVE_SEARCH_BUDGET']
+    done, pending = wait(futures, timeout=max(budget - (time.monotonic() - started), 0))
+    for future in pending:
+        future.cancel()
+        conn = connections.get(futures[future]['path'])
+        if conn is not None:
+            conn.interrupt()  # The query stops with an error that nobody waits for
+        futures[future]['status'] = 'timed out'
+
+    applicants, samples = {}, []
+    for future in done:
+        source = futures[future]
+        try:
+            found_applicants, found_samples, source['elapsed_ms'] = future.result()
+        except Exception as e:
+            source.update(status='error', error=str(e))
+            continue
+        source['status'] = 'found' if found_applicants or found_samples else 'no match'
+        for row in found_applicants:
+            # An applicant can be in the live database and in archives at the same time
+            merged = applicants.setdefault(row['uid'], dict(row, samples=0, consultancies=0, sources=[]))
+            merged['samples'] += row['samples']
+            merged['consultancies'] += row['consultancies']
+            merged['sources'].append(source['archive'])
+        samples.extend(dict(row, source=source['archive']) for row in found_samples)
+
+    for source in sources:
+        source.pop('path')
+        source.pop('immutable')
+    order = {source['archive']: i for i, source in enumerate(sources)}
+    for row in applicants.values():
+        row['sources'].sort(key=order.get)
+    return {
+        'applicants': sorted(applicants.values(), key=lambda row: (row['name'] or '').lower())[:limit],
+        'samples': sorted(samples, key=lambda row: row['submission_date'] or '', reverse=True)[:limit],
+        'sources': sources,
+        'elapsed_ms': round((time.monotonic() - started) * 1000),
+    }
@@ -0,0 +1,108 @@
+import queue
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import insert
+
+from models import db, AuditLog, get_ist_time
+
+# --- Batched Audit Log Writer ---
+# log_action() only puts the event on a bounded queue. A background thread writes queued
+# events in one transaction every AUDIT_BATCH_SIZE events or AUDIT_FLUSH_INTERVAL_MS
+# milliseconds, whichever comes first, so an audited request commits once instead of twice.
+# If the queue is full the event is written straight away by the request itself.
+
+_STOP = object()
+
+
+class AuditWriter:
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AUDIT_BATCH_SIZE', 50)
+        app.config.setdefault('AUDIT_FLUSH_INTERVAL_MS', 50)
+        app.config.setdefault('AUDIT_QUEUE_SIZE', 1000)
+        self.app = app
+        self._queue = queue.Queue(maxsize=app.config['AUDIT_QUEUE_SIZE'])
+        app.extensions['audit_writer'] = self
+
+    def _ensure_started(self):
+        # Started on first use, so importing the app never spawns a thread by itself
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def log(self, action, user_id=None):
+        """Queues one audit event, or writes it immediately if the queue is full."""
+        row = {'user_id': user_id, 'action': action, 'timestamp': get_ist_time()}
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._write([row])
+
+    def flush(self):
+        """Blocks until every event queued so far has been written."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def stop(self):
+        """Writes the remaining events and stops the background thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        batch_size = self.app.config['AUDIT_BATCH_SIZE']
+        interval = self.app.config['AUDIT_FLUSH_INTERVAL_MS'] / 1000
+        stopping = False
+        while not stopping:
+            batch = []
+            item = self._queue.get()
+            deadline = time.monotonic() + interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for _ in range(len(batch) + (1 if stopping else 0)):
+                self._queue.task_done()
+
+    def _write(self, rows):
+        with self.app.app_context():
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(insert(AuditLog), rows)
+            except Exception as e:
+                if len(rows) == 1:
+                    print(f"Error writing audit log entry {rows[0]['action']!r}: {e}")
+                    return
+                # Don't let one bad row (e.g. a user deleted meanwhile) lose the whole batch
+                for row in rows:
+                    self._write([row])
+
+
+def flush_audit_log():
+    """Writes all pending audit events of the current app, e.g. before reading the log."""
+    writer = current_app.extensions.get('audit_writer')
+    if writer is not None:
+        writer.flush()
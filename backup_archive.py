@@ -0,0 +1,404 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlite_profile import snapshot, integrity_check, vacuum_into
+
+# --- Streaming Backup Archives ---
+# A backup is written as a ZIP straight into the HTTP response: zipfile writes into a
+# StreamSink, and after every chunk the generator hands whatever the sink holds to the
+# WSGI server. The sink cannot seek, so zipfile puts each entry's sizes and CRC in a data
+# descriptor after the data instead of going back to patch the local header. Memory use is
+# a single chunk (plus the deflate window) however large the uploads are.
+# Photos, PDFs and other already-compressed files are STORED: deflating them again costs
+# CPU and saves nothing. The database goes in as a snapshot taken with SQLite's backup API
+# while the app keeps running, checked with integrity_check before it is packed.
+#
+# Every archive ends with manifest.json, listing size, mtime and SHA-256 of each file in
+# the uploads and shared files trees at the time of the backup. The same manifest is kept
+# on the server, so a later backup can be incremental: it only packs the files that are
+# new or changed since that base (plus the database, which is always included), while its
+# manifest still describes the complete tree. Restoring a base followed by its chain of
+# incrementals gives the state of the last one.
+#
+# Files still being written (*.tmp, *.part) are never packed, nor are the image variants
+# under uploads/variants: they are rebuilt from the originals with `python image_variants.py`.
+
+CHUNK_SIZE = 256 * 1024
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_FORMAT = 1
+DATABASE_ARCNAME = 'database/laboratory.db'
+
+PARTIAL_SUFFIXES = ('.tmp', '.part')  # Files that are still being written
+EXCLUDED_DIRECTORIES = {'uploads': {'variants'}}  # {tree prefix: top-level folders left out}
+
+STORED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.pdf',
+    '.zip', '.gz', '.br', '.7z', '.rar', '.xlsx', '.docx', '.pptx',
+    '.mp3', '.mp4', '.m4a', '.mov', '.avi', '.mkv',
+}
+
+# Blob store files have no extension, so their first bytes decide
+COMPRESSED_SIGNATURES = (
+    b'\xff\xd8\xff',        # JPEG
+    b'\x89PNG\r\n\x1a\n',   # PNG
+    b'GIF8',                # GIF
+    b'%PDF',                # PDF
+    b'PK\x03\x04',          # ZIP, and the Office formats built on it
+    b'\x1f\x8b',            # gzip
+    b'7z\xbc\xaf\x27\x1c',  # 7-Zip
+    b'Rar!',                # RAR
+)
+
+
+class StreamSink:
+    """A write-only file for zipfile that collects output until it is drained.
+    It has tell() but no seek(), which makes zipfile stream."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def is_compressed(path):
+    """True for files that would not shrink if deflated."""
+    if os.path.splitext(path)[1].lower() in STORED_EXTENSIONS:
+        return True
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(16)
+    except OSError:
+        return False
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return True
+    return head.startswith(COMPRESSED_SIGNATURES)
+
+
+def backup_trees(config):
+    """The (arcname prefix, folder) pairs a backup contains besides the database."""
+    return [('uploads', config['UPLOAD_FOLDER']),
+            ('shared_files', config['SHARED_FOLDER']),
+            ('archives', config['ARCHIVE_FOLDER'])]
+
+
+def walk_tree(directory, prefix):
+    """Yields (path, arcname) for every file under directory, arcnames starting with prefix/."""
+    for root, dirs, files in os.walk(directory):
+        if root == directory:
+            dirs[:] = [name for name in dirs if name not in EXCLUDED_DIRECTORIES.get(prefix, ())]
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(PARTIAL_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory).replace(os.sep, '/')
+            yield path, f"{prefix}/{relative}"
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def stream_zip(entries, digests=None, trailer=None):
+    """Generates a ZIP archive of (path, arcname) entries as a sequence of byte chunks.
+    `digests`, if given, receives {arcname: (size, sha256)} of the bytes written.
+    `trailer` is called after the last entry and returns further (arcname, bytes) members."""
+    sink = StreamSink()
+    with zipfile.ZipFile(sink, 'w') as zf:
+        for path, arcname in entries:
+            try:
+                zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            except FileNotFoundError:
+                continue  # Deleted while the backup was running
+            zinfo.compress_type = zipfile.ZIP_STORED if is_compressed(path) else zipfile.ZIP_DEFLATED
+            sha256 = hashlib.sha256()
+            size = 0
+            with open(path, 'rb') as src, zf.open(zinfo, 'w') as dest:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    dest.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            # Closing the entry writes the rest of the deflate stream and its data descriptor
+            yield sink.drain()
+            if digests is not None:
+                digests[arcname] = (size, sha256.hexdigest())
+        for arcname, content in (trailer() if trailer else ()):
+            zf.writestr(arcname, content, compress_type=zipfile.ZIP_DEFLATED)
+            yield sink.drain()
+    # ...and closing the archive the central directory
+    yield sink.drain()
+
+
+def database_snapshot(db_path, vacuum=False):
+    """Takes a verified snapshot of the live database next to it and returns its path.
+    With `vacuum` the snapshot is compacted first. The caller removes the file."""
+    fd, path = tempfile.mkstemp(dir=os.path.dirname(db_path), prefix='snapshot_', suffix='.db')
+    os.close(fd)
+    try:
+        restarts = snapshot(db_path, path)
+        if restarts:
+            print(f"Database snapshot restarted {restarts} times because of concurrent writes.")
+        problems = integrity_check(path)
+        if problems:
+            raise RuntimeError(f"The database snapshot failed the integrity check: {problems[0]}")
+        if vacuum:
+            compacted = path + '.vacuum'
+            vacuum_into(path, compacted)
+            os.replace(compacted, path)
+    except BaseException:
+        for leftover in (path, path + '.vacuum'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    return path
+
+
+# --- Manifests and Incremental Backups ---
+def new_manifest(backup_id, created, base=None):
+    return {
+        'format': MANIFEST_FORMAT,
+        'id': backup_id,
+        'created': created,
+        'kind': 'incremental' if base else 'full',
+        'base': base['id'] if base else None,
+        'files': {},
+    }
+
+
+def stream_backup(db_path, trees, manifest, base=None):
+    """Generates a backup archive of the database and the (arcname prefix, directory) trees.
+    With a `base` manifest only new and changed files are packed. manifest['files'] is
+    complete once the generator is exhausted."""
+    base_files = base['files'] if base else None
+    files = manifest['files']
+    digests = {}
+
+    def entries():
+        yield db_path, DATABASE_ARCNAME
+        for prefix, directory in trees:
+            for path, arcname in walk_tree(directory, prefix):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                previous = base_files.get(arcname) if base_files else None
+                if previous and previous['size'] == stat.st_size:
+                    if previous['mtime_ns'] == stat.st_mtime_ns:
+                        files[arcname] = previous
+                        continue
+                    # Touched but possibly unchanged: only the hash can tell
+                    sha256 = file_sha256(path)
+                    if sha256 == previous['sha256']:
+                        files[arcname] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+                        continue
+                files[arcname] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': None}
+                yield path, arcname
+
+    def trailer():
+        for arcname, (size, sha256) in digests.items():
+            if arcname in files:
+                files[arcname].update(size=size, sha256=sha256)
+        # Entries still without a hash vanished before they could be packed
+        for arcname in [name for name, entry in files.items() if entry['sha256'] is None]:
+            del files[arcname]
+        return [(MANIFEST_NAME, json.dumps(manifest, sort_keys=True).encode('utf-8'))]
+
+    yield from stream_zip(entries(), digests, trailer)
+
+
+def save_manifest(folder, manifest):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{manifest['id']}.json")
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def load_manifest(folder, backup_id):
+    """Returns a saved manifest, or None if there is no backup with that id."""
+    path = os.path.join(folder, f"{os.path.basename(backup_id)}.json")
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def list_manifests(folder):
+    """Returns the saved manifests, newest first."""
+    if not os.path.isdir(folder):
+        return []
+    ids = sorted((name[:-5] for name in os.listdir(folder) if name.endswith('.json')), reverse=True)
+    return [manifest for manifest in (load_manifest(folder, backup_id) for backup_id in ids) if manifest]
+
+
+def read_manifest(zf):
+    """Returns the manifest of an open backup archive, or None for backups made before manifests."""
+    try:
+        return json.loads(zf.read(MANIFEST_NAME))
+    except KeyError:
+        return None
+
+
+def order_chain(archives):
+    """Orders (zipfile, manifest) pairs from the full backup to the last incremental.
+    Raises ValueError if they do not form one complete chain."""
+    if len(archives) == 1 and archives[0][1] is None:
+        return archives  # A single backup from before manifests
+    if any(manifest is None for _, manifest in archives):
+        raise ValueError('Only backups with a manifest can be combined.')
+    by_id = {manifest['id']: (zf, manifest) for zf, manifest in archives}
+    bases = {manifest['base'] for _, manifest in archives}
+    tips = [backup_id for backup_id in by_id if backup_id not in bases]
+    if len(tips) != 1:
+        raise ValueError('The backups do not form a single chain.')
+    chain = []
+    backup_id = tips[0]
+    while backup_id is not None:
+        if backup_id not in by_id:
+            raise ValueError(f'Backup {backup_id} is missing from the chain.')
+        chain.append(by_id.pop(backup_id))
+        backup_id = chain[-1][1]['base']
+    if by_id:
+        raise ValueError('Some backups do not belong to the chain.')
+    return chain[::-1]
+
+
+# --- Staged Restore ---
+# A restore never touches the live data until everything is ready: the chain is extracted
+# into a .restore-<token> directory next to each target (so the final move is a rename on
+# the same file system), every file is checked against its manifest SHA-256 (zipfile
+# checks the CRC), and the database must pass integrity_check. Only then are the live
+# database and folders renamed aside and the staged ones renamed into their place.
+
+def _member_parts(arcname):
+    """Splits an archive member name, rejecting names that could escape the target folder."""
+    parts = arcname.split('/')
+    if arcname.startswith('/') or '\\' in arcname or ':' in parts[0] or '..' in parts:
+        raise ValueError(f"The backup contains an unsafe path: {arcname}")
+    return parts
+
+
+def plan_restore(chain, prefixes):
+    """Decides where every file of the restored state comes from.
+    Returns ({arcname: (zipfile, member, manifest entry)}, (zipfile, member) of the database)."""
+    tip = chain[-1][1]
+    sources = {}
+    for zf, manifest in chain:
+        for member in zf.infolist():
+            parts = _member_parts(member.filename)
+            if member.is_dir() or member.filename in (MANIFEST_NAME, DATABASE_ARCNAME):
+                continue
+            if parts[0] in prefixes and len(parts) > 1:
+                # A later backup of the chain replaces the copy of an earlier one
+                entry = manifest['files'].get(member.filename) if manifest else None
+                sources[member.filename] = (zf, member, entry)
+    if tip is not None:
+        sources = {arcname: source for arcname, source in sources.items() if arcname in tip['files']}
+        missing = [arcname for arcname in tip['files'] if arcname not in sources]
+        if missing:
+            raise ValueError(f"{len(missing)} files of the backup are missing from the archives, e.g. {missing[0]}")
+    database = chain[-1][0].getinfo(DATABASE_ARCNAME)
+    return sources, (chain[-1][0], database)
+
+
+def _extract_verified(zf, member, path, entry):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    sha256 = hashlib.sha256()
+    with zf.open(member) as src, open(path, 'wb') as dest:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+            dest.write(chunk)
+    if entry:
+        if sha256.hexdigest() != entry['sha256']:
+            raise ValueError(f"Checksum mismatch for {member.filename}")
+        # Keep the recorded mtime so the next incremental does not rehash the file
+        os.utime(path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+
+
+def stage_path(live_path, token):
+    return os.path.join(os.path.dirname(live_path), f".restore-{token}", os.path.basename(live_path))
+
+
+def stage_restore(chain, db_path, targets, token, workers=4):
+    """Extracts the chain next to the live data. `targets` maps arcname prefixes to live
+    folders. Returns {live path: staged path}; raises ValueError if anything fails to verify."""
+    sources, (db_zip, db_member) = plan_restore(chain, targets)
+    staged = {live: stage_path(live, token) for live in [db_path, *targets.values()]}
+    for live in targets.values():
+        os.makedirs(staged[live], exist_ok=True)
+
+    jobs = [(db_zip, db_member, staged[db_path], None)]
+    for arcname, (zf, member, entry) in sources.items():
+        prefix, _, relative = arcname.partition('/')
+        jobs.append((zf, member, os.path.join(staged[targets[prefix]], *relative.split('/')), entry))
+    # zipfile serializes the reads; decompression, hashing and writing run in parallel
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(_extract_verified, *job) for job in jobs]:
+            future.result()
+
+    problems = integrity_check(staged[db_path])
+    if problems:
+        raise ValueError(f"The restored database failed the integrity check: {problems[0]}")
+    return staged
+
+
+def swap_into_place(staged, token, extra_aside=()):
+    """Renames the live paths aside and the staged ones into their place. `extra_aside`
+    are live files that only have to go (e.g. WAL sidecars). If a rename fails, what was
+    already moved is put back. Returns the paths that were moved aside."""
+    moves = []  # (from, to) in the order done
+    asides = []
+    try:
+        for live in list(staged) + list(extra_aside):
+            if os.path.lexists(live):
+                aside = os.path.join(os.path.dirname(live), f".restore-{token}", f"old-{os.path.basename(live)}")
+                os.makedirs(os.path.dirname(aside), exist_ok=True)
+                os.rename(live, aside)
+                moves.append((live, aside))
+                asides.append(aside)
+        for live, staged_path in staged.items():
+            os.rename(staged_path, live)
+            moves.append((staged_path, live))
+    except OSError:
+        for source, destination in reversed(moves):
+            os.rename(destination, source)
+        raise
+    return asides
+
+
+def remove_stage(live_paths, token):
+    """Deletes the .restore-<token> directories, with the old data moved aside into them."""
+    for directory in {os.path.dirname(stage_path(live, token)) for live in live_paths}:
+        if os.path.exists(directory):
+            shutil.rmtree(directory, ignore_errors=True)
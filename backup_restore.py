@@ -1,14 +1,18 @@
 import os
-import shutil
 import zipfile
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_file, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, abort, Response, stream_with_context
 from flask_login import login_required, current_user
 from datetime import datetime
 import pytz
-import io
 
-from models import db
+from models import db, clear_process_caches
 from forms import RestoreForm
+from sqlite_profile import sidecar_files
+from audit import flush_audit_log
+from uid_allocator import uid_allocator
+from backup_archive import (backup_trees, database_snapshot, new_manifest, stream_backup, save_manifest, load_manifest,
+                            list_manifests, read_manifest, order_chain, stage_restore, swap_into_place, remove_stage)
+from schema_upgrade import upgrade_schema
 
 # Create a Blueprint
 backup_bp = Blueprint('backup', __name__, url_prefix='/backup', template_folder='templates')
@@ -28,93 +32,145 @@ def admin_required(f):
 @admin_required
 def index():
     form = RestoreForm()
-    return render_template('admin/backup_restore.html', title='Backup & Restore', form=form)
+    backups = list_manifests(current_app.config['BACKUP_MANIFEST_FOLDER'])
+    return render_template('admin/backup_restore.html', title='Backup & Restore', form=form, backups=backups)
 
 @backup_bp.route('/create')
 @admin_required
 def create_backup():
-    """Creates a zip file containing the database and all uploaded files."""
+    """Streams a zip file containing the database and all uploaded files.
+    With ?base=<backup id> only the files added or changed since that backup are included."""
     try:
-        timestamp = datetime.now(pytz.timezone('Asia/Kolkata')).strftime('%Y-%m-%d_%H-%M-%S')
-        backup_filename = f'samplyze_backup_{timestamp}.zip'
+        now = datetime.now(pytz.timezone('Asia/Kolkata'))
+        timestamp = now.strftime('%Y-%m-%d_%H-%M-%S')
+        manifest_folder = current_app.config['BACKUP_MANIFEST_FOLDER']
+
+        base = None
+        if request.args.get('base'):
+            base = load_manifest(manifest_folder, request.args['base'])
+            if base is None:
+                flash('The selected base backup is not known on this server.', 'danger')
+                return redirect(url_for('backup.index'))
+        manifest = new_manifest(timestamp, now.isoformat(), base)
+        suffix = '_incremental' if base else ''
+        backup_filename = f'samplyze_backup_{timestamp}{suffix}.zip'
         
         # Paths
         db_path = current_app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
-        uploads_path = current_app.config['UPLOAD_FOLDER']
-        shared_path = current_app.config['SHARED_FOLDER']
-        
-        # Create a zip file in memory
-        memory_file = io.BytesIO()
-        with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-            # 1. Add database
-            zf.write(db_path, arcname='database/laboratory.db')
-            
-            # 2. Add uploaded files
-            for root, _, files in os.walk(uploads_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.join('uploads', os.path.relpath(file_path, uploads_path))
-                    zf.write(file_path, arcname)
-
-            # 3. Add shared files
-            for root, _, files in os.walk(shared_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.join('shared_files', os.path.relpath(file_path, shared_path))
-                    zf.write(file_path, arcname)
-
-        memory_file.seek(0)
         
+        # A consistent copy of the live database, WAL included, verified before it is sent
+        snapshot_path = database_snapshot(db_path, vacuum=current_app.config.get('BACKUP_VACUUM', False))
+
+        # 1. Database, 2. uploaded files, 3. shared files, 4. archive databases
+        trees = backup_trees(current_app.config)
+
+        def generate():
+            # Errors after the first byte can no longer become a redirect: log them and stop,
+            # leaving a truncated archive that will not open
+            try:
+                yield from stream_backup(snapshot_path, trees, manifest, base)
+            except Exception as e:
+                print(f"Error while streaming backup {backup_filename}: {e}")
+                return
+            # Only a backup that was sent completely can be the base of the next one
+            save_manifest(manifest_folder, manifest)
+
         flash('Backup created successfully.', 'success')
-        return send_file(memory_file, download_name=backup_filename, as_attachment=True)
+        response = Response(stream_with_context(generate()), mimetype='application/zip')
+        response.headers['Content-Disposition'] = f'attachment; filename="{backup_filename}"'
+        # Also runs when the download is aborted before the generator started
+        response.call_on_close(lambda: os.path.exists(snapshot_path) and os.remove(snapshot_path))
+        return response
 
     except Exception as e:
         flash(f'An error occurred while creating the backup: {e}', 'danger')
         return redirect(url_for('backup.index'))
 
 
+@backup_bp.route('/schedule')
+@admin_required
+def schedule_status():
+    """Shows the scheduled backups: the last run, the next one and the backups kept."""
+    scheduler = current_app.extensions['backup_scheduler']
+    return render_template('admin/backup_schedule.html', title='Scheduled Backups', scheduler=scheduler,
+                           status=scheduler.status, next_run=scheduler.next_run(), backups=scheduler.backups())
+
+@backup_bp.route('/schedule/run', methods=['POST'])
+@admin_required
+def run_scheduled_backup():
+    if current_app.extensions['backup_scheduler'].run_now():
+        flash('A backup is being written. Refresh this page to see when it has finished.', 'info')
+    else:
+        flash('A backup is already being written.', 'warning')
+    return redirect(url_for('backup.schedule_status'))
+
 @backup_bp.route('/restore', methods=['POST'])
 @admin_required
 def restore_backup():
     form = RestoreForm()
     if form.validate_on_submit():
-        backup_file = form.backup_file.data
+        backup_files = form.backup_file.data
         
         # Paths
         db_path = current_app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
-        uploads_path = current_app.config['UPLOAD_FOLDER']
-        shared_path = current_app.config['SHARED_FOLDER']
-        
+        targets = dict(backup_trees(current_app.config))
+        token = datetime.now().strftime('%Y%m%d%H%M%S')
+        live_paths = [db_path, *targets.values()]
+        archives = []
+        keep_aside = False
         try:
-            with zipfile.ZipFile(backup_file, 'r') as zf:
-                # --- Safety Check: Ensure it's a valid backup file ---
-                file_list = zf.namelist()
-                if 'database/laboratory.db' not in file_list:
-                    flash('Invalid backup file. The database is missing.', 'danger')
-                    return redirect(url_for('backup.index'))
-
-                # --- Perform Restore ---
-                # Close the current database connection to release the file lock
-                db.session.close()
-                
-                # 1. Delete old data
-                if os.path.exists(db_path): os.remove(db_path)
-                if os.path.exists(uploads_path): shutil.rmtree(uploads_path)
-                if os.path.exists(shared_path): shutil.rmtree(shared_path)
-                
-                # 2. Recreate empty directories
-                os.makedirs(uploads_path)
-                os.makedirs(shared_path)
-
-                # 3. Extract the backup
-                zf.extractall(path=os.path.dirname(db_path)) # Extract to the root project folder
-                
-                flash('Restore successful! The application has been restored to the backup state. Please log in again.', 'success')
+            for backup_file in backup_files:
+                zf = zipfile.ZipFile(backup_file, 'r')
+                archives.append((zf, read_manifest(zf)))
+
+            # --- Safety Check: Ensure they are valid backup files ---
+            chain = order_chain(archives)
+            if 'database/laboratory.db' not in chain[-1][0].namelist():
+                flash('Invalid backup file. The database is missing.', 'danger')
+                return redirect(url_for('backup.index'))
+
+            # --- Perform Restore ---
+            # 1. Extract and verify everything next to the live data, which stays in use meanwhile
+            staged = stage_restore(chain, db_path, targets, token, current_app.config.get('RESTORE_WORKERS', 4))
+
+            # 2. Write pending audit entries, then close the current database connections to release the file lock
+            flush_audit_log()
+            db.session.remove()
+            db.engine.dispose()
+
+            # 3. Rename the old data aside and the restored data into place
+            #    (the WAL sidecars go too: they must not outlive their database)
+            asides = swap_into_place(staged, token, extra_aside=sidecar_files(db_path))
+
+            # 4. Reconnect, bring an older backup's schema up to date and forget settings,
+            #    permissions and counters cached from the old database
+            try:
+                db.engine.dispose()
+                db.create_all()
+                upgrade_schema()
+            except Exception as e:
+                # The restored data is already in place: keep the old data for putting it back by hand
+                keep_aside = True
+                folders = ', '.join(sorted({os.path.dirname(aside) for aside in asides}))
+                flash(f'The backup was restored, but bringing its schema up to date failed: {e}. '
+                      f'The previous data was kept in {folders}.', 'danger')
                 return redirect(url_for('logout'))
+            finally:
+                clear_process_caches()
+                uid_allocator.reset()
+            
+            flash('Restore successful! The application has been restored to the backup state. Please log in again.', 'success')
+            return redirect(url_for('logout'))
 
         except Exception as e:
             flash(f'An error occurred during restore: {e}', 'danger')
             return redirect(url_for('backup.index'))
+        finally:
+            for zf, _ in archives:
+                zf.close()
+            # The staged copy after a failure, or the old data after a successful swap
+            if not keep_aside:
+                remove_stage(live_paths, token)
     
     flash('Invalid file or form submission.', 'danger')
     return redirect(url_for('backup.index'))
@@ -0,0 +1,302 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from backup_archive import backup_trees, database_snapshot, new_manifest, stream_backup, save_manifest
+
+# --- Scheduled Backups ---
+# BackupScheduler writes a full backup into BACKUP_DIRECTORY whenever BACKUP_SCHEDULE (a
+# five-field cron expression in lab time) comes due. The files are the same archives as
+# the downloads from /backup/create, so restore reads them as they are. Writing is
+# throttled to BACKUP_THROTTLE_BYTES_PER_SECOND. After each run the directory is thinned
+# out grandfather-father-son style: the newest backup of each of the last N days, weeks
+# and months is kept (BACKUP_RETENTION), everything older goes.
+# The thread is started by run.py, so scripts that import the app never back up by themselves.
+
+LAB_TIMEZONE = pytz.timezone('Asia/Kolkata')
+BACKUP_NAME = re.compile(r'^samplyze_backup_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.zip$')
+TIMESTAMP_FORMAT = '%Y-%m-%d_%H-%M-%S'
+
+
+def lab_now():
+    """The current lab time as a naive datetime, which is what schedules are written in."""
+    return datetime.now(LAB_TIMEZONE).replace(tzinfo=None)
+
+
+class CronSchedule:
+    """A cron expression: minute hour day-of-month month day-of-week, each field '*',
+    a number, a range 'a-b', a list 'a,b' or a step '*/n' / 'a-b/n'. Sunday is 0 (or 7)."""
+
+    FIELDS = [('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7)]
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"A cron expression has five fields, got '{expression}'.")
+        self.expression = expression
+        values = {}
+        for (name, low, high), part in zip(self.FIELDS, parts):
+            values[name] = self._parse_field(part, low, high)
+        self.minutes = sorted(values['minute'])
+        self.hours = sorted(values['hour'])
+        self.days = values['day']
+        self.months = values['month']
+        self.weekdays = {d % 7 for d in values['weekday']}
+        # As in cron: if both day fields are restricted, a date matching either one is due
+        self._any_day = parts[2] == '*'
+        self._any_weekday = parts[4] == '*'
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for item in field.split(','):
+            span, _, step = item.partition('/')
+            step = int(step) if step else 1
+            if span == '*':
+                start, stop = low, high
+            elif '-' in span:
+                start, stop = (int(v) for v in span.split('-', 1))
+            else:
+                start = stop = int(span)
+            if not low <= start <= stop <= high or step < 1:
+                raise ValueError(f"Invalid cron field '{field}'.")
+            values.update(range(start, stop + 1, step))
+        return values
+
+    def _date_matches(self, day):
+        if day.month not in self.months:
+            return False
+        day_ok = day.day in self.days
+        weekday_ok = (day.isoweekday() % 7) in self.weekdays
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment):
+        """Returns the first due minute strictly after `moment` (a naive datetime)."""
+        start = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.date()
+        for _ in range(366 * 5):
+            if self._date_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime(day.year, day.month, day.day, hour, minute)
+                        if candidate >= start:
+                            return candidate
+            day += timedelta(days=1)
+        raise ValueError(f"The cron expression '{self.expression}' never comes due.")
+
+
+def gfs_keep(timestamps, daily=7, weekly=4, monthly=12):
+    """Returns the timestamps to keep: the newest one of each of the `daily` most recent
+    days, `weekly` most recent ISO weeks and `monthly` most recent months."""
+    keep = set()
+    for count, period in ((daily, lambda t: t.date()),
+                          (weekly, lambda t: t.isocalendar()[:2]),
+                          (monthly, lambda t: (t.year, t.month))):
+        seen = []
+        for timestamp in sorted(timestamps, reverse=True):
+            key = period(timestamp)
+            if key not in seen:
+                if len(seen) >= count:
+                    break
+                seen.append(key)
+                keep.add(timestamp)
+    return keep
+
+
+class Throttle:
+    """Sleeps as needed to keep a stream of writes under `rate` bytes per second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._started = time.monotonic()
+        self._sent = 0
+
+    def consume(self, amount):
+        if not self.rate:
+            return
+        self._sent += amount
+        ahead = self._sent / self.rate - (time.monotonic() - self._started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+class BackupScheduler:
+    def __init__(self, app=None):
+        self.app = None
+        self.schedule = None
+        self.status = {}
+        self._thread = None
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._run_requested = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('BACKUP_SCHEDULE', None)
+        app.config.setdefault('BACKUP_DIRECTORY', os.path.join(app.instance_path, 'backups'))
+        app.config.setdefault('BACKUP_RETENTION', {'daily': 7, 'weekly': 4, 'monthly': 12})
+        app.config.setdefault('BACKUP_THROTTLE_BYTES_PER_SECOND', 0)
+        self.app = app
+        if app.config['BACKUP_SCHEDULE']:
+            self.schedule = CronSchedule(app.config['BACKUP_SCHEDULE'])
+        self.status = self._load_status()
+        app.extensions['backup_scheduler'] = self
+
+    @property
+    def directory(self):
+        return self.app.config['BACKUP_DIRECTORY']
+
+    def start(self):
+        """Starts the scheduler thread if a schedule is configured."""
+        if self.schedule is None or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='backup-scheduler', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+
+    def run_now(self):
+        """Starts a backup in the background at once. Returns False if one is running already."""
+        if self._run_lock.locked():
+            return False
+        if self._thread is not None and self._thread.is_alive():
+            self._run_requested = True
+            self._wake.set()
+        else:
+            threading.Thread(target=self._run_once, name='backup-now', daemon=True).start()
+        return True
+
+    def next_run(self):
+        return self.schedule.next_after(lab_now()) if self.schedule else None
+
+    def _run(self):
+        while not self._stopping:
+            due = self.next_run()
+            while not self._stopping and not self._run_requested and lab_now() < due:
+                # Wake up at least every minute, in case the clock was changed
+                self._wake.wait(min((due - lab_now()).total_seconds(), 60))
+                self._wake.clear()
+            if self._stopping:
+                return
+            self._run_requested = False
+            self._run_once()
+
+    def _run_once(self):
+        try:
+            self.run_backup()
+        except Exception as e:
+            print(f"Scheduled backup failed: {e}")
+
+    def run_backup(self):
+        """Writes one full backup into BACKUP_DIRECTORY and applies the retention policy.
+        Returns the path of the backup, or None if another one is being written."""
+        if not self._run_lock.acquire(blocking=False):
+            return None
+        try:
+            return self._write_backup()
+        finally:
+            self._run_lock.release()
+
+    def _write_backup(self):
+        started = time.monotonic()
+        self.status.update(running=True, started=lab_now().isoformat(timespec='seconds'))
+        os.makedirs(self.directory, exist_ok=True)
+        with self.app.app_context():
+            config = self.app.config
+            now = datetime.now(LAB_TIMEZONE)
+            timestamp = now.strftime(TIMESTAMP_FORMAT)
+            path = os.path.join(self.directory, f'samplyze_backup_{timestamp}.zip')
+            db_path = config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+            trees = backup_trees(config)
+            snapshot_path = None
+            try:
+                self._remove_partial_files()
+                snapshot_path = database_snapshot(db_path, vacuum=config.get('BACKUP_VACUUM', False))
+                manifest = new_manifest(timestamp, now.isoformat())
+                throttle = Throttle(config['BACKUP_THROTTLE_BYTES_PER_SECOND'])
+                with open(path + '.part', 'wb') as f:
+                    for chunk in stream_backup(snapshot_path, trees, manifest):
+                        f.write(chunk)
+                        throttle.consume(len(chunk))
+                os.replace(path + '.part', path)
+                save_manifest(config['BACKUP_MANIFEST_FOLDER'], manifest)
+                removed = self.apply_retention()
+                self.status.update(error=None, filename=os.path.basename(path), size=os.path.getsize(path),
+                                   files=len(manifest['files']), removed=removed)
+                print(f"Scheduled backup written to {path}.")
+                return path
+            except Exception as e:
+                self.status.update(error=str(e), filename=None, size=None)
+                if os.path.exists(path + '.part'):
+                    os.remove(path + '.part')
+                raise
+            finally:
+                if snapshot_path and os.path.exists(snapshot_path):
+                    os.remove(snapshot_path)
+                self.status.update(running=False, finished=lab_now().isoformat(timespec='seconds'),
+                                   duration=round(time.monotonic() - started, 1))
+                self._save_status()
+
+    def backups(self):
+        """Returns [(timestamp, filename, size)] of the backups in the directory, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        found = []
+        for name in os.listdir(self.directory):
+            match = BACKUP_NAME.match(name)
+            if match:
+                timestamp = datetime.strptime(match.group(1), TIMESTAMP_FORMAT)
+                found.append((timestamp, name, os.path.getsize(os.path.join(self.directory, name))))
+        return sorted(found, reverse=True)
+
+    def apply_retention(self):
+        """Deletes the backups the grandfather-father-son policy does not keep. Returns their number."""
+        backups = self.backups()
+        keep = gfs_keep([timestamp for timestamp, _, _ in backups], **self.app.config['BACKUP_RETENTION'])
+        removed = 0
+        for timestamp, name, _ in backups:
+            if timestamp not in keep:
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+        return removed
+
+    def _remove_partial_files(self):
+        # Left behind when the server stopped in the middle of a backup
+        for name in os.listdir(self.directory):
+            if name.endswith('.zip.part'):
+                os.remove(os.path.join(self.directory, name))
+
+    def _status_path(self):
+        return os.path.join(self.directory, 'status.json')
+
+    def _load_status(self):
+        try:
+            with open(self._status_path(), encoding='utf-8') as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        status['running'] = False
+        return status
+
+    def _save_status(self):
+        try:
+            with open(self._status_path(), 'w', encoding='utf-8') as f:
+                json.dump(self.status, f)
+        except OSError as e:
+            print(f"Error saving backup status: {e}")
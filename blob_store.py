@@ -0,0 +1,264 @@
+import hashlib
+import os
+import shutil
+import sys
+import time
+
+from flask import current_app, abort
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert
+from werkzeug.security import safe_join
+
+from models import db, Blob, BlobRef, Folder
+from ingest import UploadRecord, spool_upload
+from file_serving import send_path
+
+# --- Content-Addressed Blob Store ---
+# Uploaded files are stored once per distinct content under BLOB_FOLDER/ab/cd/<sha256>,
+# so the same PDF mailed to twenty people takes the space of one. The app keeps referring
+# to files by their old names, now kept as keys in the blob_ref table:
+#
+#     uploads/<filename>                  files in UPLOAD_FOLDER (images, attachments, logos)
+#     shared/<folder id>/<filename>       file share files
+#
+# Every key holds one reference on its blob. Deleting a file only drops its key and
+# decrements the refcount; blobs nobody refers to any more are removed by
+# collect_garbage() when the app starts (or with `python blob_store.py gc`).
+# Files from before the blob store are still found at their old paths until
+# `python blob_store.py migrate` moves them in: each file is copied into the store, and
+# the old file is only deleted once the reference to its copy is committed.
+
+
+def upload_key(filename):
+    return f"uploads/{filename}"
+
+
+def shared_key(folder_id, filename):
+    return f"shared/{folder_id}/{filename}"
+
+
+def blob_path(sha256):
+    """The fan-out path of a blob: two directory levels keep every directory small."""
+    return os.path.join(current_app.config['BLOB_FOLDER'], sha256[:2], sha256[2:4], sha256)
+
+
+def legacy_path(key):
+    """Where a key's file lived before the blob store."""
+    namespace, _, rest = key.partition('/')
+    if namespace == 'uploads':
+        return safe_join(current_app.config['UPLOAD_FOLDER'], rest)
+    folder_id, _, filename = rest.partition('/')
+    folder = db.session.get(Folder, int(folder_id))
+    if folder is None:
+        return None
+    return safe_join(current_app.config['SHARED_FOLDER'], folder.name, filename)
+
+
+# --- References ---
+def _add_reference(key, sha256, size):
+    existing = db.session.get(BlobRef, key)
+    if existing is not None:
+        if existing.sha256 == sha256:
+            return
+        release(key)
+    # The refcount is raised before the file is placed, so the row (and the database
+    # write lock) exists by the time the blob appears on disk
+    db.session.execute(insert(Blob).values(sha256=sha256, size=size, refcount=0)
+                       .on_conflict_do_nothing(index_elements=['sha256']))
+    db.session.execute(update(Blob).where(Blob.sha256 == sha256).values(refcount=Blob.refcount + 1))
+    db.session.add(BlobRef(name=key, sha256=sha256))
+
+
+def _place(temp_path, sha256):
+    target = blob_path(sha256)
+    if os.path.exists(target):
+        os.remove(temp_path)  # Same content is already stored
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(temp_path, target)
+    return target
+
+
+def store_upload(file_storage, key, original_filename=None):
+    """Stores an uploaded FileStorage under `key`. Returns its UploadRecord; the file
+    itself is at blob_path(record.sha256). The reference is part of the current
+    db.session and is saved by the caller's commit."""
+    temp_path, size, sha256 = spool_upload(file_storage, current_app.config['UPLOAD_TEMP_FOLDER'])
+    _add_reference(key, sha256, size)
+    _place(temp_path, sha256)
+    return UploadRecord(filename=key.rsplit('/', 1)[-1],
+                        original_filename=original_filename or file_storage.filename,
+                        size=size, sha256=sha256,
+                        content_type=file_storage.mimetype or None)
+
+
+def store_bytes(data, key):
+    """Stores an in-memory file under `key`. Returns the blob path."""
+    sha256 = hashlib.sha256(data).hexdigest()
+    temp_folder = current_app.config['UPLOAD_TEMP_FOLDER']
+    os.makedirs(temp_folder, exist_ok=True)
+    temp_path = os.path.join(temp_folder, f"{sha256}.{os.getpid()}.{time.monotonic_ns()}.part")
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    _add_reference(key, sha256, len(data))
+    return _place(temp_path, sha256)
+
+
+def release(key):
+    """Drops the reference of `key`. Files from before the blob store are deleted directly."""
+    ref = db.session.get(BlobRef, key)
+    if ref is None:
+        path = legacy_path(key)
+        if path and os.path.exists(path):
+            os.remove(path)
+        return
+    db.session.execute(update(Blob).where(Blob.sha256 == ref.sha256).values(refcount=Blob.refcount - 1))
+    db.session.delete(ref)
+
+
+def release_prefix(prefix):
+    """Drops every reference whose key starts with `prefix`, e.g. all files of a shared folder."""
+    for ref in BlobRef.query.filter(BlobRef.name.startswith(prefix, autoescape=True)).all():
+        db.session.execute(update(Blob).where(Blob.sha256 == ref.sha256).values(refcount=Blob.refcount - 1))
+        db.session.delete(ref)
+
+
+def stored_uploads():
+    """Returns {filename: blob path} of every UPLOAD_FOLDER file kept in the blob store."""
+    refs = BlobRef.query.filter(BlobRef.name.startswith('uploads/')).all()
+    return {ref.name.partition('/')[2]: blob_path(ref.sha256) for ref in refs}
+
+
+def locate(key):
+    """Returns (path, sha256) of a key's file; sha256 is None for a file not yet migrated."""
+    ref = db.session.get(BlobRef, key)
+    if ref is not None:
+        return blob_path(ref.sha256), ref.sha256
+    return legacy_path(key), None
+
+
+def serve_blob(key, download_name, as_attachment=False):
+    """Sends the file of `key` with the content hash as its ETag."""
+    path, sha256 = locate(key)
+    if path is None:
+        abort(404)
+    return send_path(path, download_name, as_attachment, etag=sha256)
+
+
+# --- Maintenance ---
+def collect_garbage(orphan_age=None):
+    """Deletes blobs whose refcount has dropped to zero. With `orphan_age` (seconds) also
+    deletes blob files without a row that are at least that old, e.g. left by a request
+    that failed before its commit. Only run it while no request is being served.
+    Returns the number of files removed."""
+    removed = 0
+    unreferenced = [sha for (sha,) in db.session.query(Blob.sha256).filter(Blob.refcount <= 0)]
+    for sha256 in unreferenced:
+        db.session.query(Blob).filter_by(sha256=sha256).delete()
+    db.session.commit()
+    for sha256 in unreferenced:
+        path = blob_path(sha256)
+        if os.path.exists(path):
+            os.remove(path)
+            removed += 1
+
+    if orphan_age is not None:
+        known = {sha for (sha,) in db.session.query(Blob.sha256)}
+        cutoff = time.time() - orphan_age
+        for root, _, files in os.walk(current_app.config['BLOB_FOLDER']):
+            for name in files:
+                path = os.path.join(root, name)
+                if name not in known and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+    return removed
+
+
+def _file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _copy_into_store(path, sha256):
+    """Copies a legacy file to its blob path, leaving the original where it is. The copy
+    gets a fresh mtime, so collect_garbage(orphan_age) does not take it for an old orphan
+    before its reference is committed."""
+    target = blob_path(sha256)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f"{target}.{os.getpid()}.part"
+        shutil.copyfile(path, temp_path)
+        os.replace(temp_path, target)
+
+
+def _migrate_file(path, key):
+    """Copies one legacy file into the store and adds its reference. Returns True when
+    the legacy file can be deleted once the session is committed."""
+    sha256 = _file_sha256(path)
+    ref = db.session.get(BlobRef, key)
+    if ref is not None:
+        # Copied and committed by an earlier run that stopped before deleting the original
+        return ref.sha256 == sha256 and os.path.exists(blob_path(sha256))
+    _copy_into_store(path, sha256)
+    _add_reference(key, sha256, os.path.getsize(path))
+    return True
+
+
+def _commit_and_unlink(paths):
+    db.session.commit()
+    for path in paths:
+        os.remove(path)
+    paths.clear()
+
+
+def migrate_legacy_files(batch_size=500):
+    """Moves the files of UPLOAD_FOLDER and SHARED_FOLDER into the blob store, storing
+    identical content once. It commits every `batch_size` files and only then deletes their
+    originals, so it is safe to stop and run again. Returns (files moved, blobs stored)."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    moved = 0
+
+    candidates = []
+    # Only the top level: variants/, blobs/ and other subdirectories are not uploads
+    with os.scandir(upload_folder) as entries:
+        for entry in entries:
+            if entry.is_file() and not entry.name.endswith('.part'):
+                candidates.append((entry.path, upload_key(entry.name)))
+    for folder in Folder.query.all():
+        folder_path = os.path.join(current_app.config['SHARED_FOLDER'], folder.name)
+        if os.path.isdir(folder_path):
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        candidates.append((entry.path, shared_key(folder.id, entry.name)))
+
+    committed = []  # Legacy files whose copies are referenced once the session is committed
+    for path, key in candidates:
+        if _migrate_file(path, key):
+            committed.append(path)
+            moved += 1
+            if moved % batch_size == 0:
+                _commit_and_unlink(committed)
+    _commit_and_unlink(committed)
+    return moved, Blob.query.count()
+
+
+if __name__ == '__main__':
+    # python blob_store.py migrate   - move existing uploads into the blob store (one time)
+    # python blob_store.py gc        - remove unreferenced and orphaned blobs
+    # Run both while the server is stopped.
+    from app import app
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    with app.app_context():
+        if command == 'migrate':
+            moved, blobs = migrate_legacy_files()
+            print(f"Moved {moved} files into the blob store ({blobs} distinct blobs).")
+        elif command == 'gc':
+            print(f"Removed {collect_garbage(orphan_age=app.config['BLOB_ORPHAN_AGE'])} blob files.")
+        else:
+            print("Usage: python blob_store.py migrate|gc")
+            sys.exit(1)
@@ -0,0 +1,149 @@
+import re
+import sys
+from datetime import datetime, date, time
+
+from app import app, ALL_SAMPLES_LOADERS
+from pagination import keyset_query, encode_cursor
+from models import db, Applicant, SampleSC, AuditLog, User, Mail, MailRecipient, Visitor, Issue, InventoryItem, Equipment, EquipmentLog, Folder, FolderPermission, File
+
+# --- Query Plan Check ---
+# Runs EXPLAIN QUERY PLAN on the main query of every list route and fails if SQLite
+# has to fall back to a full table scan. Run it after changing a query or an index:
+#
+#     python check_query_plans.py
+#
+# Each entry mirrors the query built by the route named on the left. Paginated routes
+# list their sort keys too: the query checked is the one paginate_keyset runs for a
+# page-N cursor, which must seek into an index range and read it in order (no temp B-tree).
+
+SAMPLE_USER_ID = 1
+SAMPLE_ID = 1
+
+
+def route_queries():
+    """Returns (name, query, order_by) entries; order_by is None for routes that are not paginated."""
+    today = date.today()
+    return [
+        ('dashboard', Applicant.query, [Applicant.created_at.desc(), Applicant.id.desc()]),
+        ('all_samples', SampleSC.query.options(*ALL_SAMPLES_LOADERS),
+            [SampleSC.submission_date.desc(), SampleSC.id.desc()]),
+        ('all_samples (assigned to me)', SampleSC.query.filter_by(assigned_staff_id=SAMPLE_USER_ID)
+            .options(*ALL_SAMPLES_LOADERS), [SampleSC.submission_date.desc(), SampleSC.id.desc()]),
+        ('audit_log', AuditLog.query, [AuditLog.timestamp.desc(), AuditLog.id.desc()]),
+        ('mail.inbox', MailRecipient.query.filter(
+            MailRecipient.recipient_id == SAMPLE_USER_ID,
+            MailRecipient.is_deleted == False
+        ), [MailRecipient.is_read.asc(), MailRecipient.id.desc()]),
+        ('mail.sent', Mail.query.filter_by(sender_id=SAMPLE_USER_ID), [Mail.sent_at.desc(), Mail.id.desc()]),
+        ('unread mail count', MailRecipient.query.filter_by(
+            recipient_id=SAMPLE_USER_ID, is_read=False, is_deleted=False), None),
+        ('visitors.dashboard', Visitor.query.filter(Visitor.entry_time.between(
+            datetime.combine(today, time.min), datetime.combine(today, time.max)
+        )), [Visitor.entry_time.desc(), Visitor.id.desc()]),
+        ('issue_tracker.dashboard (home)', Issue.query.filter(
+            db.or_(Issue.verifier_id == None, Issue.verifier_id == SAMPLE_USER_ID)
+        ), [Issue.updated_at.desc(), Issue.id.desc()]),
+        ('issue_tracker.dashboard (assigned)', Issue.query.filter_by(assignee_id=SAMPLE_USER_ID),
+            [Issue.updated_at.desc(), Issue.id.desc()]),
+        ('issue_tracker.dashboard (reported)', Issue.query.filter_by(reporter_id=SAMPLE_USER_ID),
+            [Issue.updated_at.desc(), Issue.id.desc()]),
+        ('inventory.dashboard', InventoryItem.query, [InventoryItem.name.asc(), InventoryItem.id.asc()]),
+        ('equipment.dashboard', Equipment.query.order_by(Equipment.name), None),
+        ('equipment.dashboard (active logs)', EquipmentLog.query.filter_by(end_time=None), None),
+        ('equipment.view_logs', EquipmentLog.query.filter_by(equipment_id=SAMPLE_ID),
+            [EquipmentLog.start_time.desc(), EquipmentLog.id.desc()]),
+        ('fileshare.dashboard (owned)', Folder.query.filter_by(owner_id=SAMPLE_USER_ID), None),
+        ('fileshare.dashboard (shared)', FolderPermission.query.filter_by(user_id=SAMPLE_USER_ID), None),
+        ('fileshare.view_folder', File.query.filter_by(folder_id=SAMPLE_ID).order_by(File.uploaded_at.desc()), None),
+    ]
+
+
+# A sample boundary value for each sort key type, used to build the page-N cursor.
+SAMPLE_KEY_VALUES = {
+    datetime: datetime(2024, 1, 1, 12, 0),
+    date: date(2024, 1, 1),
+    bool: False,
+    int: SAMPLE_ID,
+    str: 'M',
+}
+
+
+def page_query(query, order_by):
+    """Returns the query paginate_keyset runs for the page after a sample boundary row."""
+    key = [SAMPLE_KEY_VALUES[clause.element.type.python_type] for clause in order_by]
+    return keyset_query(query, order_by, cursor=encode_cursor('n', key))
+
+
+# "SCAN sample_sc" is a full table scan; "SCAN sample_sc USING INDEX ..." walks an index.
+# Older SQLite versions print "SCAN TABLE sample_sc".
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+# A seek into an index range, e.g. "SEARCH sample_sc USING INDEX ix_... (submission_date<?)".
+RANGE_SEEK = re.compile(r'^SEARCH (?:TABLE )?\w+ USING .*\(.*[<>]\?.*\)$')
+
+
+def _driver_params(compiled):
+    params = compiled.construct_params()
+    values = []
+    for name in compiled.positiontup:
+        value = params[name]
+        if isinstance(value, datetime):
+            value = value.strftime('%Y-%m-%d %H:%M:%S.%f')
+        elif isinstance(value, date):
+            value = value.isoformat()
+        values.append(value)
+    return tuple(values)
+
+
+def explain(conn, query):
+    """Returns the EXPLAIN QUERY PLAN detail lines for an ORM query."""
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", _driver_params(compiled)).fetchall()
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan):
+    """Returns the tables in a plan that are read without any index."""
+    scanned = []
+    for detail in plan:
+        match = FULL_SCAN.match(detail)
+        if match and 'USING' not in match.group(2) and match.group(1) not in ('CONSTANT', 'SUBQUERY'):
+            scanned.append(match.group(1))
+    return scanned
+
+
+def page_problems(plan):
+    """Returns why a page-N plan is not a single in-order index range read, if it is not."""
+    problems = []
+    if not any(RANGE_SEEK.match(detail) for detail in plan):
+        problems.append('no index range seek for the cursor')
+    if any('TEMP B-TREE' in detail for detail in plan):
+        problems.append('sorts in a temp B-tree')
+    return problems
+
+
+def check_query_plans():
+    """Prints the plan of every route query. Returns the names of the failing routes."""
+    failures = []
+    with app.app_context(), db.engine.connect() as conn:
+        for name, query, order_by in route_queries():
+            if order_by is not None:
+                query = page_query(query, order_by)
+            plan = explain(conn, query)
+            problems = [f'full scan of {table}' for table in full_scans(plan)]
+            if order_by is not None:
+                problems += page_problems(plan)
+            status = 'FAIL' if problems else 'ok'
+            print(f"[{status}] {name}" + (f" ({'; '.join(problems)})" if problems else ''))
+            for detail in plan:
+                print(f"        {detail}")
+            if problems:
+                failures.append(name)
+    return failures
+
+
+if __name__ == '__main__':
+    failures = check_query_plans()
+    if failures:
+        print(f"\n{len(failures)} route queries do not use their index well: {', '.join(failures)}")
+        sys.exit(1)
+    print("\nAll route queries use an index, and every page is an index range read in order.")
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+# --- Barcode / QR Code Image Cache ---
+# A label image only depends on its symbology, its data and the rendering options, so it
+# is rendered once and kept under the SHA-256 of those three: in a bounded in-memory LRU
+# and in a folder on disk that survives restarts. The folder is an LRU too: reading a file
+# refreshes its mtime, and once it holds more than max_disk_bytes the least recently used
+# files are removed. The same key is the response's strong ETag, and since a URL always
+# renders the same image it is served as immutable.
+
+# Bump when the renderers change in a way that alters the output for the same options
+RENDER_VERSION = 1
+
+ONE_YEAR = 365 * 24 * 3600
+
+
+def cache_key(symbology, data, options):
+    """Returns the content key of one rendered label image."""
+    payload = json.dumps([RENDER_VERSION, symbology, data, options], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class CodeImageCache:
+    def __init__(self, folder, max_entries=512, max_disk_bytes=64 * 1024 * 1024):
+        self.folder = folder
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = None  # Measured on the first write
+
+    def _path(self, key, extension):
+        return os.path.join(self.folder, key[:2], f"{key}.{extension}")
+
+    def _remember(self, key, body):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _read_disk(self, path):
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+            os.utime(path)  # Recently used: evicted last
+            return body
+        except OSError:
+            return None
+
+    def _disk_files(self):
+        files = []
+        for root, _, names in os.walk(self.folder):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _evict_disk(self, added):
+        """Removes the least recently used files once the folder is over max_disk_bytes."""
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            else:
+                self._disk_bytes += added
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+            files = sorted(self._disk_files())
+            total = sum(size for _, size, _ in files)
+            # Down to 90% so that every new image does not trigger another scan
+            for _, size, path in files:
+                if total <= self.max_disk_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            self._disk_bytes = total
+
+    def _write_disk(self, path, body):
+        # Written under a temporary name and renamed, so a reader never sees half a file
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+            os.replace(temp_path, path)
+            self._evict_disk(len(body))
+        except OSError as e:
+            print(f"Error caching label image {path}: {e}")
+
+    def get(self, symbology, data, options, extension, render):
+        """Returns (key, image bytes), calling render() only when the image is in neither cache."""
+        key = cache_key(symbology, data, options)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                return key, body
+
+        path = self._path(key, extension)
+        body = self._read_disk(path)
+        if body is None:
+            body = render()
+            self._write_disk(path, body)
+        self._remember(key, body)
+        return key, body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def code_image_response(key, body, mimetype):
+    """Builds a cacheable response that answers If-None-Match with 304 Not Modified."""
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(key)
+    response.cache_control.private = True  # Only signed-in staff may fetch labels
+    response.cache_control.max_age = ONE_YEAR
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
@@ -9,6 +9,7 @@ import pytz
 from models import db, Equipment, EquipmentLog, User, PermissionNames
 from forms import AddEquipmentForm, LogUsageForm
 from decorators import permission_required
+from pagination import paginate_request
 
 # Create a Blueprint
 equipment_bp = Blueprint('equipment', __name__, url_prefix='/equipment', template_folder='templates')
@@ -115,8 +116,9 @@ def end_log(log_id):
 @permission_required(PermissionNames.CAN_ACCESS_EQUIPMENT_LOGGING)
 def view_logs(equipment_id):
     equipment = Equipment.query.get_or_404(equipment_id)
-    logs = EquipmentLog.query.filter_by(equipment_id=equipment.id).order_by(EquipmentLog.start_time.desc()).all()
-    return render_template('equipment/view_logs.html', title=f"Logs for {equipment.name}", equipment=equipment, logs=logs)
+    page = paginate_request(EquipmentLog.query.filter_by(equipment_id=equipment.id),
+                            [EquipmentLog.start_time.desc(), EquipmentLog.id.desc()])
+    return render_template('equipment/view_logs.html', title=f"Logs for {equipment.name}", equipment=equipment, logs=page.items, page=page)
 
 @equipment_bp.route('/logs/export/<int:equipment_id>')
 @login_required
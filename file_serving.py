@@ -0,0 +1,110 @@
+import mimetypes
+import os
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from flask import request, abort, current_app, Response
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
+
+# --- Serving Uploaded Files ---
+# Uploads, mail attachments and shared files are all sent through serve_file(), which
+# answers conditional requests (ETag / Last-Modified -> 304) and single byte ranges
+# (206, for resumable downloads and seeking in audio/video). The body is handed to the
+# WSGI server's wsgi.file_wrapper positioned at the start of the range, so Waitress
+# streams the bytes from the file itself instead of Python reading and yielding chunks.
+
+BLOCK_SIZE = 64 * 1024
+
+
+def _content_disposition(download_name, as_attachment):
+    kind = 'attachment' if as_attachment else 'inline'
+    try:
+        download_name.encode('ascii')
+    except UnicodeEncodeError:
+        # RFC 6266: an ASCII fallback plus the real name in UTF-8
+        fallback = download_name.encode('ascii', 'ignore').decode('ascii') or 'download'
+        return f"{kind}; filename=\"{fallback}\"; filename*=UTF-8''{quote(download_name, safe='')}"
+    escaped = download_name.replace('\\', '\\\\').replace('"', '\\"')
+    return f'{kind}; filename="{escaped}"'
+
+
+def _requested_range(etag, last_modified, size):
+    """Returns (start, stop) of a satisfiable Range header, None for the whole file,
+    or False if the range cannot be satisfied."""
+    if request.method not in ('GET', 'HEAD') or request.range is None:
+        return None
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != etag:
+        return None
+    if if_range.date is not None and if_range.date < last_modified:
+        return None
+    span = request.range.range_for_length(size)
+    return span if span is not None else False
+
+
+def _read_range(f, length):
+    try:
+        while length > 0:
+            chunk = f.read(min(BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def serve_file(directory, filename, download_name=None, as_attachment=False):
+    """Sends directory/filename with validators, Range support and the server's file wrapper."""
+    path = safe_join(directory, filename)
+    if path is None:
+        abort(404)
+    return send_path(path, download_name or filename, as_attachment)
+
+
+def send_path(path, download_name, as_attachment=False, etag=None):
+    """Like serve_file for a path that is already known to be safe. The content type is
+    taken from download_name. Pass `etag` when the content hash is known."""
+    if not os.path.isfile(path):
+        abort(404)
+
+    stat = os.stat(path)
+    size = stat.st_size
+    # Stored files are never rewritten in place, so mtime and size identify the content
+    etag = etag or f"{stat.st_mtime_ns:x}-{size:x}"
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), timezone.utc)
+    mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+
+    response = Response(mimetype=mimetype, direct_passthrough=True)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.accept_ranges = 'bytes'
+    response.headers['Content-Disposition'] = _content_disposition(download_name, as_attachment)
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config.get('UPLOAD_CACHE_MAX_AGE', 0)
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response.status_code = 304
+        return response
+
+    span = _requested_range(etag, last_modified, size)
+    if span is False:
+        response.status_code = 416
+        response.headers['Content-Range'] = f"bytes */{size}"
+        return response
+    start, stop = span or (0, size)
+
+    f = open(path, 'rb')
+    f.seek(start)
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None:
+        # The server sends Content-Length bytes from the current file position
+        response.response = file_wrapper(f, BLOCK_SIZE)
+    else:
+        response.response = _read_range(f, stop - start)
+    response.content_length = stop - start
+    if span:
+        response.status_code = 206
+        response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
+    return response
@@ -1,6 +1,6 @@
 import os
 import shutil
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_from_directory, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, abort
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from datetime import datetime
@@ -8,6 +8,7 @@ from datetime import datetime
 from models import db, Folder, File, FolderPermission, User, PermissionNames
 from forms import CreateFolderForm, FolderSettingsForm
 from decorators import permission_required
+from blob_store import shared_key, store_upload, release, release_prefix, serve_blob
 
 # Create a Blueprint
 fileshare_bp = Blueprint('fileshare', __name__, url_prefix='/fileshare', template_folder='templates')
@@ -83,16 +84,17 @@ def upload_file(folder_id):
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         unique_filename = f"{timestamp}_{original_filename}"
         
-        # Save file to the physical folder
-        folder_path = os.path.join(current_app.config['SHARED_FOLDER'], folder.name)
-        file.save(os.path.join(folder_path, unique_filename))
+        # Save file to the blob store
+        upload = store_upload(file, shared_key(folder.id, unique_filename))
 
         # Create DB record
         new_file = File(
             folder_id=folder.id,
             filename=unique_filename,
             original_filename=original_filename,
-            uploader_id=current_user.id
+            uploader_id=current_user.id,
+            size=upload.size,
+            sha256=upload.sha256
         )
         db.session.add(new_file)
         db.session.commit()
@@ -108,10 +110,8 @@ def delete_file_from_folder(file_id):
     if not has_permission(folder, current_user):
         abort(403)
         
-    # Delete physical file
-    file_path = os.path.join(current_app.config['SHARED_FOLDER'], folder.name, file.filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    # Drop the file's reference; the blob goes once nothing else refers to it
+    release(shared_key(folder.id, file.filename))
         
     # Delete DB record
     db.session.delete(file)
@@ -128,8 +128,7 @@ def download_file(file_id):
     if not has_permission(folder, current_user):
         abort(403)
     
-    directory = os.path.join(current_app.config['SHARED_FOLDER'], folder.name)
-    return send_from_directory(directory, file.filename, as_attachment=True, download_name=file.original_filename)
+    return serve_blob(shared_key(folder.id, file.filename), file.original_filename, as_attachment=True)
 
 @fileshare_bp.route('/folder/<int:folder_id>/settings', methods=['GET', 'POST'])
 @login_required
@@ -182,6 +181,7 @@ def delete_folder(folder_id):
         abort(403)
         
     # Delete physical folder and its contents
+    release_prefix(shared_key(folder.id, ''))
     folder_path = os.path.join(current_app.config['SHARED_FOLDER'], folder.name)
     if os.path.exists(folder_path):
         shutil.rmtree(folder_path)
@@ -201,6 +201,5 @@ def view_file(file_id):
     if not has_permission(folder, current_user):
         abort(403)
     
-    directory = os.path.join(current_app.config['SHARED_FOLDER'], folder.name)
     # 'as_attachment=False' tells the browser to try and display the file inline
-    return send_from_directory(directory, file.filename, as_attachment=False, download_name=file.original_filename)
\ No newline at end of file
+    return serve_blob(shared_key(folder.id, file.filename), file.original_filename, as_attachment=False)
\ No newline at end of file
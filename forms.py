@@ -175,12 +175,15 @@ class LogUsageForm(FlaskForm):
     submit = SubmitField('Confirm Entry')
     
 class RestoreForm(FlaskForm):
-    backup_file = FileField('Select Backup File (.zip)', validators=[
-        DataRequired(),
-        FileAllowed(['zip'], 'Only .zip backup files are allowed!')
-    ])
+    # A full backup, optionally together with its chain of incremental backups
+    backup_file = MultipleFileField('Select Backup File(s) (.zip)', validators=[DataRequired()])
     submit = SubmitField('Restore from Backup')
 
+    def validate_backup_file(self, field):
+        for backup_file in field.data:
+            if not backup_file.filename.lower().endswith('.zip'):
+                raise ValidationError('Only .zip backup files are allowed!')
+
 # UPDATED: Changed DataRequired to Optional for permissions
 class RoleForm(FlaskForm):
     name = StringField('Role Name', validators=[DataRequired(), Length(min=3, max=80)])
@@ -0,0 +1,110 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# --- Image Variants ---
+# Sample and NSC photos come straight from phone cameras, often several megabytes each.
+# When one is uploaded, smaller copies are written next to it in UPLOAD_FOLDER/variants:
+# each size below as WebP (for browsers) and JPEG (for clients without WebP), with the
+# EXIF orientation applied. Pages link to them through image_variant_url()/image_srcset()
+# and the uploaded_image_variant route falls back to the original until they exist.
+# The original itself may live in the blob store; `source` is then its blob path.
+
+VARIANT_SIZES = {
+    'thumb': 320,     # lists and edit forms
+    'preview': 1024,  # view pages
+    'print': 2000,    # printed reports
+}
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+VARIANTS_DIRECTORY = 'variants'
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif', '.tif', '.tiff'}
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-variants')
+
+
+def is_image(filename):
+    return os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+
+
+def variant_filename(filename, variant, extension):
+    """Returns the path of a variant relative to UPLOAD_FOLDER."""
+    stem = os.path.splitext(filename)[0]
+    return f"{VARIANTS_DIRECTORY}/{stem}.{variant}.{extension}"
+
+
+def _save(image, path, image_format):
+    temp_path = path + '.tmp'
+    if image_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            # JPEG has no alpha channel: flatten onto white
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+            image = background
+        image.save(temp_path, 'JPEG', quality=85, optimize=True, progressive=True)
+    else:
+        image.save(temp_path, 'WEBP', quality=80, method=4)
+    os.replace(temp_path, path)
+
+
+def generate_variants(upload_folder, filename, overwrite=False, source=None):
+    """Writes every variant of one uploaded image. Returns the number of files written."""
+    source = source or os.path.join(upload_folder, filename)
+    written = 0
+    try:
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ('RGB', 'RGBA', 'L'):
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            os.makedirs(os.path.join(upload_folder, VARIANTS_DIRECTORY), exist_ok=True)
+            for variant, size in VARIANT_SIZES.items():
+                resized = image.copy()
+                resized.thumbnail((size, size), Image.LANCZOS)  # Never enlarges
+                for extension, image_format in VARIANT_FORMATS.items():
+                    target = os.path.join(upload_folder, variant_filename(filename, variant, extension))
+                    if overwrite or not os.path.exists(target):
+                        _save(resized, target, image_format)
+                        written += 1
+    except (OSError, UnidentifiedImageError) as e:
+        print(f"Error creating image variants for {filename}: {e}")
+    return written
+
+
+def schedule_variants(upload_folder, filename, source=None):
+    """Generates the variants of a freshly saved upload in the background."""
+    if is_image(filename):
+        _executor.submit(generate_variants, upload_folder, filename, source=source)
+
+
+def delete_variants(upload_folder, filename):
+    for variant in VARIANT_SIZES:
+        for extension in VARIANT_FORMATS:
+            path = os.path.join(upload_folder, variant_filename(filename, variant, extension))
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def backfill_variants(upload_folder, workers=None, sources=None):
+    """Creates the missing variants of every image in upload_folder, plus those in
+    `sources` ({filename: path} of stored blobs), using a process pool.
+    Returns (images checked, files written)."""
+    images = {name: os.path.join(upload_folder, name) for name in os.listdir(upload_folder)
+              if is_image(name) and os.path.isfile(os.path.join(upload_folder, name))}
+    images.update((name, path) for name, path in (sources or {}).items() if is_image(name))
+    filenames = list(images)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        written = sum(pool.map(generate_variants, [upload_folder] * len(filenames), filenames,
+                               [False] * len(filenames), [images[name] for name in filenames], chunksize=8))
+    return len(filenames), written
+
+
+if __name__ == '__main__':
+    # Backfill for uploads that predate the variant pipeline:  python image_variants.py
+    from app import app
+    from blob_store import stored_uploads
+
+    with app.app_context():
+        sources = stored_uploads()
+    checked, written = backfill_variants(app.config['UPLOAD_FOLDER'], sources=sources)
+    print(f"Checked {checked} images, wrote {written} variant files.")
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+
+from flask import Request, current_app, has_app_context
+
+# --- Upload Ingestion ---
+# Uploaded files are streamed to disk once. SamplyzeRequest makes Werkzeug's form parser
+# write every file part straight into a HashingSpoolFile, which stores the chunks in a
+# temporary file next to the upload folders and updates a SHA-256 as they arrive.
+# ingest_upload() then only has to rename that file into its final place; for streams
+# that were not spooled that way it copies them in fixed-size chunks, hashing on the way.
+# Either way the file appears atomically and the caller gets an UploadRecord to store.
+
+CHUNK_SIZE = 64 * 1024
+
+UploadRecord = namedtuple('UploadRecord', ['filename', 'original_filename', 'size', 'sha256', 'content_type'])
+
+
+class HashingSpoolFile:
+    """A temporary file that hashes everything written to it."""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+        self.claimed = False
+
+    def write(self, data):
+        self._sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def claim(self, destination):
+        """Moves the finished file to `destination`. The spool is empty afterwards."""
+        self._file.close()
+        try:
+            os.replace(self.path, destination)
+        except OSError:
+            # UPLOAD_TEMP_FOLDER is on another file system: copy next to the target first
+            temp_path = destination + '.part'
+            shutil.move(self.path, temp_path)
+            os.replace(temp_path, destination)
+        self.claimed = True
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if not self.claimed and os.path.exists(self.path):
+            # Uploads that no view stored are removed at the end of the request
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        # read, seek, tell, ... for views that still look at the stream directly
+        return getattr(self._file, name)
+
+
+class SamplyzeRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if has_app_context() and current_app.config.get('UPLOAD_TEMP_FOLDER'):
+            return HashingSpoolFile(current_app.config['UPLOAD_TEMP_FOLDER'])
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+def spool_upload(file_storage, directory):
+    """Puts the content of an uploaded FileStorage into a temporary file in `directory`.
+    Returns (temporary path, size, sha256); the caller renames or removes the file."""
+    stream = file_storage.stream
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    if isinstance(stream, HashingSpoolFile) and not stream.claimed:
+        # Already on disk and hashed by the form parser: just move it
+        os.close(fd)
+        stream.claim(temp_path)
+        return temp_path, stream.size, stream.sha256
+
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, size, sha256.hexdigest()
+
+
+def ingest_upload(file_storage, directory, filename, original_filename=None):
+    """Stores an uploaded FileStorage as directory/filename. Returns its UploadRecord."""
+    temp_path, size, sha256 = spool_upload(file_storage, directory)
+    os.replace(temp_path, os.path.join(directory, filename))
+    return UploadRecord(filename=filename,
+                        original_filename=original_filename or file_storage.filename,
+                        size=size, sha256=sha256,
+                        content_type=file_storage.mimetype or None)
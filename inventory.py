@@ -10,6 +10,7 @@ from models import db, InventoryItem, PermissionNames
 from forms import InventoryItemForm
 from decorators import permission_required
 from utils import generate_uid
+from pagination import paginate_request
 
 # Create a Blueprint
 inventory_bp = Blueprint('inventory', __name__, url_prefix='/inventory', template_folder='templates')
@@ -51,7 +52,7 @@ def dashboard():
         # Low stock is 20% or less
         query = query.filter(InventoryItem.current_quantity <= 20)
 
-    items = query.order_by(InventoryItem.name).all()
+    page = paginate_request(query, [InventoryItem.name.asc(), InventoryItem.id.asc()])
     
     # Pass filter values back to the template to keep them selected
     filters = {
@@ -61,7 +62,7 @@ def dashboard():
         'quantity': quantity_filter
     }
     
-    return render_template('inventory/dashboard.html', title='Inventory Management', form=form, items=items, filters=filters)
+    return render_template('inventory/dashboard.html', title='Inventory Management', form=form, items=page.items, page=page, filters=filters)
 
 @inventory_bp.route('/add', methods=['POST'])
 @login_required
@@ -7,7 +7,8 @@ import pytz
 from models import db, Issue, IssueComment, IssueAttachment, User, PermissionNames
 from forms import CreateIssueForm, CommentForm
 from decorators import permission_required
-from utils import generate_uid
+from utils import generate_issue_uid
+from pagination import paginate_request
 
 # Create a Blueprint
 issue_tracker_bp = Blueprint('issue_tracker', __name__, url_prefix='/issue-tracker', template_folder='templates')
@@ -34,9 +35,9 @@ def dashboard():
         # This creates a "to be verified" queue for everyone.
         query = query.filter(db.or_(Issue.verifier_id == None, Issue.verifier_id == current_user.id))
     
-    issues = query.order_by(Issue.updated_at.desc()).all()
+    page = paginate_request(query, [Issue.updated_at.desc(), Issue.id.desc()])
     
-    return render_template('issue_tracker/dashboard.html', title='Issue Tracker', issues=issues, filter_by=filter_by)
+    return render_template('issue_tracker/dashboard.html', title='Issue Tracker', issues=page.items, page=page, filter_by=filter_by)
 
 @issue_tracker_bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -49,7 +50,7 @@ def create_issue():
 
     if form.validate_on_submit():
         new_issue = Issue(
-            issue_uid=f"ISS-{generate_uid()}",
+            issue_uid=generate_issue_uid(),
             title=form.title.data,
             description=form.description.data,
             reporter_id=current_user.id,
@@ -1,12 +1,14 @@
 import os
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_from_directory, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, abort
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from datetime import datetime
 
-from models import db, Mail, MailRecipient, MailAttachment, User, PermissionNames
+from models import db, Mail, MailRecipient, MailAttachment, User, PermissionNames, adjust_unread_mail_count
 from forms import ComposeMailForm
 from decorators import permission_required
+from pagination import paginate_request
+from blob_store import upload_key, store_upload, release, serve_blob
 
 # Create a Blueprint
 mail_bp = Blueprint('mail', __name__, url_prefix='/mail', template_folder='templates')
@@ -17,9 +19,7 @@ def delete_mail_file(filename):
     if not filename: return
     try:
         # Mail attachments are stored in the main UPLOAD_FOLDER
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        release(upload_key(filename))
     except Exception as e:
         print(f"Error deleting mail attachment {filename}: {e}")
 
@@ -28,19 +28,22 @@ def delete_mail_file(filename):
 @login_required
 @permission_required(PermissionNames.CAN_ACCESS_MAIL)
 def inbox():
-    received_mails = MailRecipient.query.join(Mail).filter(
+    query = MailRecipient.query.filter(
         MailRecipient.recipient_id == current_user.id, 
         MailRecipient.is_deleted == False
-    ).order_by(MailRecipient.is_read.asc(), Mail.sent_at.desc()).all()
+    )
+    # Recipient rows are created when the mail is sent, so id order is sent_at order and
+    # the whole sort can be read straight from ix_mail_recipient_inbox_order (its id is DESC).
+    page = paginate_request(query, [MailRecipient.is_read.asc(), MailRecipient.id.desc()])
     
-    return render_template('mail/inbox.html', title='Inbox', mails=received_mails)
+    return render_template('mail/inbox.html', title='Inbox', mails=page.items, page=page)
 
 @mail_bp.route('/sent')
 @login_required
 @permission_required(PermissionNames.CAN_ACCESS_MAIL)
 def sent():
-    sent_mails = Mail.query.filter_by(sender_id=current_user.id).order_by(Mail.sent_at.desc()).all()
-    return render_template('mail/sent.html', title='Sent Mail', mails=sent_mails)
+    page = paginate_request(Mail.query.filter_by(sender_id=current_user.id), [Mail.sent_at.desc(), Mail.id.desc()])
+    return render_template('mail/sent.html', title='Sent Mail', mails=page.items, page=page)
 
 @mail_bp.route('/compose', methods=['GET', 'POST'])
 @login_required
@@ -68,17 +71,21 @@ def compose():
             if attachment_file:
                 original_filename = secure_filename(attachment_file.filename)
                 unique_filename = f"mail_{new_mail.id}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{i}_{original_filename}"
-                attachment_file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename))
+                upload = store_upload(attachment_file, upload_key(unique_filename))
                 
                 attachment = MailAttachment(
                     mail_id=new_mail.id,
                     filename=unique_filename,
-                    original_filename=original_filename
+                    original_filename=original_filename,
+                    size=upload.size,
+                    sha256=upload.sha256
                 )
                 db.session.add(attachment)
             i += 1
 
         db.session.commit()
+        for user_id in form.recipients.data:
+            adjust_unread_mail_count(user_id, 1)
         flash('Your mail has been sent.', 'success')
         return redirect(url_for('mail.inbox'))
 
@@ -96,6 +103,9 @@ def view_mail(recipient_mail_id):
     if not recipient_mail.is_read:
         recipient_mail.is_read = True
         db.session.commit()
+        # Mail in the trash was taken off the count when it was deleted
+        if not recipient_mail.is_deleted:
+            adjust_unread_mail_count(current_user.id, -1)
         
     mail = recipient_mail.mail
     return render_template('mail/view_mail.html', title=mail.subject, mail=mail, recipient_mail=recipient_mail)
@@ -117,8 +127,11 @@ def delete_mail(recipient_mail_id):
     if recipient_mail.recipient_id != current_user.id:
         abort(403)
         
+    was_unread = not recipient_mail.is_read and not recipient_mail.is_deleted
     recipient_mail.is_deleted = True
     db.session.commit()
+    if was_unread:
+        adjust_unread_mail_count(current_user.id, -1)
     flash('Mail moved to trash.', 'success')
     return redirect(url_for('mail.inbox'))
 
@@ -137,8 +150,11 @@ def delete_sent_mail(mail_id):
         
     # Delete the mail record from the database
     # The cascade will handle deleting recipients and attachments records
+    unread_by = [r.recipient_id for r in mail.recipients if not r.is_read and not r.is_deleted]
     db.session.delete(mail)
     db.session.commit()
+    for user_id in unread_by:
+        adjust_unread_mail_count(user_id, -1)
     flash('Mail has been permanently deleted for all recipients.', 'success')
     return redirect(url_for('mail.sent'))
 
@@ -154,7 +170,7 @@ def download_attachment(attachment_id):
     if mail.sender_id != current_user.id and not is_recipient:
         abort(403)
         
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], attachment.filename, as_attachment=True, download_name=attachment.original_filename)
+    return serve_blob(upload_key(attachment.filename), attachment.original_filename, as_attachment=True)
 
 @mail_bp.route('/attachment/view/<int:attachment_id>')
 @login_required
@@ -167,4 +183,4 @@ def view_attachment(attachment_id):
     if mail.sender_id != current_user.id and not is_recipient:
         abort(403)
         
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], attachment.filename, as_attachment=False, download_name=attachment.original_filename)
+    return serve_blob(upload_key(attachment.filename), attachment.original_filename, as_attachment=False)
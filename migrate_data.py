@@ -1,5 +1,260 @@
+import hashlib
 import sqlite3
-import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlite_profile import connect, attach_readonly
+from schema_mappings import compile_mappings, SOURCE_SCHEMA
+
+# --- Data Migration ---
+# Copies the rows of a database from an older Samplyze version into the current one. The
+# old file is ATTACHed read-only and every table is filled by the INSERT ... SELECT that
+# schema_mappings.py compiles for the old file's schema version, so rows never pass
+# through Python. The statement runs over MIGRATION_BATCH_SIZE old rows at a time in rowid
+# order, each batch in its own short transaction together with a row in
+# migration_checkpoint recording the last rowid copied. Running the same old file again
+# (the job id is its SHA-256) therefore continues where an interrupted run stopped.
+#
+# Tables are grouped by their foreign keys in the new database: a group only starts once
+# the tables it refers to are complete, and the tables within a group are copied in
+# parallel. The web page starts a MigrationJob in the background and polls its status.
+#
+# REPLACED_TABLES are small and are replaced in a single transaction: emptied, filled with
+# the old rows and checked with PRAGMA foreign_key_check before COMMIT. They are copied
+# with foreign keys off, since deleting users with foreign keys on would run ON DELETE
+# SET NULL on the rows assigned to them.
+
+REPLACED_TABLES = ['lab_settings', 'user']
+SKIPPED_TABLES = {'migration_checkpoint'}
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def table_levels(conn, tables):
+    """Splits `tables` into groups that can be copied one after the other: every table
+    comes after the tables its foreign keys (in `conn`'s database) point to."""
+    parents = {}
+    for table in tables:
+        referenced = {row[2] for row in conn.execute(f'PRAGMA foreign_key_list("{table}")')}
+        parents[table] = (referenced & set(tables)) - {table}
+    levels, placed = [], set()
+    while len(placed) < len(tables):
+        level = [table for table in tables if table not in placed and parents[table] <= placed]
+        if not level:
+            # Tables that refer to each other: copy them one at a time in their old order
+            levels.extend([table] for table in tables if table not in placed)
+            break
+        levels.append(level)
+        placed.update(level)
+    return levels
+
+
+class MigrationJob:
+    def __init__(self, job_id, new_db_path, old_db_path, batch_size=1000, workers=3, on_finished=None):
+        self.id = job_id
+        self.new_db_path = new_db_path
+        self.old_db_path = old_db_path
+        self.batch_size = batch_size
+        self.workers = workers
+        self.on_finished = on_finished
+        self.state = 'pending'
+        self.message = None
+        self.started = None
+        self.finished = None
+        self.version = None
+        self.compiled = {}
+        self.tables = {}  # name -> {'total', 'copied', 'state', 'error', 'notes'}
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name=f'migration-{self.id[:8]}', daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self):
+        return self.state in ('pending', 'running')
+
+    def run(self):
+        """Copies every table. Returns (True, message) or (False, message)."""
+        self.state = 'running'
+        self.started = time.time()
+        try:
+            new_conn = self._connect()
+            try:
+                version, self.compiled, failed, unmapped = compile_mappings(new_conn, SKIPPED_TABLES)
+                self.version = version.name
+                levels = table_levels(new_conn, list(self.compiled))
+            finally:
+                new_conn.close()
+            for table, compiled in self.compiled.items():
+                self.tables[table] = {'total': None, 'copied': 0, 'state': 'waiting', 'error': None,
+                                      'notes': compiled.notes}
+            for table, reason in failed.items():
+                self.tables[table] = {'total': None, 'copied': 0, 'state': 'failed', 'error': reason, 'notes': []}
+            for table, reason in unmapped.items():
+                self.tables[table] = {'total': None, 'copied': 0, 'state': 'skipped', 'error': reason, 'notes': []}
+
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='migration') as pool:
+                for level in levels:
+                    list(pool.map(self._copy_table, level))
+
+            migrated = [name for name, table in self.tables.items() if table['state'] == 'done']
+            skipped = [name for name, table in self.tables.items() if table['state'] == 'skipped']
+            failed = [name for name, table in self.tables.items() if table['state'] == 'failed']
+            if failed:
+                self.state = 'failed'
+                self.message = (f"Migrated {len(migrated)} tables; {', '.join(failed)} could not be copied. "
+                                f"Fix the problem (or the mapping in schema_mappings.py) and migrate the same "
+                                f"file again to continue.")
+            else:
+                self._clear_checkpoints()
+                self.state = 'finished'
+                self.message = f"Successfully migrated data from {len(migrated)} tables."
+                if skipped:
+                    self.message += f" Skipped {len(skipped)} old tables the current version does not have."
+        except sqlite3.Error as e:
+            self.state = 'failed'
+            self.message = f"A database error occurred during migration: {e}"
+        except Exception as e:
+            # Anything else would end the background thread with the job stuck in 'running'
+            self.state = 'failed'
+            self.message = f"An unexpected error occurred during migration: {e}"
+        finally:
+            self.finished = time.time()
+            if self.on_finished is not None:
+                try:
+                    self.on_finished(self)
+                except Exception as e:
+                    print(f"Error after migration {self.id}: {e}")
+        return self.state == 'finished', self.message
+
+    def _connect(self, **kwargs):
+        conn = connect(self.new_db_path, uri=True, **kwargs)
+        attach_readonly(conn, self.old_db_path, SOURCE_SCHEMA)
+        return conn
+
+    def _copy_table(self, table):
+        progress = self.tables[table]
+        progress['state'] = 'copying'
+        compiled = self.compiled[table]
+        source = f'{SOURCE_SCHEMA}."{compiled.source}"'
+        # Transactions are managed by hand, one per batch
+        replaced = table in REPLACED_TABLES
+        batch_size = -1 if replaced else self.batch_size  # LIMIT -1: all rows in one batch
+        conn = self._connect(isolation_level=None, foreign_keys='OFF' if replaced else 'ON')
+        try:
+            progress['total'] = conn.execute(f'SELECT COUNT(*) FROM {source}').fetchone()[0]
+            checkpoint = conn.execute(
+                "SELECT last_rowid, rows_copied, done FROM migration_checkpoint WHERE job_id = ? AND table_name = ?",
+                (self.id, table)).fetchone()
+            last_rowid, copied, done = checkpoint or (None, 0, False)
+            progress['copied'] = copied
+            if done:
+                progress['state'] = 'done'
+                return
+
+            first_batch = checkpoint is None
+            while True:
+                where = "WHERE rowid > ?" if last_rowid is not None else ""
+                low, high, count = conn.execute(
+                    f'SELECT MIN(rowid), MAX(rowid), COUNT(*) FROM '
+                    f'(SELECT rowid FROM {source} {where} ORDER BY rowid LIMIT ?)',
+                    ((last_rowid,) if last_rowid is not None else ()) + (batch_size,)).fetchone()
+                conn.execute("BEGIN IMMEDIATE")
+                # Foreign keys are checked at COMMIT, so rows may refer to later rows of their own table
+                conn.execute("PRAGMA defer_foreign_keys=ON")
+                try:
+                    if count:
+                        if first_batch and replaced:
+                            conn.execute(f'DELETE FROM main."{table}"')
+                        conn.execute(compiled.sql, [low, high] + compiled.params)
+                        if replaced:
+                            self._check_foreign_keys(conn, table)
+                        last_rowid = high
+                        copied += count
+                    conn.execute(
+                        "INSERT INTO migration_checkpoint (job_id, table_name, last_rowid, rows_copied, done) "
+                        "VALUES (?, ?, ?, ?, ?) ON CONFLICT (job_id, table_name) DO UPDATE SET "
+                        "last_rowid = excluded.last_rowid, rows_copied = excluded.rows_copied, done = excluded.done",
+                        (self.id, table, last_rowid, copied, not count))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                first_batch = False
+                progress['copied'] = copied
+                if not count:
+                    break
+            progress['state'] = 'done'
+        except sqlite3.Error as e:
+            print(f"Could not migrate table '{table}': {e}")
+            progress.update(state='failed', error=str(e))
+        finally:
+            conn.close()
+
+    def _check_foreign_keys(self, conn, table):
+        """Raises IntegrityError when rows of `table`, or rows referring to it, point to rows
+        that do not exist."""
+        tables = [table] + [row[0] for row in conn.execute(
+            "SELECT m.name FROM main.sqlite_master m, pragma_foreign_key_list(m.name) f "
+            "WHERE m.type = 'table' AND f.\"table\" = ? AND m.name != ?", (table, table))]
+        broken = {}
+        for checked in tables:
+            for row in conn.execute(f'PRAGMA main.foreign_key_check("{checked}")'):
+                broken.setdefault(f"{row[0]} -> {row[2]}", []).append(row[1])
+        if broken:
+            details = '; '.join(f"{pair} (rowid {', '.join(map(str, rowids[:5]))})" for pair, rowids in broken.items())
+            raise sqlite3.IntegrityError(f"foreign keys point to missing rows: {details}")
+
+    def _clear_checkpoints(self):
+        conn = connect(self.new_db_path)
+        try:
+            conn.execute("DELETE FROM migration_checkpoint WHERE job_id = ?", (self.id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def status(self):
+        """The job's progress as a JSON-friendly dict."""
+        tables = [dict(progress, name=name) for name, progress in list(self.tables.items())]
+        return {
+            'id': self.id,
+            'state': self.state,
+            'version': self.version,
+            'message': self.message,
+            'elapsed': round((self.finished or time.time()) - self.started, 1) if self.started else 0,
+            'copied': sum(table['copied'] for table in tables),
+            'total': sum(table['total'] or 0 for table in tables),
+            'tables': tables,
+        }
+
+
+def start_migration(new_db_path, old_db_path, batch_size=1000, workers=3, on_finished=None):
+    """Starts migrating `old_db_path` in the background. Returns (job, started); when
+    another migration is still running that job is returned with started=False."""
+    with _jobs_lock:
+        for job in _jobs.values():
+            if job.running:
+                return job, False
+        job = MigrationJob(file_sha256(old_db_path), new_db_path, old_db_path, batch_size, workers, on_finished)
+        _jobs[job.id] = job
+        job.start()
+        return job, True
+
+
+def get_job(job_id):
+    return _jobs.get(job_id)
+
 
 def run_migration(new_db_path, old_db_path):
     """
@@ -7,46 +262,5 @@ def run_migration(new_db_path, old_db_path):
     This function can be called from the web app or other scripts.
     Returns (True, "Success message") or (False, "Error message").
     """
-    try:
-        old_conn = sqlite3.connect(old_db_path)
-        new_conn = sqlite3.connect(new_db_path)
-        old_cursor = old_conn.cursor()
-        new_cursor = new_conn.cursor()
-
-        old_cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-        table_names = [row[0] for row in old_cursor.fetchall()]
-
-        migrated_tables = []
-        for table_name in table_names:
-            try:
-                old_cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = [info[1] for info in old_cursor.fetchall()]
-                if not columns: continue
-
-                columns_str = ', '.join(columns)
-                old_cursor.execute(f"SELECT {columns_str} FROM {table_name}")
-                data = old_cursor.fetchall()
-
-                if data:
-                    if table_name in ['lab_settings', 'user']:
-                        new_cursor.execute(f"DELETE FROM {table_name}")
-                    
-                    placeholders = ', '.join(['?'] * len(columns))
-                    query = f"INSERT OR IGNORE INTO {table_name} ({columns_str}) VALUES ({placeholders})"
-                    new_cursor.executemany(query, data)
-                
-                migrated_tables.append(table_name)
-
-            except sqlite3.OperationalError as e:
-                print(f"Skipping table '{table_name}': {e}")
-                continue
-        
-        new_conn.commit()
-        return (True, f"Successfully migrated data from {len(migrated_tables)} tables.")
-
-    except sqlite3.Error as e:
-        return (False, f"A database error occurred during migration: {e}")
-    finally:
-        if 'old_conn' in locals() and old_conn: old_conn.close()
-        if 'new_conn' in locals() and new_conn: new_conn.close()
-
+    job = MigrationJob(file_sha256(old_db_path), new_db_path, old_db_path)
+    return job.run()
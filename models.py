@@ -1,24 +1,32 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
+from types import SimpleNamespace
+import threading
+import time
 import pytz
 from sqlalchemy import event, Table
 from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, joinedload
+
+from sqlite_profile import apply_profile
 
 db = SQLAlchemy()
 
-# Enforce foreign key constraints for SQLite
+# Apply the SQLite engine profile (WAL, busy timeout, foreign keys, ...) to every connection
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):
-    cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA foreign_keys=ON")
-    cursor.close()
+    apply_profile(dbapi_connection)
 
 
 def get_ist_time():
     """Returns the current time in IST."""
     return datetime.now(pytz.timezone('Asia/Kolkata'))
 
+# get_ist_time() as a column default in SQL, for rows written without the ORM (migrations,
+# schema upgrades). List pages sort on these columns, so they are NOT NULL.
+IST_NOW_SQL = db.text("(datetime('now', '+5 hours', '+30 minutes'))")
+
 # --- NEW: Models for Role-Based Permission System ---
 
 # Association table for the many-to-many relationship between roles and permissions
@@ -42,13 +50,50 @@ class PermissionNames:
     CAN_ACCESS_ISSUE_TRACKER = 'can_access_issue_tracker'
     CAN_MANAGE_INVENTORY = 'can_manage_inventory'
 
+# --- Per-Role Permission Cache ---
+# Permission checks run several times per request, so each role's permission names are
+# loaded once into a frozenset and kept for the life of the process. Anything that
+# changes a role's permissions must call invalidate_role_permissions().
+_role_permissions = {}
+_role_permissions_generation = 0
+_role_permissions_lock = threading.Lock()
+
+def get_role_permissions(role_id):
+    """Returns the frozenset of permission names granted to a role."""
+    if role_id is None:
+        return frozenset()
+    names = _role_permissions.get(role_id)
+    if names is None:
+        generation = _role_permissions_generation
+        names = frozenset(name for (name,) in db.session.query(Permission.name)
+                          .join(role_permissions, role_permissions.c.permission_id == Permission.id)
+                          .filter(role_permissions.c.role_id == role_id))
+        with _role_permissions_lock:
+            # Don't cache a set that was read while the role was being changed
+            if generation == _role_permissions_generation:
+                _role_permissions[role_id] = names
+    return names
+
+def invalidate_role_permissions(role_id=None):
+    """Drops the cached permissions of one role, or of every role."""
+    global _role_permissions_generation
+    with _role_permissions_lock:
+        _role_permissions_generation += 1
+        if role_id is None:
+            _role_permissions.clear()
+        else:
+            _role_permissions.pop(role_id, None)
+
 class Role(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), unique=True, nullable=False)
     permissions = db.relationship('Permission', secondary=role_permissions, backref=db.backref('roles', lazy='dynamic'))
 
     def has_permission(self, perm):
-        return any(p.name == perm for p in self.permissions)
+        if self.id is None:
+            # Not saved yet, so there is nothing to cache
+            return any(p.name == perm for p in self.permissions)
+        return perm in get_role_permissions(self.id)
 
 class Permission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -71,13 +116,56 @@ class User(db.Model, UserMixin):
 
     def can(self, perm):
         """Check if the user has a specific permission."""
-        return self.role is not None and self.role.has_permission(perm)
+        # Uses role_id rather than self.role so a cached check needs no query at all
+        return perm in get_role_permissions(self.role_id)
 
     @property
     def is_admin(self):
         """Property to check if the user has the admin role."""
         return self.role is not None and self.role.name == 'Admin'
 
+# --- User Identity Cache ---
+# Flask-Login loads the current user on every request. The user is read together with
+# their role, its permissions and their department in one query, and the detached result
+# is reused for a short time. Views that change a user, a role or a department must call
+# invalidate_user_identity().
+_user_identities = {}  # user_id -> (expires_at, detached User)
+_user_identities_generation = 0
+_user_identities_lock = threading.Lock()
+
+def _load_user_identity(user_id):
+    # A private session, so the cached objects are never tied to a request's session
+    with Session(db.engine) as session:
+        return session.get(User, user_id, options=[
+            joinedload(User.role).joinedload(Role.permissions),
+            joinedload(User.department),
+        ])
+
+def load_user_identity(user_id, ttl=30):
+    """Returns the User for a session cookie, attached to the current db.session."""
+    entry = _user_identities.get(user_id)
+    if entry is None or entry[0] < time.monotonic():
+        generation = _user_identities_generation
+        user = _load_user_identity(user_id)
+        if user is None:
+            return None
+        entry = (time.monotonic() + ttl, user)
+        with _user_identities_lock:
+            if generation == _user_identities_generation:
+                _user_identities[user_id] = entry
+    # load=False copies the cached state into the session without querying it again
+    return db.session.merge(entry[1], load=False)
+
+def invalidate_user_identity(user_id=None):
+    """Drops the cached identity of one user, or of every user."""
+    global _user_identities_generation
+    with _user_identities_lock:
+        _user_identities_generation += 1
+        if user_id is None:
+            _user_identities.clear()
+        else:
+            _user_identities.pop(user_id, None)
+
 
 class Department(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -106,7 +194,7 @@ class Applicant(db.Model):
     
     remarks = db.Column(db.Text)
     overview = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=get_ist_time)
+    created_at = db.Column(db.DateTime, default=get_ist_time, server_default=IST_NOW_SQL, nullable=False, index=True)
     
     consultancies_nsc = db.relationship('ConsultancyNSC', back_populates='applicant', cascade="all, delete-orphan")
     samples_sc = db.relationship('SampleSC', back_populates='applicant', cascade="all, delete-orphan")
@@ -126,7 +214,7 @@ class Applicant(db.Model):
 
 class ConsultancyNSC(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    applicant_id = db.Column(db.Integer, db.ForeignKey('applicant.id'), nullable=False)
+    applicant_id = db.Column(db.Integer, db.ForeignKey('applicant.id'), nullable=False, index=True)
     consultant_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     date = db.Column(db.Date, nullable=False)
     time = db.Column(db.Time, nullable=False)
@@ -142,21 +230,28 @@ class ConsultancyNSC(db.Model):
 
 class NSCImage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    consultancy_nsc_id = db.Column(db.Integer, db.ForeignKey('consultancy_nsc.id'), nullable=False)
+    consultancy_nsc_id = db.Column(db.Integer, db.ForeignKey('consultancy_nsc.id'), nullable=False, index=True)
     image_path = db.Column(db.String(255), nullable=False)
     caption = db.Column(db.String(255))
+    size = db.Column(db.Integer, nullable=True)       # bytes, recorded at upload
+    sha256 = db.Column(db.String(64), nullable=True)
 
 class SampleSC(db.Model):
+    __table_args__ = (
+        # all_samples: "assigned to me" filter sorted by submission date
+        db.Index('ix_sample_sc_assigned_staff_submission', 'assigned_staff_id', 'submission_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     sample_uid = db.Column(db.String(12), unique=True, nullable=False)
-    applicant_id = db.Column(db.Integer, db.ForeignKey('applicant.id'), nullable=False)
+    applicant_id = db.Column(db.Integer, db.ForeignKey('applicant.id'), nullable=False, index=True)
     assigned_staff_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
     allotted_department_id = db.Column(db.Integer, db.ForeignKey('department.id', ondelete='SET NULL'), nullable=True)
     
     sample_name = db.Column(db.String(150))
     sample_type = db.Column(db.String(100))
     collection_date = db.Column(db.DateTime)
-    submission_date = db.Column(db.DateTime, default=get_ist_time)
+    submission_date = db.Column(db.DateTime, default=get_ist_time, server_default=IST_NOW_SQL, nullable=False, index=True)
     primary_observations = db.Column(db.Text)
     recommended_storage = db.Column(db.String(200))
     storage_location = db.Column(db.String(100))
@@ -175,13 +270,15 @@ class SampleSC(db.Model):
 
 class SampleImage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    sample_sc_id = db.Column(db.Integer, db.ForeignKey('sample_sc.id'), nullable=False)
+    sample_sc_id = db.Column(db.Integer, db.ForeignKey('sample_sc.id'), nullable=False, index=True)
     image_path = db.Column(db.String(255), nullable=False)
     caption = db.Column(db.String(255))
+    size = db.Column(db.Integer, nullable=True)
+    sha256 = db.Column(db.String(64), nullable=True)
 
 class Diagnosis(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    sample_sc_id = db.Column(db.Integer, db.ForeignKey('sample_sc.id'), nullable=False)
+    sample_sc_id = db.Column(db.Integer, db.ForeignKey('sample_sc.id'), nullable=False, index=True)
     name = db.Column(db.String(150))
     title = db.Column(db.String(150))
     description = db.Column(db.Text)
@@ -192,10 +289,12 @@ class Diagnosis(db.Model):
 
 class DiagnosisAttachment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    diagnosis_id = db.Column(db.Integer, db.ForeignKey('diagnosis.id'), nullable=False)
+    diagnosis_id = db.Column(db.Integer, db.ForeignKey('diagnosis.id'), nullable=False, index=True)
     file_path = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
     file_type = db.Column(db.String(50))
+    size = db.Column(db.Integer, nullable=True)
+    sha256 = db.Column(db.String(64), nullable=True)
 
 class LabSettings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -211,11 +310,38 @@ class LabSettings(db.Model):
     website_url = db.Column(db.String(300))
     verification_url = db.Column(db.String(300))
 
+# --- Lab Settings Cache ---
+# Every rendered page shows the lab settings, so the row is read once per process and
+# kept as a plain snapshot. The lab_settings view calls invalidate_lab_settings() after saving.
+_lab_settings = {}
+_lab_settings_generation = 0
+_lab_settings_lock = threading.Lock()
+
+def get_lab_settings():
+    """Returns a read-only snapshot of the LabSettings row, or None if there is none."""
+    if 'current' not in _lab_settings:
+        generation = _lab_settings_generation
+        row = LabSettings.query.first()
+        snapshot = None
+        if row is not None:
+            snapshot = SimpleNamespace(**{c.key: getattr(row, c.key) for c in LabSettings.__table__.columns})
+        with _lab_settings_lock:
+            if generation == _lab_settings_generation:
+                _lab_settings['current'] = snapshot
+        return snapshot
+    return _lab_settings['current']
+
+def invalidate_lab_settings():
+    global _lab_settings_generation
+    with _lab_settings_lock:
+        _lab_settings_generation += 1
+        _lab_settings.clear()
+
 class Folder(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=get_ist_time)
     
     owner = db.relationship('User', backref='owned_folders')
@@ -223,10 +349,16 @@ class Folder(db.Model):
     permissions = db.relationship('FolderPermission', backref='folder', cascade="all, delete-orphan")
 
 class File(db.Model):
+    __table_args__ = (
+        db.Index('ix_file_folder_uploaded', 'folder_id', 'uploaded_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     folder_id = db.Column(db.Integer, db.ForeignKey('folder.id'), nullable=False)
     filename = db.Column(db.String(255), nullable=False) # The unique name on disk
     original_filename = db.Column(db.String(255), nullable=False) # The name the user gave it
+    size = db.Column(db.Integer, nullable=True)
+    sha256 = db.Column(db.String(64), nullable=True)
     uploaded_at = db.Column(db.DateTime, default=get_ist_time)
     uploader_id = db.Column(db.Integer, db.ForeignKey('user.id'))
 
@@ -234,42 +366,100 @@ class File(db.Model):
 
 class FolderPermission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    folder_id = db.Column(db.Integer, db.ForeignKey('folder.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    folder_id = db.Column(db.Integer, db.ForeignKey('folder.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
 
     user = db.relationship('User', backref='folder_permissions')
 
 class Mail(db.Model):
+    __table_args__ = (
+        # mail.sent: a sender's mails, newest first
+        db.Index('ix_mail_sender_sent_at', 'sender_id', 'sent_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     subject = db.Column(db.String(255), nullable=False)
     body = db.Column(db.Text, nullable=False)
-    sent_at = db.Column(db.DateTime, default=get_ist_time)
+    sent_at = db.Column(db.DateTime, default=get_ist_time, server_default=IST_NOW_SQL, nullable=False)
     
     sender = db.relationship('User', backref='sent_mails')
     recipients = db.relationship('MailRecipient', backref='mail', cascade="all, delete-orphan")
     attachments = db.relationship('MailAttachment', backref='mail', cascade="all, delete-orphan")
 
 class MailRecipient(db.Model):
+    __table_args__ = (
+        # mail.inbox (unread first, newest first) and the unread counter in the global template context
+        db.Index('ix_mail_recipient_inbox_order', 'recipient_id', 'is_deleted', 'is_read', db.text('id DESC')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    mail_id = db.Column(db.Integer, db.ForeignKey('mail.id'), nullable=False)
+    mail_id = db.Column(db.Integer, db.ForeignKey('mail.id'), nullable=False, index=True)
     recipient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    is_read = db.Column(db.Boolean, default=False)
+    is_read = db.Column(db.Boolean, default=False, server_default=db.false(), nullable=False)
     is_deleted = db.Column(db.Boolean, default=False) # Soft delete for inbox
 
     recipient = db.relationship('User', backref='received_mails')
 
+# --- Unread Mail Counters ---
+# The navbar shows each user's unread mail count on every page. The count is read from
+# the database the first time it is needed and then kept up to date by the mail views
+# through adjust_unread_mail_count() after they commit.
+_unread_mail_counts = {}
+_unread_mail_generation = 0
+_unread_mail_lock = threading.Lock()
+
+def get_unread_mail_count(user_id):
+    """Returns the number of unread, not deleted mails in a user's inbox."""
+    count = _unread_mail_counts.get(user_id)
+    if count is None:
+        generation = _unread_mail_generation
+        count = MailRecipient.query.filter_by(recipient_id=user_id, is_read=False, is_deleted=False).count()
+        with _unread_mail_lock:
+            if generation == _unread_mail_generation:
+                _unread_mail_counts.setdefault(user_id, count)
+    return count
+
+def adjust_unread_mail_count(user_id, delta):
+    """Applies a committed change to a user's counter. Users without a counter are
+    skipped; their count is read from the database when it is next needed."""
+    global _unread_mail_generation
+    with _unread_mail_lock:
+        # A count being read right now may predate this change, so don't let it be stored
+        _unread_mail_generation += 1
+        if user_id in _unread_mail_counts:
+            _unread_mail_counts[user_id] = max(_unread_mail_counts[user_id] + delta, 0)
+
+def invalidate_unread_mail_count(user_id=None):
+    """Drops the counter of one user, or of every user."""
+    global _unread_mail_generation
+    with _unread_mail_lock:
+        _unread_mail_generation += 1
+        if user_id is None:
+            _unread_mail_counts.clear()
+        else:
+            _unread_mail_counts.pop(user_id, None)
+
+def clear_process_caches():
+    """Drops every cached row and counter, e.g. after the database file was replaced."""
+    invalidate_role_permissions()
+    invalidate_user_identity()
+    invalidate_lab_settings()
+    invalidate_unread_mail_count()
+
 class MailAttachment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    mail_id = db.Column(db.Integer, db.ForeignKey('mail.id'), nullable=False)
+    mail_id = db.Column(db.Integer, db.ForeignKey('mail.id'), nullable=False, index=True)
     filename = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.Integer, nullable=True)
+    sha256 = db.Column(db.String(64), nullable=True)
 
 class Equipment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     id_number = db.Column(db.String(100), unique=True, nullable=False)
     serial_number = db.Column(db.String(100), unique=True, nullable=True)
-    name = db.Column(db.String(150), nullable=False)
+    name = db.Column(db.String(150), nullable=False, index=True)
     make_model = db.Column(db.String(200))
     purchase_date = db.Column(db.Date)
     last_calibration_date = db.Column(db.Date)
@@ -279,11 +469,16 @@ class Equipment(db.Model):
     logs = db.relationship('EquipmentLog', backref='equipment', cascade="all, delete-orphan")
 
 class EquipmentLog(db.Model):
+    __table_args__ = (
+        # equipment.view_logs: one instrument's history, newest first
+        db.Index('ix_equipment_log_equipment_start', 'equipment_id', 'start_time'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     equipment_id = db.Column(db.Integer, db.ForeignKey('equipment.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     start_time = db.Column(db.DateTime, default=get_ist_time, nullable=False)
-    end_time = db.Column(db.DateTime, nullable=True)
+    end_time = db.Column(db.DateTime, nullable=True, index=True)
     notes = db.Column(db.Text)
 
     user = db.relationship('User')
@@ -292,7 +487,7 @@ class AuditLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     action = db.Column(db.String(255), nullable=False)
-    timestamp = db.Column(db.DateTime, default=get_ist_time, nullable=False)
+    timestamp = db.Column(db.DateTime, default=get_ist_time, nullable=False, index=True)
     
     user = db.relationship('User')
 
@@ -307,7 +502,7 @@ class Visitor(db.Model):
     applicant_uid = db.Column(db.String(10), nullable=True) # Link to an existing applicant
     institution = db.Column(db.String(200))
     purpose = db.Column(db.Text)
-    entry_time = db.Column(db.DateTime, default=get_ist_time, nullable=False)
+    entry_time = db.Column(db.DateTime, default=get_ist_time, nullable=False, index=True)
     exit_time = db.Column(db.DateTime, nullable=True)
     photo_filename = db.Column(db.String(255), nullable=True)
     vehicle_type = db.Column(db.String(100))
@@ -335,6 +530,12 @@ class MessageTemplate(db.Model):
 
 
 class Issue(db.Model):
+    __table_args__ = (
+        # issue_tracker.dashboard "assigned" and "reported" views, most recently updated first
+        db.Index('ix_issue_assignee_updated', 'assignee_id', 'updated_at'),
+        db.Index('ix_issue_reporter_updated', 'reporter_id', 'updated_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     issue_uid = db.Column(db.String(15), unique=True, nullable=False)
     title = db.Column(db.String(255), nullable=False)
@@ -350,7 +551,7 @@ class Issue(db.Model):
     status = db.Column(db.String(50), default='New')
     
     created_at = db.Column(db.DateTime, default=get_ist_time)
-    updated_at = db.Column(db.DateTime, default=get_ist_time, onupdate=get_ist_time)
+    updated_at = db.Column(db.DateTime, default=get_ist_time, onupdate=get_ist_time, server_default=IST_NOW_SQL, nullable=False, index=True)
 
     reporter = db.relationship('User', foreign_keys=[reporter_id])
     assignee = db.relationship('User', foreign_keys=[assignee_id])
@@ -361,7 +562,7 @@ class Issue(db.Model):
 
 class IssueComment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    issue_id = db.Column(db.Integer, db.ForeignKey('issue.id'), nullable=False)
+    issue_id = db.Column(db.Integer, db.ForeignKey('issue.id'), nullable=False, index=True)
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     comment = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=get_ist_time)
@@ -370,7 +571,7 @@ class IssueComment(db.Model):
 
 class IssueAttachment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    issue_id = db.Column(db.Integer, db.ForeignKey('issue.id'), nullable=False)
+    issue_id = db.Column(db.Integer, db.ForeignKey('issue.id'), nullable=False, index=True)
     uploader_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     filename = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
@@ -381,7 +582,7 @@ class IssueAttachment(db.Model):
 class InventoryItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     item_uid = db.Column(db.String(15), unique=True, nullable=False)
-    name = db.Column(db.String(200), nullable=False)
+    name = db.Column(db.String(200), nullable=False, index=True)
     category = db.Column(db.String(100), nullable=False)
     make = db.Column(db.String(100))
     model = db.Column(db.String(100))
@@ -392,4 +593,33 @@ class InventoryItem(db.Model):
     location_code = db.Column(db.String(100))
     purchase_date = db.Column(db.Date)
     expiry_date = db.Column(db.Date)
-    remarks = db.Column(db.Text)
\ No newline at end of file
+    remarks = db.Column(db.Text)
+
+class UidSequence(db.Model):
+    """One row per UID kind (applicant, sample, visitor, issue) holding the next unallocated
+    sequence number. Only uid_allocator reads and writes it."""
+    entity = db.Column(db.String(20), primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False, default=0)
+
+class Blob(db.Model):
+    """One stored file content in the blob store, named by its SHA-256 (see blob_store.py).
+    refcount is the number of BlobRef rows pointing at it."""
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0, index=True)
+    created_at = db.Column(db.DateTime, default=get_ist_time)
+
+class BlobRef(db.Model):
+    """Maps the name the app knows a file by (e.g. 'uploads/<filename>') to its content."""
+    name = db.Column(db.String(512), primary_key=True)
+    sha256 = db.Column(db.String(64), db.ForeignKey('blob.sha256'), nullable=False, index=True)
+
+class MigrationCheckpoint(db.Model):
+    """How far one table of an old database has been copied by a migration (see
+    migrate_data.py), so an interrupted migration of the same file resumes where it stopped.
+    job_id is the SHA-256 of the old database file."""
+    job_id = db.Column(db.String(64), primary_key=True)
+    table_name = db.Column(db.String(100), primary_key=True)
+    last_rowid = db.Column(db.Integer, nullable=True)
+    rows_copied = db.Column(db.Integer, nullable=False, default=0)
+    done = db.Column(db.Boolean, nullable=False, default=False)
@@ -0,0 +1,216 @@
+import base64
+import binascii
+import json
+from datetime import datetime, date
+
+from flask import request, url_for, abort
+from sqlalchemy import and_, or_, tuple_, literal, false
+from sqlalchemy.sql import operators
+
+# --- Keyset (Seek) Pagination ---
+# List pages are paginated by remembering the sort key of the last row shown instead of
+# an OFFSET, so page 500 costs the same index seek as page 1. The cursor is an opaque
+# token in the URL (?cursor=...) that encodes the direction and the key of the boundary row.
+# Sort key columns should be NOT NULL: the cursor condition is then a row-value comparison
+# that SQLite turns into an index range, so a page costs the same however deep it is.
+# Nullable keys still page correctly (NULL sorts before every other value, as in SQLite's
+# ORDER BY), but their OR-expanded condition makes SQLite walk the index from the start.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class KeysetPage:
+    """One page of results plus the cursors needed to move to its neighbours."""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def url_for_cursor(self, cursor):
+        """Builds a link to the current endpoint that keeps every other query argument."""
+        args = request.args.to_dict()
+        args.pop('cursor', None)
+        if cursor:
+            args['cursor'] = cursor
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+    @property
+    def next_url(self):
+        return self.url_for_cursor(self.next_cursor) if self.has_next else None
+
+    @property
+    def prev_url(self):
+        return self.url_for_cursor(self.prev_cursor) if self.has_prev else None
+
+    @property
+    def first_url(self):
+        return self.url_for_cursor(None)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+# --- Cursor encoding ---
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+    return value
+
+
+def encode_cursor(direction, key):
+    payload = json.dumps({'d': direction, 'k': [_encode_value(v) for v in key]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, key_length):
+    """Returns (direction, key) or raises ValueError for a malformed cursor."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction, key = payload['d'], [_decode_value(v) for v in payload['k']]
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if direction not in ('n', 'p') or len(key) != key_length:
+        raise ValueError("Invalid cursor.")
+    return direction, key
+
+
+# --- Query building ---
+def _split_order(clause):
+    """Splits `Model.col.desc()` into (Model.col, True); a bare column sorts ascending."""
+    modifier = getattr(clause, 'modifier', None)
+    if modifier is operators.desc_op:
+        return clause.element, True
+    if modifier is operators.asc_op:
+        return clause.element, False
+    return clause, False
+
+
+def _nullable(column):
+    return getattr(getattr(column, 'expression', column), 'nullable', True)
+
+
+def _equal(column, value):
+    return column.is_(None) if value is None else column == literal(value, column.type)
+
+
+def _beyond(column, value, greater):
+    """column > value (or < value), with NULL lower than every other value."""
+    if value is None:
+        return column.is_not(None) if greater else false()
+    # Typed literals so values such as datetimes and booleans bind exactly like stored ones.
+    value = literal(value, column.type)
+    if greater:
+        return column > value
+    return or_(column < value, column.is_(None)) if _nullable(column) else column < value
+
+
+def _seek_predicate(columns, descending, key, forward):
+    """Rows that come strictly after `key` in the sort order (or before it when not forward)."""
+    # Each column's comparison flips for descending columns and again for backward paging.
+    past = [desc != forward for desc in descending]  # True means "greater than"
+    if len(set(past)) == 1 and None not in key and not any(_nullable(column) for column in columns):
+        # Uniform direction: a row-value comparison that SQLite can satisfy with one index seek.
+        left = tuple_(*columns)
+        right = tuple_(*(literal(value, column.type) for column, value in zip(columns, key)))
+        return left > right if past[0] else left < right
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [_equal(columns[j], key[j]) for j in range(i)]
+        clauses.append(and_(*equal, _beyond(column, key[i], past[i])))
+    if key[0] is not None and not _nullable(columns[0]):
+        # Implied by the OR, but gives SQLite a range on the leading column to start from
+        value = literal(key[0], columns[0].type)
+        return and_(columns[0] >= value if past[0] else columns[0] <= value, or_(*clauses))
+    return or_(*clauses)
+
+
+def _page_size(per_page):
+    return min(max(int(per_page or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+
+
+def _keyset_query(query, order_by, direction, key, per_page):
+    columns, descending = zip(*(_split_order(clause) for clause in order_by))
+    forward = direction == 'n'
+    if key is not None:
+        query = query.filter(_seek_predicate(columns, descending, key, forward))
+    if forward:
+        ordering = list(order_by)
+    else:
+        # Walk backwards from the cursor; paginate_keyset restores the display order.
+        ordering = [column.asc() if desc else column.desc() for column, desc in zip(columns, descending)]
+
+    labels = [column.label(f'_keyset_{i}') for i, column in enumerate(columns)]
+    return query.add_columns(*labels).order_by(None).order_by(*ordering).limit(per_page + 1)
+
+
+def keyset_query(query, order_by, cursor=None, per_page=None):
+    """Returns the query paginate_keyset runs for `cursor` (used to EXPLAIN page plans)."""
+    direction, key = decode_cursor(cursor, len(order_by)) if cursor else ('n', None)
+    return _keyset_query(query, order_by, direction, key, _page_size(per_page))
+
+
+def paginate_keyset(query, order_by, cursor=None, per_page=None):
+    """Returns a KeysetPage of `query` sorted by `order_by`.
+
+    `order_by` is a list such as [SampleSC.submission_date.desc(), SampleSC.id.desc()];
+    its last column must be unique so that every row has a distinct key.
+    """
+    per_page = _page_size(per_page)
+    direction, key = decode_cursor(cursor, len(order_by)) if cursor else ('n', None)
+    forward = direction == 'n'
+
+    rows = _keyset_query(query, order_by, direction, key, per_page).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    keys = [tuple(row[1:]) for row in rows]
+
+    next_cursor = prev_cursor = None
+    if keys:
+        if has_more or not forward:
+            next_cursor = encode_cursor('n', keys[-1])
+        if key is not None and (forward or has_more):
+            prev_cursor = encode_cursor('p', keys[0])
+    elif not forward:
+        # Nothing is left before the cursor (rows were deleted): show the first page instead.
+        return paginate_keyset(query, order_by, None, per_page)
+    return KeysetPage(items, per_page, next_cursor, prev_cursor)
+
+
+def paginate_request(query, order_by):
+    """paginate_keyset driven by the ?cursor= and ?per_page= arguments of the current request."""
+    try:
+        return paginate_keyset(query, order_by,
+                               cursor=request.args.get('cursor'),
+                               per_page=request.args.get('per_page', type=int))
+    except ValueError:
+        abort(400)
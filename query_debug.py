@@ -0,0 +1,34 @@
+from collections import Counter
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# --- Lazy Load Logging ---
+# With app.config['LOG_LAZY_LOADS'] = True every request prints how many lazy relationship
+# loads (N+1 queries) it triggered and which relationships caused them. A view whose
+# loader options are complete should report zero.
+
+def _count_lazy_load(orm_execute_state):
+    if not has_request_context() or orm_execute_state.lazy_loaded_from is None:
+        return
+    owner = orm_execute_state.lazy_loaded_from.class_.__name__
+    path = orm_execute_state.loader_strategy_path
+    relationship = path[-1].key if path is not None and len(path) else '?'
+    g.setdefault('lazy_loads', Counter())[f"{owner}.{relationship}"] += 1
+
+
+def init_lazy_load_logging(app):
+    """Registers the lazy load counter if the app has LOG_LAZY_LOADS enabled."""
+    if not app.config.get('LOG_LAZY_LOADS'):
+        return
+
+    event.listen(Session, 'do_orm_execute', _count_lazy_load)
+
+    @app.after_request
+    def report_lazy_loads(response):
+        lazy_loads = g.pop('lazy_loads', None)
+        if lazy_loads:
+            details = ', '.join(f"{name} x{count}" for name, count in lazy_loads.most_common())
+            print(f"[lazy loads] {request.method} {request.path}: {sum(lazy_loads.values())} ({details})")
+        return response
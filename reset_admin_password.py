@@ -2,6 +2,8 @@ import sqlite3
 from werkzeug.security import generate_password_hash
 import os
 
+from sqlite_profile import connect
+
 # --- Configuration ---
 # This script assumes your database is in the 'instance' folder
 # and is named 'laboratory.db'.
@@ -23,7 +25,7 @@ def reset_admin_password():
         hashed_password = generate_password_hash(DEFAULT_PASSWORD, method='pbkdf2:sha256')
 
         # Connect to the database
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect(DB_PATH)
         cursor = conn.cursor()
 
         # Find the admin user and update their password
@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
 from flask_login import login_required, current_user
 
-from models import db, Role, Permission, User
+from models import db, Role, Permission, User, invalidate_role_permissions, invalidate_user_identity
 from forms import RoleForm
 
 # Create a Blueprint
@@ -39,6 +39,7 @@ def add_role():
         
         db.session.add(new_role)
         db.session.commit()
+        invalidate_role_permissions(new_role.id)
         flash(f"Role '{new_role.name}' has been created.", 'success')
         return redirect(url_for('roles.manage_roles'))
         
@@ -60,6 +61,8 @@ def edit_role(role_id):
             role.permissions.append(perm)
             
         db.session.commit()
+        invalidate_role_permissions(role.id)
+        invalidate_user_identity() # Cached users carry their role's name and permissions
         flash(f"Role '{role.name}' has been updated.", 'success')
         return redirect(url_for('roles.manage_roles'))
 
@@ -80,7 +83,10 @@ def delete_role(role_id):
     # Before deleting, unassign users from this role (or handle as needed)
     User.query.filter_by(role_id=role.id).update({'role_id': None})
     
+    role_id = role.id
     db.session.delete(role)
     db.session.commit()
+    invalidate_role_permissions(role_id)
+    invalidate_user_identity()
     flash(f"Role '{role.name}' has been deleted.", 'success')
     return redirect(url_for('roles.manage_roles'))
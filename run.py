@@ -1,6 +1,6 @@
 import webbrowser
 from waitress import serve
-from app import app
+from app import app, backup_scheduler
 
 # --- Configuration ---
 HOST = '0.0.0.0'  # <-- This allows access from other devices on the network
@@ -15,6 +15,9 @@ if __name__ == "__main__":
     # --- Open the browser on the local machine ---
     webbrowser.open_new(URL)
 
+    # --- Start the nightly backups ---
+    backup_scheduler.start()
+
     # --- Start the Waitress server ---
     print(f"Starting Enscygen Samplyze server at {URL}")
     serve(app, host=HOST, port=PORT)
@@ -0,0 +1,178 @@
+import re
+import sqlite3
+
+# --- Schema Mappings ---
+# How the tables of a database from an older Samplyze version map onto the current tables.
+# Each SchemaVersion recognises one old layout by the columns it has or lacks and lists a
+# TableMapping for every table that needs more than a same-name copy:
+#
+#   source      the old table the rows come from (default: the table of the same name;
+#               several current tables may draw on one old table to split it up)
+#   renames     {current column: old column}
+#   transforms  {current column: SQL expression}, evaluated on the old row aliased `src`
+#   defaults    {current column: value} for columns the old table does not have
+#   where       an SQL condition the old rows must meet
+#   drop        old columns that are deliberately not carried over
+#
+# compile_mappings() turns the rules into one INSERT ... SELECT per table, run by
+# migrate_data.py against the old database ATTACHed as `old`, so rows are copied inside
+# SQLite without passing through Python. Columns that would be lost and NOT NULL columns
+# nothing fills are reported instead of being skipped silently.
+
+SOURCE_SCHEMA = 'old'
+
+
+class TableMapping:
+    def __init__(self, source=None, renames=None, transforms=None, defaults=None, where=None, drop=()):
+        self.source = source
+        self.renames = renames or {}
+        self.transforms = transforms or {}
+        self.defaults = defaults or {}
+        self.where = where
+        self.drop = set(drop)
+
+
+class SchemaVersion:
+    def __init__(self, name, description, has=None, lacks=None, tables=None):
+        self.name = name
+        self.description = description
+        self.has = has or {}      # {table: [columns]} the old database must have
+        self.lacks = lacks or {}  # {table: [columns]} it must not have
+        self.tables = tables or {}
+
+    def matches(self, schema):
+        """`schema` is {table: set of columns} of the old database."""
+        for table, columns in self.has.items():
+            if not set(columns) <= schema.get(table, set()):
+                return False
+        for table, columns in self.lacks.items():
+            if set(columns) & schema.get(table, set()):
+                return False
+        return True
+
+
+# Newest first; the first version that matches is used
+SCHEMA_VERSIONS = [
+    SchemaVersion(
+        'roles-as-text',
+        "Before the role and permission tables: user.role held 'admin' or 'staff'.",
+        has={'user': ['role']}, lacks={'user': ['role_id']},
+        tables={
+            'user': TableMapping(
+                transforms={'role_id': "(SELECT id FROM main.role WHERE name = "
+                                       "CASE lower(src.role) WHEN 'admin' THEN 'Admin' ELSE 'Staff' END)"},
+                drop=['role']),
+        }),
+    SchemaVersion('current', "The current layout; tables are copied by column name."),
+]
+
+
+def read_schema(conn, schema):
+    """Returns {table: set of columns} of one schema of a connection."""
+    tables = [row[0] for row in conn.execute(
+        f"SELECT name FROM {schema}.sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")]
+    return {table: {row[1] for row in conn.execute(f'PRAGMA {schema}.table_info("{table}")')} for table in tables}
+
+
+def detect_version(schema):
+    for version in SCHEMA_VERSIONS:
+        if version.matches(schema):
+            return version
+    return SCHEMA_VERSIONS[-1]
+
+
+class CompiledTable:
+    """One current table's INSERT ... SELECT. The statement takes the first and last rowid
+    of a batch of old rows followed by `params`."""
+
+    def __init__(self, table, source, sql, params, notes):
+        self.table = table
+        self.source = source
+        self.sql = sql
+        self.params = params
+        self.notes = notes
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _copied(expression, notnull, default):
+    """An old column's value; NULLs in a column that is now NOT NULL get its default, since
+    INSERT OR IGNORE would otherwise drop the whole row."""
+    if notnull and default is not None:
+        return f"coalesce({expression}, ({default}))"
+    return expression
+
+
+def compile_table(conn, table, mapping, source_columns):
+    """Builds the CompiledTable of `table` or raises ValueError when the rules leave a
+    required column empty or name a column the old table does not have."""
+    columns, expressions, params = [], [], []
+    used = set()
+    for _, column, _, notnull, default, pk in conn.execute(f'PRAGMA main.table_info("{table}")'):
+        if column in mapping.transforms:
+            expressions.append(f"({mapping.transforms[column]})")
+        elif column in mapping.renames:
+            old_column = mapping.renames[column]
+            if old_column not in source_columns:
+                raise ValueError(f"the old table has no column '{old_column}' to rename to '{column}'")
+            expressions.append(_copied(f"src.{_quote(old_column)}", notnull, default))
+            used.add(old_column)
+        elif column in source_columns:
+            expressions.append(_copied(f"src.{_quote(column)}", notnull, default))
+            used.add(column)
+        elif column in mapping.defaults:
+            # Numbered, because the rowid bounds ?1 and ?2 come first but appear last
+            params.append(mapping.defaults[column])
+            expressions.append(f"?{len(params) + 2}")
+        else:
+            if notnull and default is None and not pk:
+                raise ValueError(f"nothing fills the required column '{column}'; the mapping needs a default for it")
+            continue  # Left to the column's default
+        columns.append(_quote(column))
+
+    # Old columns read by a transform (as src.column) count as carried over
+    for column in source_columns:
+        pattern = rf'src\.(?:{re.escape(column)}\b|"{re.escape(column)}")'
+        if any(re.search(pattern, expression) for expression in mapping.transforms.values()):
+            used.add(column)
+    lost = sorted(source_columns - used - mapping.drop)
+    notes = [f"Not carried over: {', '.join(lost)}"] if lost else []
+
+    where = f" AND ({mapping.where})" if mapping.where else ""
+    sql = (f'INSERT OR IGNORE INTO main.{_quote(table)} ({", ".join(columns)}) '
+           f'SELECT {", ".join(expressions)} FROM {SOURCE_SCHEMA}.{_quote(mapping.source or table)} AS src '
+           f'WHERE src.rowid BETWEEN ?1 AND ?2{where}')
+    return CompiledTable(table, mapping.source or table, sql, params, notes)
+
+
+def compile_mappings(conn, skipped_tables=()):
+    """Compiles the mapping for the old database ATTACHed to `conn` as `old`. Returns
+    (version, {table: CompiledTable}, {table: why it cannot be migrated},
+    {old table: why it is left out})."""
+    old_schema = read_schema(conn, SOURCE_SCHEMA)
+    new_schema = read_schema(conn, 'main')
+    version = detect_version(old_schema)
+
+    compiled, failed, unmapped = {}, {}, {}
+    sources_used = set()
+    for table in new_schema:
+        if table in skipped_tables:
+            continue
+        mapping = version.tables.get(table, TableMapping())
+        source = mapping.source or table
+        if source not in old_schema:
+            continue  # Nothing to bring over; the table stays as it is
+        sources_used.add(source)
+        try:
+            compiled[table] = compile_table(conn, table, mapping, old_schema[source])
+            # Let SQLite check the statement (and the transform expressions) before anything is copied
+            conn.execute("EXPLAIN " + compiled[table].sql, [0, 0] + compiled[table].params)
+        except (ValueError, sqlite3.Error) as e:
+            compiled.pop(table, None)
+            failed[table] = str(e)
+    for table in old_schema:
+        if table not in sources_used and table not in skipped_tables:
+            unmapped[table] = "the current version has no such table and no mapping for it"
+    return version, compiled, failed, unmapped
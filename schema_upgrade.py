@@ -0,0 +1,127 @@
+from sqlalchemy.schema import CreateTable
+
+from models import db
+
+# --- Idempotent Schema Upgrades ---
+# db.create_all() only creates missing tables, so anything added to an existing table
+# (such as a new column or index) is brought into older laboratory.db files from here.
+# Every step is safe to run on each startup.
+
+# Indexes that were replaced by a differently defined one under a new name
+RETIRED_INDEXES = ['ix_mail_recipient_inbox']
+
+
+def ensure_indexes():
+    """Creates every index declared on the models that the database does not have yet and
+    drops RETIRED_INDEXES. Returns the names of the indexes that were created."""
+    created = []
+    with db.engine.begin() as conn:
+        for name in RETIRED_INDEXES:
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+        existing = {row[0] for row in conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type='index'")}
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(bind=conn, checkfirst=True)
+                    created.append(index.name)
+    return created
+
+
+def ensure_columns():
+    """Adds every nullable column declared on the models that an existing table lacks.
+    Returns the added columns as 'table.column'."""
+    added = []
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table.name}")')}
+            if not existing:
+                continue  # Not created yet; create_all() takes care of it
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} to an existing table.")
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def _tighten_table(dbapi, table):
+    """Fills the NULLs of the table's NOT NULL columns from their server defaults and
+    rebuilds it with the current definition. Returns False when a column has NULLs and no
+    default to fill them with."""
+    quoted = f'"{table.name}"'
+    existing = {row[1]: row[3] for row in dbapi.execute(f'PRAGMA table_info({quoted})')}
+    for column in table.columns:
+        if column.nullable or column.primary_key or column.name not in existing:
+            continue
+        has_nulls = dbapi.execute(f'SELECT 1 FROM {quoted} WHERE "{column.name}" IS NULL LIMIT 1').fetchone()
+        if has_nulls:
+            if column.server_default is None:
+                print(f"Cannot make {table.name}.{column.name} NOT NULL: it has NULLs and no default.")
+                return False
+            default = column.server_default.arg
+            default = default.text if hasattr(default, 'text') else str(default.compile(dialect=db.engine.dialect))
+            dbapi.execute(f'UPDATE {quoted} SET "{column.name}" = {default} WHERE "{column.name}" IS NULL')
+
+    # SQLite cannot change a column's constraints: copy into a new table and swap it in
+    rebuilt = f'"{table.name}__rebuild"'
+    ddl = str(CreateTable(table).compile(dialect=db.engine.dialect)).strip()
+    prefix = f'CREATE TABLE {db.engine.dialect.identifier_preparer.format_table(table)} '
+    dbapi.execute(f'CREATE TABLE {rebuilt} ' + ddl[len(prefix):])
+    columns = ', '.join(f'"{column.name}"' for column in table.columns if column.name in existing)
+    dbapi.execute(f'INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {quoted}')
+    dbapi.execute(f'DROP TABLE {quoted}')
+    dbapi.execute(f'ALTER TABLE {rebuilt} RENAME TO {quoted}')
+    return True
+
+
+def ensure_not_null():
+    """Makes the columns declared NOT NULL on the models NOT NULL in older databases too.
+    Their indexes are dropped with the old table; ensure_indexes() recreates them.
+    Returns the names of the rebuilt tables."""
+    rebuilt = []
+    raw = db.engine.raw_connection()
+    try:
+        dbapi = raw.driver_connection
+        isolation_level = dbapi.isolation_level
+        dbapi.isolation_level = None  # Transactions are managed by hand
+        # Dropping a table with foreign keys on would delete or null the rows referring to it
+        dbapi.execute("PRAGMA foreign_keys=OFF")
+        try:
+            for table in db.metadata.sorted_tables:
+                existing = {row[1]: row[3] for row in dbapi.execute(f'PRAGMA table_info("{table.name}")')}
+                loose = [column.name for column in table.columns
+                         if not column.nullable and not column.primary_key and existing.get(column.name) == 0]
+                if not loose:
+                    continue
+                dbapi.execute("BEGIN IMMEDIATE")
+                try:
+                    done = _tighten_table(dbapi, table)
+                    dbapi.execute("COMMIT" if done else "ROLLBACK")
+                except BaseException:
+                    dbapi.execute("ROLLBACK")
+                    raise
+                if done:
+                    rebuilt.append(table.name)
+        finally:
+            dbapi.execute("PRAGMA foreign_keys=ON")
+            dbapi.isolation_level = isolation_level
+    finally:
+        raw.close()
+    return rebuilt
+
+
+def upgrade_schema():
+    """Runs all upgrade steps and reports what changed."""
+    added = ensure_columns()
+    if added:
+        print(f"Added {len(added)} database columns: {', '.join(added)}")
+    rebuilt = ensure_not_null()
+    if rebuilt:
+        print(f"Rebuilt {len(rebuilt)} database tables with their NOT NULL columns: {', '.join(rebuilt)}")
+    created = ensure_indexes()
+    if created:
+        print(f"Created {len(created)} database indexes: {', '.join(created)}")
@@ -0,0 +1,201 @@
+import os
+import sqlite3
+import time
+from urllib.request import pathname2url
+
+# --- SQLite Engine Profile ---
+# Every connection to a Samplyze database (the SQLAlchemy engine as well as the raw
+# sqlite3 connections used by backups, archives and migrations) is tuned with the
+# same set of PRAGMAs. WAL lets staff keep reading while another request writes.
+
+DEFAULT_PROFILE = {
+    'busy_timeout': 5000,              # ms to wait for a lock before 'database is locked'
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',           # safe with WAL, avoids an fsync on every commit
+    'foreign_keys': 'ON',
+    'cache_size': -16000,              # negative values are KiB (about 16 MB per connection)
+    'mmap_size': 268435456,            # 256 MB memory-mapped reads
+    'temp_store': 'MEMORY',
+    # Checkpoint policy: fold the WAL back into the database every 1000 pages and
+    # truncate the -wal file to this size afterwards so it cannot grow unbounded.
+    'wal_autocheckpoint': 1000,
+    'journal_size_limit': 67108864,    # 64 MB
+}
+
+# The order matters: busy_timeout must be in place before switching the journal mode,
+# which needs a brief exclusive lock on the file.
+PRAGMA_ORDER = ['busy_timeout', 'journal_mode', 'synchronous', 'foreign_keys', 'cache_size',
+                'mmap_size', 'temp_store', 'wal_autocheckpoint', 'journal_size_limit']
+
+_active_profile = dict(DEFAULT_PROFILE)
+
+
+def configure_profile(overrides=None):
+    """Replaces the active profile with the defaults updated by `overrides`.
+    A value of None disables that PRAGMA."""
+    global _active_profile
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(overrides or {})
+    _active_profile = profile
+    return profile
+
+
+def get_profile():
+    """Returns a copy of the profile applied to new connections."""
+    return dict(_active_profile)
+
+
+def apply_profile(dbapi_connection, **overrides):
+    """Runs the profile PRAGMAs on a raw DB-API connection."""
+    profile = get_profile()
+    profile.update(overrides)
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in PRAGMA_ORDER:
+            value = profile.get(pragma)
+            if value is not None:
+                cursor.execute(f"PRAGMA {pragma}={value}")
+    finally:
+        cursor.close()
+
+
+def connect(database, **overrides):
+    """Opens a sqlite3 connection with the active profile applied.
+    Keyword arguments that are not PRAGMA names are passed on to sqlite3.connect."""
+    connect_kwargs = {k: overrides.pop(k) for k in list(overrides) if k not in PRAGMA_ORDER}
+    busy_timeout = overrides.get('busy_timeout', _active_profile.get('busy_timeout')) or 0
+    connect_kwargs.setdefault('timeout', busy_timeout / 1000)
+    conn = sqlite3.connect(database, **connect_kwargs)
+    apply_profile(conn, **overrides)
+    return conn
+
+
+def checkpoint(dbapi_connection, mode='PASSIVE'):
+    """Copies WAL frames back into the database file.
+    Use TRUNCATE before the database file is copied or replaced so it is self-contained.
+    Returns (busy, wal_frames, checkpointed_frames)."""
+    if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+        raise ValueError(f"Unknown checkpoint mode '{mode}'.")
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA wal_checkpoint({mode})")
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def checkpoint_file(database, mode='TRUNCATE'):
+    """Opens `database`, checkpoints it and closes the connection again."""
+    conn = connect(database)
+    try:
+        return checkpoint(conn, mode)
+    finally:
+        conn.close()
+
+
+def sidecar_files(database):
+    """Returns the -wal and -shm paths that belong to a database file."""
+    return [f"{database}-wal", f"{database}-shm"]
+
+
+def describe_profile(dbapi_connection):
+    """Reads back the settings actually in effect on a connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        report = {}
+        for pragma in PRAGMA_ORDER:
+            cursor.execute(f"PRAGMA {pragma}")
+            row = cursor.fetchone()
+            report[pragma] = row[0] if row else None
+        return report
+    finally:
+        cursor.close()
+
+
+def format_report(report):
+    """Formats the output of describe_profile for the startup log."""
+    return ', '.join(f"{pragma}={value}" for pragma, value in report.items())
+
+
+# --- Online Snapshots ---
+class _SnapshotRestarted(Exception):
+    pass
+
+
+def snapshot(database, target, pages=1024, pause=0.002, max_restarts=3):
+    """Copies `database` to `target` with the online backup API, a consistent image that
+    includes the WAL. The copy runs in steps of `pages` pages with a short pause between
+    them, so writers get the lock in between. A write by another connection restarts the
+    copy; after `max_restarts` of those the rest is copied in one step."""
+    source = connect(database)
+    try:
+        restarts = 0
+        while True:
+            destination = sqlite3.connect(target)
+            progress = {'remaining': None}
+
+            def step_done(status, remaining, total):
+                if progress['remaining'] is not None and remaining > progress['remaining']:
+                    raise _SnapshotRestarted()
+                progress['remaining'] = remaining
+                time.sleep(pause)
+
+            try:
+                if restarts < max_restarts:
+                    source.backup(destination, pages=pages, progress=step_done)
+                else:
+                    # Under WAL a single-step copy only holds a read snapshot: writers go on
+                    source.backup(destination)
+                return restarts
+            except _SnapshotRestarted:
+                restarts += 1
+            finally:
+                destination.close()
+    finally:
+        source.close()
+
+
+def integrity_check(database):
+    """Runs PRAGMA integrity_check on a database file. Returns the problems found (empty if none)."""
+    conn = sqlite3.connect(database)
+    try:
+        rows = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        return [] if rows == ['ok'] else rows
+    finally:
+        conn.close()
+
+
+def vacuum_into(database, target):
+    """Writes a compacted copy of `database` (which should not be the live database) to `target`."""
+    conn = sqlite3.connect(database)
+    try:
+        conn.execute("VACUUM INTO ?", (target,))
+    finally:
+        conn.close()
+
+
+# --- Read-Only Files ---
+def readonly_uri(database, immutable=True):
+    """The file: URI that opens `database` read-only (see connect_readonly)."""
+    uri = f"file:{pathname2url(os.path.abspath(database))}?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+    return uri
+
+
+def connect_readonly(database, mmap_size=268435456, immutable=True):
+    """Opens a database file read-only where it lies, for files nothing writes to any more
+    (archives, backup copies). immutable=1 tells SQLite the file cannot change, so it takes
+    no locks and never looks for a journal; reads are served from a memory map.
+    Pass immutable=False for a database that is still being written, such as the live one."""
+    conn = sqlite3.connect(readonly_uri(database, immutable), uri=True,
+                           timeout=(_active_profile.get('busy_timeout') or 0) / 1000)
+    conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+    conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+def attach_readonly(conn, database, alias):
+    """ATTACHes an immutable database file read-only as `alias`. `conn` must have been
+    opened with uri=True for SQLite to read the URI."""
+    conn.execute("ATTACH DATABASE ? AS " + alias, (readonly_uri(database),))
@@ -0,0 +1,135 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import request, send_file, current_app
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip variants are written
+    brotli = None
+
+# --- Fingerprinted Static Assets ---
+# At startup every file in static/ is copied to STATIC_BUILD_FOLDER under a name that
+# contains a hash of its content (css/bootstrap.min.css -> css/bootstrap.min.3f2a9c1e07b4.css),
+# together with .gz (and .br, if the brotli package is installed) variants of the text files.
+# url_for('static', filename=...) then links to the fingerprinted name, which the static
+# view serves precompressed according to Accept-Encoding and marks as immutable for a year.
+# A changed file gets a new name, so browsers never have to revalidate.
+
+ONE_YEAR = 365 * 24 * 3600
+
+# Already compressed formats gain nothing from gzip or brotli
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.ttf', '.eot'}
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def fingerprint_name(path, content):
+    root, ext = os.path.splitext(path)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def _rewrite_css_urls(css, css_path, manifest):
+    """Points url() references to other static files at their fingerprinted names."""
+    base = os.path.dirname(css_path)
+
+    def replace(match):
+        quote, target = match.group(1), match.group(2)
+        if target.startswith(('data:', 'http:', 'https:', '//', '#', '/')):
+            return match.group(0)
+        reference, _, fragment = target.partition('#')
+        reference = reference.split('?', 1)[0]
+        logical = os.path.normpath(os.path.join(base, reference)).replace(os.sep, '/')
+        if logical not in manifest:
+            return match.group(0)
+        rewritten = os.path.relpath(manifest[logical], base or '.').replace(os.sep, '/')
+        if fragment:
+            rewritten += '#' + fragment
+        return f"url({quote}{rewritten}{quote})"
+
+    return CSS_URL.sub(replace, css)
+
+
+def _write_if_missing(path, content):
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+
+def _write_asset(build_folder, hashed_path, content):
+    target = os.path.join(build_folder, hashed_path)
+    _write_if_missing(target, content)
+    if os.path.splitext(hashed_path)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+        # Content-hashed names never change content, so existing variants are reused
+        if not os.path.exists(target + '.gz'):
+            _write_if_missing(target + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None and not os.path.exists(target + '.br'):
+            _write_if_missing(target + '.br', brotli.compress(content))
+
+
+def build_assets(static_folder, build_folder):
+    """Writes the fingerprinted copies and compressed variants of every static file.
+    Returns the manifest {logical path: fingerprinted path}."""
+    sources = []
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            full_path = os.path.join(root, name)
+            sources.append(os.path.relpath(full_path, static_folder).replace(os.sep, '/'))
+
+    manifest = {}
+    # Stylesheets last: their content (and so their hash) depends on the names they refer to
+    for logical in sorted(sources, key=lambda p: (p.endswith('.css'), p)):
+        with open(os.path.join(static_folder, logical), 'rb') as f:
+            content = f.read()
+        if logical.endswith('.css'):
+            content = _rewrite_css_urls(content.decode('utf-8'), logical, manifest).encode('utf-8')
+        hashed = fingerprint_name(logical, content)
+        _write_asset(build_folder, hashed, content)
+        manifest[logical] = hashed
+    return manifest
+
+
+def _pick_encoding(full_path):
+    """Returns (path, Content-Encoding) of the best variant the client accepts."""
+    accepted = request.accept_encodings
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if accepted[encoding] and os.path.exists(full_path + suffix):
+            return full_path + suffix, encoding
+    return full_path, None
+
+
+def init_static_assets(app):
+    """Builds the assets and makes url_for('static') and the static view use them."""
+    if not app.config.get('STATIC_FINGERPRINTING') or not app.static_folder:
+        return
+    build_folder = app.config['STATIC_BUILD_FOLDER']
+    manifest = build_assets(app.static_folder, build_folder)
+    fingerprinted = set(manifest.values())
+    app.extensions['static_assets'] = manifest
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    def serve_static(filename):
+        if filename not in fingerprinted:
+            # Unknown or unfingerprinted names are served as before
+            return current_app.send_static_file(filename)
+        full_path, encoding = _pick_encoding(os.path.join(build_folder, filename))
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_file(full_path, mimetype=mimetype, conditional=True, etag=True, max_age=ONE_YEAR)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = serve_static
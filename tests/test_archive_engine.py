@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive_engine import archive_records, ArchiveConflictError
+
+SCHEMA = """
+CREATE TABLE applicant (id INTEGER PRIMARY KEY, uid TEXT UNIQUE NOT NULL, name TEXT);
+CREATE TABLE sample_sc (id INTEGER PRIMARY KEY, sample_uid TEXT UNIQUE NOT NULL,
+    applicant_id INTEGER NOT NULL REFERENCES applicant(id), submission_date DATETIME);
+CREATE TABLE sample_image (id INTEGER PRIMARY KEY, sample_sc_id INTEGER NOT NULL REFERENCES sample_sc(id), image_path TEXT);
+CREATE TABLE diagnosis (id INTEGER PRIMARY KEY, sample_sc_id INTEGER NOT NULL REFERENCES sample_sc(id), name TEXT);
+CREATE TABLE diagnosis_attachment (id INTEGER PRIMARY KEY, diagnosis_id INTEGER NOT NULL REFERENCES diagnosis(id), file_path TEXT);
+CREATE TABLE consultancy_nsc (id INTEGER PRIMARY KEY, applicant_id INTEGER NOT NULL REFERENCES applicant(id), date DATE);
+CREATE TABLE nsc_image (id INTEGER PRIMARY KEY, consultancy_nsc_id INTEGER NOT NULL REFERENCES consultancy_nsc(id), image_path TEXT);
+"""
+
+CUTOFF = date(2024, 1, 1)
+
+
+class ArchiveRerunTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.live = os.path.join(self.folder.name, 'laboratory.db')
+        conn = sqlite3.connect(self.live)
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO applicant (uid, name) VALUES ('A1', 'Asha')")
+        conn.execute("INSERT INTO sample_sc (sample_uid, applicant_id, submission_date) VALUES ('S1', 1, '2023-05-01 10:00:00')")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _add_reused_ids(self):
+        # The first run emptied both tables, so SQLite hands out id 1 again
+        conn = sqlite3.connect(self.live)
+        conn.execute("INSERT INTO applicant (uid, name) VALUES ('A2', 'Bob')")
+        conn.execute("INSERT INTO sample_sc (sample_uid, applicant_id, submission_date) VALUES ('S2', 1, '2023-06-01 10:00:00')")
+        conn.commit()
+        self.assertEqual(conn.execute("SELECT id FROM sample_sc WHERE sample_uid = 'S2'").fetchone()[0], 1)
+        conn.close()
+
+    def _live_rows(self, query):
+        conn = sqlite3.connect(self.live)
+        try:
+            return conn.execute(query).fetchall()
+        finally:
+            conn.close()
+
+    def test_rerun_into_same_file_keeps_rows_with_reused_ids(self):
+        archive = os.path.join(self.folder.name, 'archives', 'archive_same_day.db')
+        counts = archive_records(self.live, archive, CUTOFF)
+        self.assertEqual((counts['sample_sc'], counts['applicant'], counts['applicant_removed']), (1, 1, 1))
+        self._add_reused_ids()
+
+        with self.assertRaises(ArchiveConflictError):
+            archive_records(self.live, archive, CUTOFF)
+        # Nothing was deleted from the live database
+        self.assertEqual(self._live_rows("SELECT sample_uid FROM sample_sc"), [('S2',)])
+        self.assertEqual(self._live_rows("SELECT uid FROM applicant"), [('A2',)])
+
+    def test_rerun_into_new_file_moves_rows_with_reused_ids(self):
+        archive_records(self.live, os.path.join(self.folder.name, 'archives', 'first.db'), CUTOFF)
+        self._add_reused_ids()
+
+        second = os.path.join(self.folder.name, 'archives', 'second.db')
+        counts = archive_records(self.live, second, CUTOFF)
+        self.assertEqual((counts['sample_sc'], counts['applicant']), (1, 1))
+        self.assertEqual(self._live_rows("SELECT COUNT(*) FROM sample_sc"), [(0,)])
+        conn = sqlite3.connect(second)
+        self.assertEqual(conn.execute("SELECT s.sample_uid, a.uid FROM sample_sc s "
+                                      "JOIN applicant a ON a.id = s.applicant_id").fetchall(), [('S2', 'A2')])
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import io
+import json
+import os
+import sys
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backup_archive import order_chain, plan_restore, new_manifest, DATABASE_ARCNAME, MANIFEST_NAME
+
+PREFIXES = {'uploads', 'shared_files', 'archives'}
+
+
+def make_archive(manifest, members):
+    """Returns an open zipfile holding the database, `members` ({arcname: bytes}) and `manifest`."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        zf.writestr(DATABASE_ARCNAME, f"db of {manifest['id'] if manifest else 'old backup'}")
+        for arcname, data in members.items():
+            zf.writestr(arcname, data)
+        if manifest is not None:
+            zf.writestr(MANIFEST_NAME, json.dumps(manifest))
+    return zipfile.ZipFile(buffer)
+
+
+def manifest_for(backup_id, base, files):
+    manifest = new_manifest(backup_id, '2024-01-01T00:00:00', base)
+    manifest['files'] = {arcname: {'size': 1, 'mtime_ns': 0, 'sha256': arcname} for arcname in files}
+    return manifest
+
+
+class BackupChainTest(unittest.TestCase):
+    def setUp(self):
+        # A full backup, an incremental that changes b.txt and adds c.txt, and one that deletes a.txt
+        self.full = manifest_for('20240101_000000', None, ['uploads/a.txt', 'uploads/b.txt'])
+        self.first = manifest_for('20240102_000000', self.full, ['uploads/a.txt', 'uploads/b.txt', 'uploads/c.txt'])
+        self.second = manifest_for('20240103_000000', self.first, ['uploads/b.txt', 'uploads/c.txt'])
+        self.archives = {
+            'full': (make_archive(self.full, {'uploads/a.txt': b'a', 'uploads/b.txt': b'b1'}), self.full),
+            'first': (make_archive(self.first, {'uploads/b.txt': b'b2', 'uploads/c.txt': b'c'}), self.first),
+            'second': (make_archive(self.second, {}), self.second),
+        }
+
+    def tearDown(self):
+        for zf, _ in self.archives.values():
+            zf.close()
+
+    def test_order_chain_sorts_from_full_to_last_incremental(self):
+        archives = [self.archives['second'], self.archives['full'], self.archives['first']]
+        chain = order_chain(archives)
+        self.assertEqual([manifest['id'] for _, manifest in chain],
+                         ['20240101_000000', '20240102_000000', '20240103_000000'])
+
+    def test_order_chain_rejects_broken_chains(self):
+        fork = manifest_for('20240104_000000', self.full, ['uploads/a.txt'])
+        broken = {
+            'missing base': [self.archives['full'], self.archives['second']],
+            'two tips': [self.archives['full'], self.archives['first'], (make_archive(fork, {}), fork)],
+            'no full backup': [self.archives['first'], self.archives['second']],
+            'old backup mixed in': [self.archives['full'], (make_archive(None, {}), None)],
+        }
+        for name, archives in broken.items():
+            with self.subTest(name):
+                with self.assertRaises(ValueError):
+                    order_chain(archives)
+
+    def test_order_chain_accepts_a_single_backup_without_manifest(self):
+        old = (make_archive(None, {'uploads/a.txt': b'a'}), None)
+        self.assertEqual(order_chain([old]), [old])
+
+    def test_plan_restore_takes_the_latest_copy_of_each_file(self):
+        chain = order_chain(list(self.archives.values()))
+        sources, (database_zf, database) = plan_restore(chain, PREFIXES)
+
+        self.assertEqual(sorted(sources), ['uploads/b.txt', 'uploads/c.txt'])  # a.txt was deleted
+        for arcname, (zf, member, entry) in sources.items():
+            self.assertIs(zf, self.archives['first'][0])
+            self.assertEqual(member.filename, arcname)
+            self.assertEqual(entry, self.first['files'][arcname])
+        self.assertEqual(sources['uploads/b.txt'][0].read(sources['uploads/b.txt'][1]), b'b2')
+        self.assertIs(database_zf, self.archives['second'][0])
+        self.assertEqual(database.filename, DATABASE_ARCNAME)
+
+    def test_plan_restore_fails_when_a_file_is_missing(self):
+        self.second['files']['uploads/d.txt'] = {'size': 1, 'mtime_ns': 0, 'sha256': 'd'}
+        with self.assertRaises(ValueError):
+            plan_restore(order_chain(list(self.archives.values())), PREFIXES)
+
+    def test_plan_restore_rejects_unsafe_paths(self):
+        for arcname in ['uploads/../../etc/passwd', '/etc/passwd', 'uploads\\evil.txt', 'C:/evil.txt']:
+            with self.subTest(arcname=arcname):
+                archive = make_archive(None, {arcname: b'x'})
+                with self.assertRaises(ValueError):
+                    plan_restore([(archive, None)], PREFIXES)
+                archive.close()
+
+    def test_plan_restore_of_an_old_backup_uses_every_member(self):
+        archive = make_archive(None, {'uploads/a.txt': b'a', 'shared_files/x.bin': b'x', 'other/y.txt': b'y'})
+        sources, _ = plan_restore([(archive, None)], PREFIXES)
+        self.assertEqual(sorted(sources), ['shared_files/x.bin', 'uploads/a.txt'])
+        self.assertIsNone(sources['uploads/a.txt'][2])
+        archive.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
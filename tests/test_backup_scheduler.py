@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backup_scheduler import CronSchedule, BackupScheduler, gfs_keep, TIMESTAMP_FORMAT
+
+
+def daily_backups(first, last, hour=2):
+    """One backup a day at `hour` o'clock from `first` to `last` (inclusive)."""
+    day, stamps = first, []
+    while day <= last:
+        stamps.append(datetime(day.year, day.month, day.day, hour))
+        day += timedelta(days=1)
+    return stamps
+
+
+class CronScheduleTest(unittest.TestCase):
+    def test_fields_are_parsed(self):
+        schedule = CronSchedule('*/15 2,14 1-10/3 * 7')
+        self.assertEqual(schedule.minutes, [0, 15, 30, 45])
+        self.assertEqual(schedule.hours, [2, 14])
+        self.assertEqual(schedule.days, {1, 4, 7, 10})
+        self.assertEqual(schedule.months, set(range(1, 13)))
+        self.assertEqual(schedule.weekdays, {0})  # 7 is Sunday too
+
+    def test_invalid_expressions_are_rejected(self):
+        for expression in ['* * * *', '60 * * * *', '5-3 * * * *', '*/0 * * * *', 'x * * * *', '0 0 0 * *', '0 0 * 13 *']:
+            with self.subTest(expression=expression):
+                with self.assertRaises(ValueError):
+                    CronSchedule(expression)
+
+    def test_next_after_is_strictly_later(self):
+        schedule = CronSchedule('30 2 * * *')
+        self.assertEqual(schedule.next_after(datetime(2024, 1, 1, 2, 29, 59)), datetime(2024, 1, 1, 2, 30))
+        self.assertEqual(schedule.next_after(datetime(2024, 1, 1, 2, 30)), datetime(2024, 1, 2, 2, 30))
+        self.assertEqual(schedule.next_after(datetime(2024, 12, 31, 23, 59)), datetime(2025, 1, 1, 2, 30))
+
+    def test_day_fields(self):
+        # 2024-01-01 is a Monday
+        self.assertEqual(CronSchedule('0 0 * * 0').next_after(datetime(2024, 1, 1)), datetime(2024, 1, 7))
+        self.assertEqual(CronSchedule('0 0 15 * *').next_after(datetime(2024, 1, 1)), datetime(2024, 1, 15))
+        # Both day fields restricted: either one makes the date due
+        self.assertEqual(CronSchedule('0 0 3 * 5').next_after(datetime(2024, 1, 1)), datetime(2024, 1, 3))
+        self.assertEqual(CronSchedule('0 0 3 * 5').next_after(datetime(2024, 1, 3)), datetime(2024, 1, 5))
+        self.assertEqual(CronSchedule('0 0 29 2 *').next_after(datetime(2024, 3, 1)), datetime(2028, 2, 29))
+
+    def test_impossible_date_never_comes_due(self):
+        with self.assertRaises(ValueError):
+            CronSchedule('0 0 30 2 *').next_after(datetime(2024, 1, 1))
+
+
+class GfsRetentionTest(unittest.TestCase):
+    def test_keeps_newest_of_each_period(self):
+        stamps = daily_backups(datetime(2024, 1, 1), datetime(2024, 3, 31)) + [datetime(2024, 3, 31, 14)]
+        keep = gfs_keep(stamps, daily=3, weekly=2, monthly=3)
+        self.assertEqual(keep, {
+            datetime(2024, 3, 31, 14), datetime(2024, 3, 30, 2), datetime(2024, 3, 29, 2),  # days
+            datetime(2024, 3, 24, 2),  # ISO week 12 (2024-03-31 is the Sunday of week 13)
+            datetime(2024, 2, 29, 2), datetime(2024, 1, 31, 2),  # months
+        })
+
+    def test_keeps_everything_within_the_limits(self):
+        stamps = daily_backups(datetime(2024, 1, 1), datetime(2024, 1, 5))
+        self.assertEqual(gfs_keep(stamps, daily=7, weekly=0, monthly=0), set(stamps))
+        self.assertEqual(gfs_keep(stamps, daily=0, weekly=0, monthly=0), set())
+        self.assertEqual(gfs_keep([], daily=7, weekly=4, monthly=12), set())
+
+    def test_apply_retention_deletes_only_dropped_backups(self):
+        with tempfile.TemporaryDirectory() as folder:
+            app = Flask(__name__, instance_path=folder)
+            app.config['BACKUP_RETENTION'] = {'daily': 2, 'weekly': 0, 'monthly': 0}
+            scheduler = BackupScheduler(app)
+            os.makedirs(scheduler.directory)
+            stamps = daily_backups(datetime(2024, 1, 1), datetime(2024, 1, 4))
+            for stamp in stamps:
+                open(os.path.join(scheduler.directory, f'samplyze_backup_{stamp.strftime(TIMESTAMP_FORMAT)}.zip'), 'wb').close()
+            others = ['status.json', 'notes.zip', 'samplyze_backup_2023-01-01_02-00-00.zip.part']
+            for name in others:
+                open(os.path.join(scheduler.directory, name), 'wb').close()
+
+            self.assertEqual(scheduler.apply_retention(), 2)
+            self.assertEqual([timestamp for timestamp, _, _ in scheduler.backups()], stamps[:1:-1])
+            self.assertTrue(all(os.path.exists(os.path.join(scheduler.directory, name)) for name in others))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import sys
+import unittest
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import create_engine, Column, Integer, String, DateTime
+from sqlalchemy.orm import declarative_base, Session
+from werkzeug.exceptions import BadRequest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pagination import paginate_keyset, paginate_request, encode_cursor, decode_cursor
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = 'row'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(20), nullable=False)
+    created = Column(DateTime, nullable=False)
+    score = Column(Integer)
+
+
+# Duplicate names, dates and scores so that ties have to be broken by the later keys
+ROWS = [
+    ('b', datetime(2024, 1, 3), 5), ('a', datetime(2024, 1, 1), None), ('c', datetime(2024, 1, 2), 5),
+    ('a', datetime(2024, 1, 2), 2), ('b', datetime(2024, 1, 3), None), ('c', datetime(2024, 1, 1), 7),
+    ('a', datetime(2024, 1, 2), None), ('b', datetime(2024, 1, 1), 2), ('d', datetime(2024, 1, 3), 9),
+    ('a', datetime(2024, 1, 3), 5), ('d', datetime(2024, 1, 2), None),
+]
+
+
+class KeysetPaginationTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.session = Session(self.engine)
+        self.session.add_all(Row(name=name, created=created, score=score) for name, created, score in ROWS)
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def _expected(self, order_by):
+        return [row.id for row in self.session.query(Row).order_by(*order_by)]
+
+    def _page(self, order_by, cursor=None, per_page=3):
+        return paginate_keyset(self.session.query(Row), order_by, cursor, per_page)
+
+    def _walk(self, order_by, per_page=3):
+        """Pages forward to the end, then back to the start. Returns both lists of pages."""
+        page = self._page(order_by, per_page=per_page)
+        self.assertFalse(page.has_prev)
+        forward = [[row.id for row in page]]
+        while page.has_next:
+            page = self._page(order_by, page.next_cursor, per_page)
+            forward.append([row.id for row in page])
+
+        backward = [forward[-1]]
+        while page.has_prev:
+            page = self._page(order_by, page.prev_cursor, per_page)
+            backward.append([row.id for row in page])
+        return forward, list(reversed(backward))
+
+    def _assert_pages_cover(self, order_by, per_page=3):
+        forward, backward = self._walk(order_by, per_page)
+        self.assertEqual([row_id for page in forward for row_id in page], self._expected(order_by))
+        self.assertEqual(backward, forward)
+        self.assertTrue(all(len(page) == per_page for page in forward[:-1]))
+
+    def test_forward_and_backward_paging(self):
+        self._assert_pages_cover([Row.created.desc(), Row.id.desc()])
+        self._assert_pages_cover([Row.name.asc(), Row.id.asc()], per_page=4)
+        self._assert_pages_cover([Row.id.asc()], per_page=1)
+
+    def test_nullable_keys_sort_nulls_first(self):
+        self._assert_pages_cover([Row.score.asc(), Row.id.asc()])
+        self._assert_pages_cover([Row.score.desc(), Row.id.desc()])
+        self._assert_pages_cover([Row.score.asc(), Row.name.desc(), Row.id.asc()], per_page=2)
+
+    def test_mixed_sort_directions(self):
+        self._assert_pages_cover([Row.name.asc(), Row.created.desc(), Row.id.asc()])
+        self._assert_pages_cover([Row.created.desc(), Row.name.asc(), Row.id.desc()], per_page=2)
+
+    def test_previous_page_of_deleted_rows_falls_back_to_first_page(self):
+        order_by = [Row.id.asc()]
+        cursor = encode_cursor('p', [1])
+        page = self._page(order_by, cursor)
+        self.assertEqual([row.id for row in page], [1, 2, 3])
+        self.assertFalse(page.has_prev)
+
+    def test_cursor_round_trip(self):
+        key = [datetime(2024, 1, 2, 10, 30), None, 'b', 4]
+        self.assertEqual(decode_cursor(encode_cursor('p', key), 4), ('p', key))
+
+    def test_malformed_cursor_is_rejected(self):
+        good = encode_cursor('n', [datetime(2024, 1, 2), 3])
+        for cursor in ['not-a-cursor!', 'e30', encode_cursor('x', [1, 2]), good[:-3], encode_cursor('n', [1])]:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    decode_cursor(cursor, 2)
+
+    def test_malformed_cursor_in_request_is_a_bad_request(self):
+        app = Flask(__name__)
+        order_by = [Row.created.desc(), Row.id.desc()]
+        for cursor in ['not-a-cursor!', encode_cursor('n', [3])]:
+            with self.subTest(cursor=cursor), app.test_request_context('/', query_string={'cursor': cursor}):
+                with self.assertRaises(BadRequest):
+                    paginate_request(self.session.query(Row), order_by)
+
+        with app.test_request_context('/', query_string={'per_page': 4}):
+            page = paginate_request(self.session.query(Row), order_by)
+        self.assertEqual(len(page), 4)
+        self.assertTrue(page.has_next)
+
+
+if __name__ == '__main__':
+    unittest.main()
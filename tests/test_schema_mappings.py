@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema_mappings import TableMapping, compile_table, detect_version, read_schema
+
+CURRENT_SCHEMA = """
+CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT NOT NULL, unit TEXT NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL DEFAULT 'open', note TEXT);
+"""
+
+OLD_SCHEMA = """
+CREATE TABLE old.item (id INTEGER PRIMARY KEY, title TEXT, quantity INTEGER, legacy_code TEXT, hidden INTEGER);
+INSERT INTO old.item (title, quantity, legacy_code, hidden) VALUES ('Agar', 5, 'a1', 0);
+INSERT INTO old.item (title, quantity, legacy_code, hidden) VALUES ('Petri dish', NULL, 'b2', 0);
+INSERT INTO old.item (title, quantity, legacy_code, hidden) VALUES ('Old stock', 1, 'c3', 1);
+"""
+
+
+class CompileTableTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.executescript(CURRENT_SCHEMA)
+        self.conn.execute("ATTACH DATABASE ':memory:' AS old")
+        self.conn.executescript(OLD_SCHEMA)
+        self.source_columns = read_schema(self.conn, 'old')['item']
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _run(self, compiled):
+        self.conn.execute(compiled.sql, [1, 1000] + compiled.params)
+        return self.conn.execute("SELECT id, name, unit, quantity, status, note FROM item ORDER BY id").fetchall()
+
+    def test_renames_defaults_and_not_null_defaults(self):
+        mapping = TableMapping(renames={'name': 'title'}, defaults={'unit': 'pcs'}, drop=['legacy_code', 'hidden'])
+        compiled = compile_table(self.conn, 'item', mapping, self.source_columns)
+        self.assertEqual((compiled.table, compiled.source, compiled.params, compiled.notes), ('item', 'item', ['pcs'], []))
+        # The NULL quantity gets the column default instead of dropping the row
+        self.assertEqual(self._run(compiled), [
+            (1, 'Agar', 'pcs', 5, 'open', None),
+            (2, 'Petri dish', 'pcs', 0, 'open', None),
+            (3, 'Old stock', 'pcs', 1, 'open', None),
+        ])
+
+    def test_transforms_and_where(self):
+        mapping = TableMapping(renames={'name': 'title'},
+                               transforms={'unit': "'pcs'", 'note': "'code ' || src.legacy_code"},
+                               where="src.hidden = 0", drop=['hidden'])
+        compiled = compile_table(self.conn, 'item', mapping, self.source_columns)
+        self.assertEqual(compiled.notes, [])  # legacy_code is read by a transform
+        self.assertEqual(self._run(compiled), [
+            (1, 'Agar', 'pcs', 5, 'open', 'code a1'),
+            (2, 'Petri dish', 'pcs', 0, 'open', 'code b2'),
+        ])
+
+    def test_lost_columns_are_reported(self):
+        mapping = TableMapping(renames={'name': 'title'}, defaults={'unit': 'pcs'})
+        compiled = compile_table(self.conn, 'item', mapping, self.source_columns)
+        self.assertEqual(compiled.notes, ['Not carried over: hidden, legacy_code'])
+
+    def test_batches_are_rowid_ranges(self):
+        mapping = TableMapping(renames={'name': 'title'}, defaults={'unit': 'pcs'})
+        compiled = compile_table(self.conn, 'item', mapping, self.source_columns)
+        self.conn.execute(compiled.sql, [2, 3] + compiled.params)
+        self.assertEqual(self.conn.execute("SELECT name FROM item ORDER BY id").fetchall(), [('Petri dish',), ('Old stock',)])
+
+    def test_unfilled_required_column_is_an_error(self):
+        with self.assertRaisesRegex(ValueError, "'unit'"):
+            compile_table(self.conn, 'item', TableMapping(renames={'name': 'title'}), self.source_columns)
+
+    def test_rename_of_missing_column_is_an_error(self):
+        mapping = TableMapping(renames={'name': 'label'}, defaults={'unit': 'pcs'})
+        with self.assertRaisesRegex(ValueError, "'label'"):
+            compile_table(self.conn, 'item', mapping, self.source_columns)
+
+    def test_detect_version(self):
+        self.assertEqual(detect_version({'user': {'id', 'username', 'role'}}).name, 'roles-as-text')
+        self.assertEqual(detect_version({'user': {'id', 'username', 'role_id'}}).name, 'current')
+        self.assertEqual(detect_version({}).name, 'current')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import string
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from uid_allocator import UidFormat, UID_FORMATS
+
+
+class UidFormatTest(unittest.TestCase):
+    def test_small_format_is_a_bijection(self):
+        # 36 ** 3 UIDs: every sequence number maps to a different UID and every UID is used
+        uid_format = UidFormat('T-', string.digits + string.ascii_uppercase, 3, None, offset=141421356)
+        uids = [uid_format.format(value) for value in range(uid_format.size)]
+        self.assertEqual(len(set(uids)), uid_format.size)
+        self.assertTrue(all(uid.startswith('T-') and len(uid) == 5 for uid in uids))
+
+    def test_real_formats_do_not_collide(self):
+        for entity, uid_format in UID_FORMATS.items():
+            with self.subTest(entity=entity):
+                uids = [uid_format.format(value) for value in range(50000)]
+                self.assertEqual(len(set(uids)), len(uids))
+                width = len(uid_format.prefix) + uid_format.length
+                self.assertTrue(all(len(uid) == width and uid.startswith(uid_format.prefix) for uid in uids))
+                self.assertTrue(all(c in uid_format.alphabet for uid in uids for c in uid[len(uid_format.prefix):]))
+
+    def test_issued_uids_never_change(self):
+        # Already issued UIDs depend on the multiplier and offsets staying the same
+        self.assertEqual(UID_FORMATS['applicant'].format(0), '53A5KLO9GM')
+        self.assertEqual(UID_FORMATS['sample'].format(0), 'SMP314159265')
+        self.assertEqual(UID_FORMATS['visitor'].format(0), 'VIS-68H20UNDPI')
+        self.assertEqual(UID_FORMATS['issue'].format(0), 'ISS-81SLJXX37A')
+
+    def test_exhausted_format_raises(self):
+        uid_format = UidFormat('', string.digits, 2, None, offset=0)
+        self.assertEqual(len({uid_format.format(value) for value in range(100)}), 100)
+        with self.assertRaises(RuntimeError):
+            uid_format.format(100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import string
+import threading
+from collections import deque
+from math import gcd
+
+from sqlalchemy import text
+
+from models import db, Applicant, SampleSC, Visitor, Issue
+
+# --- UID Allocation ---
+# Applicants, samples, visitors and issues get their public UIDs from a per-entity
+# sequence in the uid_sequence table instead of guessing random strings and probing the
+# table until one is free. Each sequence number is mapped onto the UID format by a fixed
+# bijection (value * multiplier + offset mod the size of the format), so UIDs keep their
+# old shape and still look random, but two sequence numbers can never give the same UID.
+#
+# Sequence numbers are reserved from the database in blocks with a single
+# UPDATE ... RETURNING and then handed out from memory. UIDs that were generated randomly
+# before this allocator existed can still collide, so each new block is checked against
+# the table with one IN (...) query and the UIDs already taken are skipped.
+
+# Bound parameters per IN (...) query, well below SQLite's variable limit.
+IN_CHUNK_SIZE = 500
+
+
+class UidFormat:
+    def __init__(self, prefix, alphabet, length, column, offset):
+        self.prefix = prefix
+        self.alphabet = alphabet
+        self.length = length
+        self.column = column
+        self.size = len(alphabet) ** length
+        # Never change the multiplier or an offset: already issued UIDs depend on them
+        multiplier = self.size * 618033988 // 1000000000
+        while gcd(multiplier, self.size) != 1:
+            multiplier += 1
+        self.multiplier = multiplier
+        self.offset = self.size * offset // 1000000000
+
+    def format(self, value):
+        """Maps a sequence number onto a UID string."""
+        if value >= self.size:
+            raise RuntimeError(f"No UIDs are left in the {self.column} format.")
+        n = (value * self.multiplier + self.offset) % self.size
+        base = len(self.alphabet)
+        chars = []
+        for _ in range(self.length):
+            n, digit = divmod(n, base)
+            chars.append(self.alphabet[digit])
+        return self.prefix + ''.join(reversed(chars))
+
+
+ALPHANUMERIC = string.digits + string.ascii_uppercase
+
+UID_FORMATS = {
+    'applicant': UidFormat('', ALPHANUMERIC, 10, Applicant.uid, offset=141421356),
+    'sample': UidFormat('SMP', string.digits, 9, SampleSC.sample_uid, offset=314159265),
+    'visitor': UidFormat('VIS-', ALPHANUMERIC, 10, Visitor.visitor_uid, offset=173205080),
+    'issue': UidFormat('ISS-', ALPHANUMERIC, 10, Issue.issue_uid, offset=223606797),
+}
+
+
+class UidAllocator:
+    def __init__(self, block_size=20):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._free = {}  # entity -> UIDs of the reserved block that are not handed out yet
+
+    def _reserve_block(self, entity, count):
+        """Reserves `count` sequence numbers in the database. Returns their UIDs that are not taken."""
+        uid_format = UID_FORMATS[entity]
+        # Uses its own short transaction, so it must not run after the request's session
+        # has flushed writes (SQLite allows one writer at a time).
+        with db.engine.begin() as conn:
+            conn.execute(text("INSERT OR IGNORE INTO uid_sequence (entity, next_value) VALUES (:entity, 0)"),
+                         {'entity': entity})
+            end = conn.execute(text("UPDATE uid_sequence SET next_value = next_value + :count "
+                                    "WHERE entity = :entity RETURNING next_value"),
+                               {'entity': entity, 'count': count}).scalar_one()
+            uids = [uid_format.format(value) for value in range(end - count, end)]
+            # Only legacy random UIDs can be taken: the sequence never repeats a value
+            taken = set()
+            for i in range(0, len(uids), IN_CHUNK_SIZE):
+                chunk = uids[i:i + IN_CHUNK_SIZE]
+                taken.update(conn.execute(db.select(uid_format.column)
+                                          .where(uid_format.column.in_(chunk))).scalars())
+        return [uid for uid in uids if uid not in taken]
+
+    def reserve(self, entity, count=1):
+        """Returns `count` unused UIDs for `entity`, reserving at most one new block."""
+        uids = []
+        with self._lock:
+            free = self._free.setdefault(entity, deque())
+            while len(uids) < count:
+                if not free:
+                    free.extend(self._reserve_block(entity, max(count - len(uids), self.block_size)))
+                    continue
+                uids.append(free.popleft())
+        return uids
+
+    def reset(self):
+        """Forgets the reserved blocks, e.g. after the database was replaced."""
+        with self._lock:
+            self._free.clear()
+
+
+uid_allocator = UidAllocator()
+
+
+def reserve_uids(entity, count):
+    """Reserves `count` UIDs at once, e.g. for a bulk import."""
+    return uid_allocator.reserve(entity, count)
@@ -1,18 +1,21 @@
-import random
-import string
 import os
-from models import Applicant, SampleSC
+from uid_allocator import reserve_uids
+
+# UIDs come from uid_allocator, which never hands out the same UID twice, so none of
+# these need to check the table for an existing row.
 
 def generate_uid():
     """Generates a unique 10-digit alphanumeric UID for an applicant."""
-    while True:
-        uid = ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
-        if not Applicant.query.filter_by(uid=uid).first():
-            return uid
+    return reserve_uids('applicant', 1)[0]
 
 def generate_sample_uid():
     """Generates a unique 12-digit alphanumeric UID for a sample."""
-    while True:
-        sample_uid = 'SMP' + ''.join(random.choices(string.digits, k=9))
-        if not SampleSC.query.filter_by(sample_uid=sample_uid).first():
-            return sample_uid
+    return reserve_uids('sample', 1)[0]
+
+def generate_visitor_uid():
+    """Generates a unique 'VIS-' UID for a visitor."""
+    return reserve_uids('visitor', 1)[0]
+
+def generate_issue_uid():
+    """Generates a unique 'ISS-' UID for an issue."""
+    return reserve_uids('issue', 1)[0]
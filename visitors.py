@@ -7,7 +7,9 @@ import pytz
 
 from models import db, Visitor, Department, User
 from forms import VisitorEntryForm
-from utils import generate_uid # We can reuse this for a unique visitor ID
+from utils import generate_visitor_uid
+from pagination import paginate_request
+from blob_store import upload_key, store_bytes, release
 
 # Create a Blueprint
 visitors_bp = Blueprint('visitors', __name__, url_prefix='/visitors', template_folder='templates')
@@ -40,8 +42,8 @@ def dashboard():
             flash('Invalid date format. Please use YYYY-MM-DD.', 'danger')
             return redirect(url_for('visitors.dashboard'))
 
-    visitors = query.order_by(Visitor.entry_time.desc()).all()
-    return render_template('visitors/dashboard.html', title='Visitor Dashboard', visitors=visitors, 
+    page = paginate_request(query, [Visitor.entry_time.desc(), Visitor.id.desc()])
+    return render_template('visitors/dashboard.html', title='Visitor Dashboard', visitors=page.items, page=page, 
                            filter_type=filter_type, start_date=start_date_str, end_date=end_date_str)
 
 @visitors_bp.route('/entry', methods=['GET', 'POST'])
@@ -53,7 +55,7 @@ def entry():
 
     if form.validate_on_submit():
         new_visitor = Visitor(
-            visitor_uid=f"VIS-{generate_uid()}",
+            visitor_uid=generate_visitor_uid(),
             name=form.name.data,
             phone=form.phone.data,
             address=form.address.data,
@@ -74,10 +76,7 @@ def entry():
                 image_data = base64.b64decode(encoded)
                 
                 photo_filename = f"visitor_{new_visitor.visitor_uid}.png"
-                photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], photo_filename)
-                
-                with open(photo_path, "wb") as f:
-                    f.write(image_data)
+                store_bytes(image_data, upload_key(photo_filename))
                 
                 new_visitor.photo_filename = photo_filename
             except Exception as e:
@@ -119,7 +118,7 @@ def delete_visitor(visitor_id):
     # You might want to delete the photo file as well
     if visitor.photo_filename:
         try:
-            os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], visitor.photo_filename))
+            release(upload_key(visitor.photo_filename))
         except OSError as e:
             print(f"Error deleting visitor photo: {e}")
     